@@ -1,117 +1,140 @@
 # Defining failure rates as per FESHM 4240 chapter
-from .ODH_class import Q_
+# Values are stored as (magnitude, units) pairs; each units string is parsed
+# once when the tables are built
+from .storage import Q_, ureg
 
-TABLE_1 = {'Compressor':
-           {'Leak': Q_('5 * 10^-6 / hr'),
-            'Component rupture': Q_('3 * 10^-7 / hr')},
-           'Dewar':
-           {'Loss of vacuum': Q_('1 * 10^-6 / hr')},
-           'Electrical Power Failure':
-           {'Time rate': Q_('1 * 10^-4 / hr'),
-            'Demand rate': Q_('3 * 10^-4')},
-           'Fluid line':
-           {'Leak': Q_('5 * 10^-7 /hr'),
-            'Rupture': Q_('2 * 10^-8 / hr')},
-           'Cryogenic magnet powered':
-           {'Rupture': Q_('2 * 10 ^-7 / hr')},
-           'Cryogenic magnet not powered':
-           {'Rupture': Q_('2 * 10 ^-8 / hr')},
-           'Header piping assembly':
-           {'Rupture': Q_('1 * 10^-8 / hr')},
-           'U-Tube change':
-           {'Small event': Q_('3 * 10^-2'),
-            'Large event': Q_('1 * 10^-3')},
+
+def _quantities(table, units):
+    """Convert (magnitude, units) pairs of a nested table to quantities.
+
+    `units` caches parsed units by units string."""
+    result = {}
+    for key, value in table.items():
+        if isinstance(value, dict):
+            result[key] = _quantities(value, units)
+        else:
+            magnitude, unit = value
+            if unit not in units:
+                units[unit] = ureg.parse_units(unit)
+            result[key] = Q_(magnitude, units[unit])
+    return result
+
+
+_TABLE_1 = {'Compressor':
+            {'Leak': (5e-6, '1/hr'),
+             'Component rupture': (3e-7, '1/hr')},
+            'Dewar':
+            {'Loss of vacuum': (1e-6, '1/hr')},
+            'Electrical Power Failure':
+            {'Time rate': (1e-4, '1/hr'),
+             'Demand rate': (3e-4, '')},
+            'Fluid line':
+            {'Leak': (5e-7, '1/hr'),
+             'Rupture': (2e-8, '1/hr')},
+            'Cryogenic magnet powered':
+            {'Rupture': (2e-7, '1/hr')},
+            'Cryogenic magnet not powered':
+            {'Rupture': (2e-8, '1/hr')},
+            'Header piping assembly':
+            {'Rupture': (1e-8, '1/hr')},
+            'U-Tube change':
+            {'Small event': (3e-2, ''),
+             'Large event': (1e-3, '')},
 }
-TABLE_2 = {'Battery':
-           {'No output': Q_('3 * 10^-6 /hr')},
-           'Circuit Breaker':
-           {'Failure to operate': Q_('1 * 10^-3'),
-            'Premature transfer': Q_('1 * 10^-6 /hr')},
-           'Diesel':
-           {'Failure to start': Q_('3 * 10^-2'),
-            'Failure to run (Emergency)': Q_('3 * 10^-3 / hr'),
-            'Failure to run (Engine only)': Q_('3 * 10^-4 / hr')},
-           'Fan':
-           {'Failure to run': Q_('9 * 10^-6 / hr')},
-           'Fuse':
-           {'Premature open': Q_('1 * 10^-6 /hr'),
-            'Failure to open': Q_('1 * 10^-5')},
-           'Flange, reinforced gasket':
-           {'Leak': {'Area': Q_('10 mm^2'), 'Failure rate': Q_('4 * 10^-7 / hr')},
-            'Rupture': Q_('1 * 10 ^-9 / hr')},
-           'Flange, soft gasket':
-           {'Leak': {'Area': Q_('10 mm^2'), 'Failure rate': Q_('4 * 10^-7 / hr')},
-            'Blowout': Q_('3 * 10 ^-8 / hr'),
-            'Rupture': Q_('1 * 10 ^-9 / hr')},
-           'Instrumentation':
-           {'Failure to operate': Q_('1 * 10^-6 / hr'),
-            'Shift': Q_('3 * 10^-5 / hr')},
-           'Louver':
-           {'Failure rate': Q_('3 * 10^-7 / hr')},
-           'Piping':
-           {'Small leak': {'Area': Q_('10 mm^2'), 'Failure rate': Q_('1 * 10^-9 / (m*hr)')},
-            'Large leak': {'Area': Q_('1000 mm^2'), 'Failure rate': Q_('1 * 10^-10 / (m*hr)')}, #Only for pipes > 2"
-            'Rupture': Q_('3 * 10^-11 /(m*hr)')},
-           'Pipe weld':#Failure rates need to be multiplied my D/t, where D - diameter, t - wall thickness
-           {'Small leak': {'Area': Q_('10 mm^2'), 'Failure rate': Q_('2 * 10^-11 / hr')},
-            'Large leak': {'Area': Q_('1000 mm^2'), 'Failure rate': Q_('2 * 10^-12 / hr')}, #Only for pipes > 2"
-            'Rupture': Q_('6 * 10^-13 / hr')},
-           'Pump':
-           {'Failure to start': Q_('1 * 10^-3'),
-            'Failure to run, normal': Q_('3 * 10^-5 / hr'),
-            'Failure to run, extreme': Q_('1 * 10^-3 / hr')},
-           'Relay':
-           {'Failure to energize': Q_('1 * 10^-4'),
-            'Failure to close': Q_('3 * 10^-7 / hr'),
-            'Short': Q_('1 * 10^-8 / hr'),
-            'Open contact': Q_('1 * 10^-7 / hr')},
-           'Solid State Device':
-           {'HI PWR':
-            {'Failure rate': Q_('3 * 10^-6 / hr'),
-             'Short': Q_('1 * 10^-6 /hr')},
-            'LOW PWR':
-            {'Failure rate': Q_('1 * 10^-6 / hr'),
-             'Short': Q_('1 * 10^-7 /hr')}},
-           'Switch':
-           {'Limit': Q_('3 * 10^-4'),
-            'Torque': Q_('1 * 10^-4'),
-            'Pressure': Q_('1 * 10^-4'),
-            'Manual': Q_('1 * 10^-5'),
-            'Short': Q_('1 * 10^-8 / hr')},
-           'Transformer':
-           {'Open': Q_('1 * 10^-6 / hr'),
-            'Short': Q_('1 * 10^-6 / hr')},
-           'Valve, motorized':
-           {'Failure to operate': Q_('1 * 10^-3'),
-            'Failure to remain open': Q_('1 * 10^-4'),
-            'External leak': Q_('1 * 10^-8 /hr'),
-            'Rupture': Q_('5 * 10^-10 / hr')},
-           'Valve, solenoid':
-           {'Failure to operate': Q_('1 * 10^-3')},
-           'Valve, pneumatic':
-           {'Failure to operate': Q_('3 * 10^-4'),
-            'Failure to remain open': Q_('1 * 10^-4'),
-            'External leak': Q_('1 * 10^-8 / hr'),
-            'Rupture': Q_('5 * 10^-10 / hr')},
-           'Valve, check':
-           {'Failure to open': Q_('1 * 10^-4'),
-            'Reverse leak': Q_('3 * 10^-7 / hr'),
-            'External leak': Q_('1 * 10^-8 / hr'),
-            'Rupture': Q_('5 * 10^-10 / hr')},
-           'Orifice':
-           {'Rupture': Q_('1 * 10^-8')},
-           'Valve, manual':
-           {'Failure to open': Q_('1 * 10^-4'),
-            'External leak': Q_('1 * 10^-8 / hr'),
-            'Rupture': Q_('5 * 10^-10 / hr')},
-           'Valve, relief':
-           {'Failure to open': Q_('1 * 10^-5'),
-            'Premature open': Q_('1 * 10^-5 / hr')},
-           'Vessel, pressure':
-           {'Small leak': {'Area': Q_('10 mm^2'), 'Failure rate': Q_('8 * 10^-8 / hr')},
-            'Failure': Q_('5 * 10^-9 / hr')},
-           'Wire':
-           {'Open': Q_('3 * 10^-6 / hr'),
-            'Short to GND': Q_('3 * 10^-7 / hr'),
-            'Short to PWR': Q_('1 * 10^-8 / hr')},
+_TABLE_2 = {'Battery':
+            {'No output': (3e-6, '1/hr')},
+            'Circuit Breaker':
+            {'Failure to operate': (1e-3, ''),
+             'Premature transfer': (1e-6, '1/hr')},
+            'Diesel':
+            {'Failure to start': (3e-2, ''),
+             'Failure to run (Emergency)': (3e-3, '1/hr'),
+             'Failure to run (Engine only)': (3e-4, '1/hr')},
+            'Fan':
+            {'Failure to run': (9e-6, '1/hr')},
+            'Fuse':
+            {'Premature open': (1e-6, '1/hr'),
+             'Failure to open': (1e-5, '')},
+            'Flange, reinforced gasket':
+            {'Leak': {'Area': (10, 'mm^2'), 'Failure rate': (4e-7, '1/hr')},
+             'Rupture': (1e-9, '1/hr')},
+            'Flange, soft gasket':
+            {'Leak': {'Area': (10, 'mm^2'), 'Failure rate': (4e-7, '1/hr')},
+             'Blowout': (3e-8, '1/hr'),
+             'Rupture': (1e-9, '1/hr')},
+            'Instrumentation':
+            {'Failure to operate': (1e-6, '1/hr'),
+             'Shift': (3e-5, '1/hr')},
+            'Louver':
+            {'Failure rate': (3e-7, '1/hr')},
+            'Piping':
+            {'Small leak': {'Area': (10, 'mm^2'), 'Failure rate': (1e-9, '1/(m*hr)')},
+             'Large leak': {'Area': (1000, 'mm^2'), 'Failure rate': (1e-10, '1/(m*hr)')}, #Only for pipes > 2"
+             'Rupture': (3e-11, '1/(m*hr)')},
+            'Pipe weld':#Failure rates need to be multiplied my D/t, where D - diameter, t - wall thickness
+            {'Small leak': {'Area': (10, 'mm^2'), 'Failure rate': (2e-11, '1/hr')},
+             'Large leak': {'Area': (1000, 'mm^2'), 'Failure rate': (2e-12, '1/hr')}, #Only for pipes > 2"
+             'Rupture': (6e-13, '1/hr')},
+            'Pump':
+            {'Failure to start': (1e-3, ''),
+             'Failure to run, normal': (3e-5, '1/hr'),
+             'Failure to run, extreme': (1e-3, '1/hr')},
+            'Relay':
+            {'Failure to energize': (1e-4, ''),
+             'Failure to close': (3e-7, '1/hr'),
+             'Short': (1e-8, '1/hr'),
+             'Open contact': (1e-7, '1/hr')},
+            'Solid State Device':
+            {'HI PWR':
+             {'Failure rate': (3e-6, '1/hr'),
+              'Short': (1e-6, '1/hr')},
+             'LOW PWR':
+             {'Failure rate': (1e-6, '1/hr'),
+              'Short': (1e-7, '1/hr')}},
+            'Switch':
+            {'Limit': (3e-4, ''),
+             'Torque': (1e-4, ''),
+             'Pressure': (1e-4, ''),
+             'Manual': (1e-5, ''),
+             'Short': (1e-8, '1/hr')},
+            'Transformer':
+            {'Open': (1e-6, '1/hr'),
+             'Short': (1e-6, '1/hr')},
+            'Valve, motorized':
+            {'Failure to operate': (1e-3, ''),
+             'Failure to remain open': (1e-4, ''),
+             'External leak': (1e-8, '1/hr'),
+             'Rupture': (5e-10, '1/hr')},
+            'Valve, solenoid':
+            {'Failure to operate': (1e-3, '')},
+            'Valve, pneumatic':
+            {'Failure to operate': (3e-4, ''),
+             'Failure to remain open': (1e-4, ''),
+             'External leak': (1e-8, '1/hr'),
+             'Rupture': (5e-10, '1/hr')},
+            'Valve, check':
+            {'Failure to open': (1e-4, ''),
+             'Reverse leak': (3e-7, '1/hr'),
+             'External leak': (1e-8, '1/hr'),
+             'Rupture': (5e-10, '1/hr')},
+            'Orifice':
+            {'Rupture': (1e-8, '')},
+            'Valve, manual':
+            {'Failure to open': (1e-4, ''),
+             'External leak': (1e-8, '1/hr'),
+             'Rupture': (5e-10, '1/hr')},
+            'Valve, relief':
+            {'Failure to open': (1e-5, ''),
+             'Premature open': (1e-5, '1/hr')},
+            'Vessel, pressure':
+            {'Small leak': {'Area': (10, 'mm^2'), 'Failure rate': (8e-8, '1/hr')},
+             'Failure': (5e-9, '1/hr')},
+            'Wire':
+            {'Open': (3e-6, '1/hr'),
+             'Short to GND': (3e-7, '1/hr'),
+             'Short to PWR': (1e-8, '1/hr')},
 }
+
+_UNITS = {}
+TABLE_1 = _quantities(_TABLE_1, _UNITS)
+TABLE_2 = _quantities(_TABLE_2, _UNITS)
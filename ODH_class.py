@@ -6,10 +6,11 @@ https://eshq.fnal.gov/manuals/feshm/)
 This package is maintained at https://github.com/srgkoshelev/ODH_analysis"""
 
 import math
+import numpy as np
 import heat_transfer as ht
 from copy import copy
 from collections import namedtuple
-import xlsxwriter
+from concurrent.futures import Executor, ProcessPoolExecutor
 
 # Setting up the units
 ureg = ht.ureg
@@ -17,21 +18,50 @@ Q_ = ureg.Quantity
 
 # Loading FESHM 4240 Failure rates
 from .FESHM4240_TABLES import TABLE_1, TABLE_2
+from .catalog import FAILURE_RATES, FailureRate, FailureRateCatalog
+from .cache import LEAK_FLOW_CACHE, NTP_STATES, leak_flow_key
+from .storage import LeakTable, FailModeTable, CanonicalQuantity, \
+    RATE_UNIT, FLOW_UNIT, TIME_UNIT, VOLUME_UNIT
+from .instrumentation import PROFILER
 
 
 logger = ht.logger
 # Probability of failure on demand for main cases
-PFD_ODH = Q_('2 * 10^-3')
+PFD_ODH = Q_(2e-3, ureg.dimensionless)
 # TODO Update to value from J. Anderson's document
-TRANSFER_LINE_LEAK_AREA = Q_('10 mm^2')
+TRANSFER_LINE_LEAK_AREA = Q_(10, ureg.mm**2)
 SHOW_SENS = 5e-8/ureg.hr
 # Min required air intake from Table 6.1, ASHRAE 62-2001
 ASHRAE_MIN_FLOW = 0.06 * ureg.ft**3/(ureg.min*ureg.ft**2)
+# Upper fatality rate limits for ODH classes 0, 1, and 2, 1/hr
+ODH_CLASS_LIMITS = (1e-7, 1e-5, 1e-3)
+# Max number of units for which `prob_m_of_n_array` uses exact binomial
+# coefficients and direct powers
+EXACT_BINOMIAL_N = 64
+# Max number of rows on an Excel worksheet
+EXCEL_MAX_ROWS = 1048576
+# Columns of the results table, see `Volume.report_table`
+REPORT_HEADER = ['Source', 'Failure', 'Event failure rate, 1/hr', '# of',
+                 'Total failure rate, 1/hr', 'Leak rate, SCFM',
+                 '# fans working', 'Fan rate, SCFM', 'Event duration, min',
+                 'Oxygen concentration', 'Fatality prob',
+                 'Fatality rate, 1/hr']
 
 failure_mode = namedtuple('Failure_mode', ['phi', 'source', 'name',
                                            'O2_conc', 'leak_fr', 'P_i',
                                            'F_i', 'outage', 'q_leak', 'tau',
                                            'Q_fan', 'N_fan', 'N'])
+# Leak of a failure mode: either q_std or the flow path (tube, area and
+# fluid) is given; max_flow limits the calculated flow; rate_key is the
+# (component, mode) of the failure rate in `FailureRateCatalog`
+leak_spec = namedtuple('Leak_spec', ['name', 'failure_rate', 'N', 'q_std',
+                                     'tube', 'area', 'fluid', 'max_flow',
+                                     'rate_key'],
+                       defaults=[None]*6)
+# Fan with its own flow (negative for exhaust), test period (T_fan of the
+# volume if None) and failure rate
+Fan = namedtuple('Fan', ['Q_fan', 'T_fan', 'lambda_fan'],
+                 defaults=[None, FAILURE_RATES.rate('Fan', 'Failure to run')])
 
 
 class ODHError(Exception):
@@ -47,8 +77,17 @@ class Source:
         Probability of failure on demand (PFD) for solenoid valve.
         If the source doesn't have isolating solenoid valve
         the probability is 1.
+    volume : ureg.Quantity {length: 3}
+        Volume of the fluid at standard conditions; stored in ft^3.
     """
-    def __init__(self, name, fluid, volume, N=1, isol_valve=False):
+    volume = CanonicalQuantity(VOLUME_UNIT)
+    # Failure methods supported by `add_failures`
+    BATCH_FAILURES = ('pipe_failure', 'transfer_line_failure',
+                      'u_tube_failure', 'flange_failure',
+                      'pressure_vessel_failure')
+
+    def __init__(self, name, fluid, volume, N=1, isol_valve=False,
+                 failure_rates=None):
         """Define the possible source of inert gas.
 
         Parameters
@@ -65,22 +104,26 @@ class Source:
         isol_valve : bool
             Denotes whether the source is protected using a normally closed
             solenoid valve.
+        failure_rates : FailureRateCatalog
+            Failure rates used by the failure methods, `FAILURE_RATES` by
+            default; see `FailureRateCatalog.with_overrides`.
         """
         self.name = name
+        if failure_rates is None:
+            failure_rates = FAILURE_RATES
+        self.failure_rates = failure_rates
         self.fluid = fluid
-        self.leaks = []
+        self.leaks = LeakTable()
         # Number of sources if multiple exist, e.g. gas cylinders
         # Increases probability of failure by N.
         self.N = N
         # Calculating volume at standard conditions
-        temp_state = fluid.copy()
-        temp_state.update('T', ht.T_NTP, 'P', ht.P_NTP)
-        self.volume = volume*fluid.Dmass/temp_state.Dmass
-        self.volume.ito(ureg.feet**3)
+        self.volume = volume*fluid.Dmass/NTP_STATES.Dmass(fluid)
         # By default assume there is no isolation valve
         # that is used by ODH system
         self.sol_PFD = (int(not isol_valve) or
-                        TABLE_2['Valve, solenoid']['Failure to operate'])
+                        failure_rates.rate('Valve, solenoid',
+                                           'Failure to operate'))
 
     def pipe_failure(self, tube, fluid=None, N_welds=1, max_flow=None):
         """Add pipe failure to the leaks dict.
@@ -106,47 +149,50 @@ class Source:
             Max mass or volumetric flow through if limited,
             e.g. by compressor output.
         """
+        self._add_leaks(self._pipe_failure_leaks(tube, fluid, N_welds,
+                                                 max_flow))
+
+    def _pipe_failure_leaks(self, tube, fluid=None, N_welds=1,
+                            max_flow=None):
+        """Generate `leak_spec` for each failure mode of `pipe_failure`."""
         # If fluid not defined use fluid of the Source
         fluid = fluid or self.fluid
+        q_std_max = None
+        if max_flow is not None:
+            q_std_max = max_flow.to(ureg.ft**3/ureg.min, 'sf',
+                                    rho=NTP_STATES.Dmass(fluid))
         # Failure rate coefficients; Piping failure rate is per unit of length,
         # weld is dependent on number of welds, pipe OD and wall thickness
         failure_rate_coeff = {'Piping': (tube.L, 1),
                               'Pipe weld': (tube.OD / tube.wall,
                                             N_welds)}
         # Piping and weld leaks as per Table 2
-        for cause in ['Piping', 'Pipe weld']:
-            for mode in TABLE_2[cause].keys():
-                if tube.D > 2 or mode != 'Large leak':  # Large leak only for D > 2"
-                    name = f'{cause} {mode.lower()}: {tube}, ' + \
-                        f'{tube.L.to(ureg.ft):.3g~}'
-                    temp_tube = copy(tube)
-                    # Average path for the flow will be half of piping length
-                    # for gas piping
-                    temp_tube.L = tube.L / 2
-                    fr_coef = failure_rate_coeff[cause][0]
-                    N_events = failure_rate_coeff[cause][1]
-                    if mode == 'Rupture':
-                        failure_rate = fr_coef * TABLE_2[cause][mode]
-                        # For rupture calculate flow through available
-                        # pipe area
-                        area = tube.area
-                    else:
-                        failure_rate = fr_coef * \
-                            TABLE_2[cause][mode]['Failure rate']
-                        area = TABLE_2[cause][mode]['Area']
-                        if area > tube.area:
-                            logger.warning('Leak area cannot be larger'
-                                           ' than pipe area.')
-                            continue
-                    q_std = Source._leak_flow(temp_tube, area, fluid)
-                    if max_flow is not None:
-                        fluid_NTP = fluid.copy()
-                        fluid_NTP.update_kw(P=ht.P_NTP, T=ht.T_NTP)
-                        q_std_max = max_flow.to(ureg.ft**3/ureg.min, 'sf',
-                                                rho=fluid_NTP.Dmass)
-                        q_std = min(q_std, q_std_max)
-                    self.leaks.append(
-                        self._make_leak(name, failure_rate, q_std, N_events))
+        for cause, (fr_coef, N_events) in failure_rate_coeff.items():
+            for entry in self.failure_rates.modes(cause):
+                # Large leak only for D > 2"
+                if entry.mode == 'Large leak' and tube.D <= 2:
+                    continue
+                name = f'{cause} {entry.mode.lower()}: {tube}, ' + \
+                    f'{tube.L.to(ureg.ft):.3g~}'
+                failure_rate = fr_coef * entry.rate
+                if entry.area is None:
+                    # For rupture calculate flow through available
+                    # pipe area
+                    area = tube.area
+                else:
+                    area = entry.area
+                    if area > tube.area:
+                        logger.warning('Leak area cannot be larger'
+                                       ' than pipe area.')
+                        continue
+                temp_tube = copy(tube)
+                # Average path for the flow will be half of piping length
+                # for gas piping
+                temp_tube.L = tube.L / 2
+                yield leak_spec(name, failure_rate, N_events,
+                                tube=temp_tube, area=area, fluid=fluid,
+                                max_flow=q_std_max,
+                                rate_key=(entry.component, entry.mode))
 
     def transfer_line_failure(self, Pipe, fluid=None, N=1):
         """Add transfer line failure to leaks dict.
@@ -173,13 +219,18 @@ class Source:
         N : int
             Number of bayonets/soft seals on the transfer line.
         """
+        self._add_leaks(self._transfer_line_failure_leaks(Pipe, fluid, N))
+
+    def _transfer_line_failure_leaks(self, Pipe, fluid=None, N=1):
+        """Generate `leak_spec` for each failure mode of
+        `transfer_line_failure`."""
         # TODO Make leak and rupture areas adjustable, add info to docstring
         area_cases = {'Leak': TRANSFER_LINE_LEAK_AREA,
                       'Rupture': Pipe.area}
-        for mode in TABLE_1['Fluid line']:
-            name = f'Fluid line {mode.lower()}: {Pipe}'
-            failure_rate = TABLE_1['Fluid line'][mode]
-            area = area_cases[mode]
+        for entry in self.failure_rates.modes('Fluid line'):
+            name = f'Fluid line {entry.mode.lower()}: {Pipe}'
+            failure_rate = entry.rate
+            area = area_cases[entry.mode]
             # TODO move this and gas leak check to separate method
             if area > Pipe.area:
                 logger.warning('Leak area cannot be larger'
@@ -187,9 +238,9 @@ class Source:
                 continue
             # If fluid not defined use fluid of the Source
             fluid = fluid or self.fluid
-            q_std = Source._leak_flow(Pipe, area, fluid)
-            self.leaks.append(
-                self._make_leak(name, failure_rate, q_std, N))
+            yield leak_spec(name, failure_rate, N, tube=Pipe, area=area,
+                            fluid=fluid,
+                            rate_key=(entry.component, entry.mode))
 
     def dewar_insulation_failure(self, q_std):
         """Add dewar insulation failure to leaks dict.
@@ -206,9 +257,9 @@ class Source:
         fluid : heat_transfer.ThermState
             Thermodynamic state of the fluid stored in the source.
         """
-        failure_rate = TABLE_1['Dewar']['Loss of vacuum']
-        self.leaks.append(
-            self._make_leak('Dewar insulation failure', failure_rate, q_std, 1))
+        failure_rate = self.failure_rates.rate('Dewar', 'Loss of vacuum')
+        self._add_leak('Dewar insulation failure', failure_rate, q_std, 1,
+                       rate_key=('Dewar', 'Loss of vacuum'))
 
     def u_tube_failure(self, outer_tube, inner_tube, L, use_rate,
                        fluid=None, N=1):
@@ -225,16 +276,21 @@ class Source:
         fluid : heat_transfer.ThermState
             Thermodynamic state of the fluid stored in the source.
         """
+        self._add_leaks(self._u_tube_failure_leaks(outer_tube, inner_tube, L,
+                                                   use_rate, fluid, N))
+
+    def _u_tube_failure_leaks(self, outer_tube, inner_tube, L, use_rate,
+                              fluid=None, N=1):
+        """Generate `leak_spec` for each failure mode of `u_tube_failure`."""
         # TODO Make areas adjustable, add info to docstring
         flow_path_cases = {'Small event': ht.piping.Annulus(outer_tube.ID,
                                                             inner_tube.OD,
                                                             L=L),
                            'Large event': outer_tube}
-        for mode in TABLE_1['U-Tube change']:
-            flow_path = flow_path_cases[mode]
-            name = f'U-Tube {mode.lower()}: {flow_path}'
-            failure_rate = TABLE_1['U-Tube change'][mode] * \
-                use_rate
+        for entry in self.failure_rates.modes('U-Tube change'):
+            flow_path = flow_path_cases[entry.mode]
+            name = f'U-Tube {entry.mode.lower()}: {flow_path}'
+            failure_rate = entry.rate * use_rate
             area = flow_path.area
             # TODO move this and gas leak check to separate method
             if area > outer_tube.area:
@@ -243,9 +299,9 @@ class Source:
                 continue
             # If fluid not defined use fluid of the Source
             fluid = fluid or self.fluid
-            q_std = Source._leak_flow(flow_path, area, fluid)
-            self.leaks.append(
-                self._make_leak(name, failure_rate, q_std, N))
+            yield leak_spec(name, failure_rate, N, tube=flow_path, area=area,
+                            fluid=fluid,
+                            rate_key=(entry.component, entry.mode))
 
     def flange_failure(self, Pipe, fluid=None, N=1):
         """Add reinforced or preformed gasket flange failure
@@ -263,18 +319,16 @@ class Source:
         N : int
             Number of reinforced seal connections on the Pipe.
         """
+        self._add_leaks(self._flange_failure_leaks(Pipe, fluid, N))
+
+    def _flange_failure_leaks(self, Pipe, fluid=None, N=1):
+        """Generate `leak_spec` for each failure mode of `flange_failure`."""
         # TODO Make leak and rupture areas adjustable, add info to docstring
-        table = TABLE_2['Flange, reinforced gasket']
-        area_cases = {
-            'Leak': table['Leak']['Area'],
-            'Rupture': Pipe.area}
-        for mode in table:
-            name = f'Flange {mode.lower()}: {Pipe}'
-            if isinstance(table[mode], dict):
-                failure_rate = table[mode]['Failure rate']
-            else:
-                failure_rate = table[mode]
-            area = area_cases[mode]
+        for entry in self.failure_rates.modes('Flange, reinforced gasket'):
+            name = f'Flange {entry.mode.lower()}: {Pipe}'
+            failure_rate = entry.rate
+            # Rupture through the full bore
+            area = Pipe.area if entry.area is None else entry.area
             # TODO move this and gas leak check to separate method
             if area > Pipe.area:
                 logger.warning('Leak area cannot be larger'
@@ -282,9 +336,9 @@ class Source:
                 continue
             # If fluid not defined use fluid of the Source
             fluid = fluid or self.fluid
-            q_std = Source._leak_flow(Pipe, area, fluid)
-            self.leaks.append(
-                self._make_leak(name, failure_rate, q_std, N))
+            yield leak_spec(name, failure_rate, N, tube=Pipe, area=area,
+                            fluid=fluid,
+                            rate_key=(entry.component, entry.mode))
 
     def pressure_vessel_failure(self, q_std_rupture, fluid=None):
         """Add pressure vessel failure to leaks dict.
@@ -300,20 +354,24 @@ class Source:
         fluid : heat_transfer.ThermState
             Thermodynamic state of the fluid stored in the source.
         """
+        self._add_leaks(self._pressure_vessel_failure_leaks(q_std_rupture,
+                                                            fluid))
+
+    def _pressure_vessel_failure_leaks(self, q_std_rupture, fluid=None):
+        """Generate `leak_spec` for each failure mode of
+        `pressure_vessel_failure`."""
         # If fluid not defined use fluid of the Source
         fluid = fluid or self.fluid
-        for case, parameters in TABLE_2['Vessel, pressure'].items():
-            name = 'Pressure vessel ' + case
-            if isinstance(parameters, dict):
-                area = parameters['Area']
-                failure_rate = parameters['Failure rate']
-                q_std = Source._leak_flow(ht.piping.Pipe(1, L=0*ureg.m), area,
-                                        fluid)
+        for entry in self.failure_rates.modes('Vessel, pressure'):
+            name = 'Pressure vessel ' + entry.mode
+            if entry.area is not None:
+                yield leak_spec(name, entry.rate, 1,
+                                tube=ht.piping.Pipe(1, L=0*ureg.m),
+                                area=entry.area, fluid=fluid,
+                                rate_key=(entry.component, entry.mode))
             else:
-                failure_rate = parameters
-                q_std = q_std_rupture
-            self.leaks.append(
-                self._make_leak(name, failure_rate, q_std, 1))
+                yield leak_spec(name, entry.rate, 1, q_std=q_std_rupture,
+                                rate_key=(entry.component, entry.mode))
 
     def constant_leak(self, name, q_std, N=1):
         """Add constant leak to leaks dict.
@@ -334,10 +392,9 @@ class Source:
         # Failure rate assumes the volume instantly refilled
         # after being completely emptied, and continues release
         # Failure rate for constant leak doesn't depend on N or self.N
-        # Dividing by self.N*N to undo _make_leak multiplication
+        # Dividing by self.N*N to undo _add_leak multiplication
         failure_rate = q_std/(self.volume*self.N*N)
-        self.leaks.append(
-            self._make_leak(name, failure_rate, N*q_std, N))
+        self._add_leak(name, failure_rate, N*q_std, N)
 
     def failure_mode(self, name, failure_rate, q_std, N=1):
         """Add general failure mode to leaks dict.
@@ -358,10 +415,94 @@ class Source:
         N : int
             Quantity of similar failure modes.
         """
-        self.leaks.append(
-            self._make_leak(name, failure_rate, q_std, N))
+        self._add_leak(name, failure_rate, q_std, N)
+
+    def add_failures(self, failures, processes=None):
+        """Add leaks for several failures solving the leak flows in
+        parallel.
+
+        Leaks are added in the same order as by calling the failure methods
+        one by one.
+
+        Parameters
+        ----------
+        failures : list of tuple
+            (failure_type, *args) or (failure_type, *args, kwargs), where
+            failure_type is one of `BATCH_FAILURES`, and args and kwargs are
+            arguments of the method, e.g.
+            ('pipe_failure', tube, {'N_welds': 2}).
+        processes : int or concurrent.futures.Executor
+            Number of worker processes used for leak flow calculation, or
+            a running pool created with `leak_flow_executor`. By default
+            the flows are calculated in the current process.
+        """
+        specs = []
+        for failure_type, *args in failures:
+            if failure_type not in self.BATCH_FAILURES:
+                raise ODHError(f'Unknown failure type: {failure_type}')
+            kwargs = args.pop() if args and isinstance(args[-1], dict) else {}
+            leaks = getattr(self, f'_{failure_type}_leaks')
+            specs.extend(leaks(*args, **kwargs))
+        self._add_leaks(specs, processes)
+
+    def _add_leaks(self, specs, processes=None):
+        """Calculate leak flows for `leak_spec`s and add the leaks."""
+        specs = list(specs)
+        flows = iter(Source._leak_flows(
+            [(spec.tube, spec.area, spec.fluid) for spec in specs
+             if spec.q_std is None], processes))
+        for spec in specs:
+            q_std = spec.q_std if spec.q_std is not None else next(flows)
+            if spec.max_flow is not None:
+                q_std = min(q_std, spec.max_flow)
+            self._add_leak(spec.name, spec.failure_rate, q_std, spec.N,
+                           spec.rate_key)
+
+    @classmethod
+    def _leak_flows(cls, cases, processes=None):
+        """Calculate leak flows for a list of (tube, area, fluid).
+
+        Identical cases are calculated once. With `processes` the cases
+        not found in `LEAK_FLOW_CACHE` are distributed between worker
+        processes: a new pool with the given number of processes or an
+        existing pool from `leak_flow_executor`.
+
+        Returns
+        -------
+        list of ureg.Quantity {length: 3, time: -1}
+        """
+        if not processes:
+            return [cls._leak_flow(*case) for case in cases]
+        keys = [leak_flow_key(*case) for case in cases]
+        results = {}
+        unsolved = {}
+        for key, case in zip(keys, cases):
+            if key in results or key in unsolved:
+                continue
+            q_std = LEAK_FLOW_CACHE.get(key)
+            if q_std is None:
+                tube, area, fluid = case
+                unsolved[key] = (tube, area, (fluid.name, fluid.T, fluid.P))
+            else:
+                results[key] = q_std
+        if unsolved:
+            if isinstance(processes, Executor):
+                # Tasks are spread one by one between the running workers
+                flows = processes.map(_solve_leak_flow, unsolved.values())
+            else:
+                chunksize = max(1, len(unsolved) // (4*processes))
+                with leak_flow_executor(processes) as executor:
+                    flows = list(executor.map(_solve_leak_flow,
+                                              unsolved.values(),
+                                              chunksize=chunksize))
+            for key, q_leak in zip(unsolved, flows):
+                q_std = Q_(q_leak, FLOW_UNIT)
+                LEAK_FLOW_CACHE.put(key, q_std)
+                results[key] = q_std
+        return [results[key] for key in keys]
 
     @classmethod
+    @PROFILER.timed('Source._leak_flow')
     def _leak_flow(cls, tube, area, fluid):
         """Calculate leak flow/release for a given piping element.
 
@@ -371,6 +512,8 @@ class Source:
         For the full pipe rupture case it is usually assumed that the release
         area is equal to tube cross section area. For other leak cases, the
         hole in the piping is considered to be a square-edged orifice.
+        Results are stored in `LEAK_FLOW_CACHE` keyed on tube dimensions,
+        leak area and fluid name, temperature and pressure.
 
         Parameters
         ----------
@@ -385,6 +528,11 @@ class Source:
         ureg.Quantity {length: 3, time: -1}
             Standard volumetric flow at Normal Temperature and Pressure.
         """
+        key = leak_flow_key(tube, area, fluid)
+        q_std = LEAK_FLOW_CACHE.get(key)
+        if q_std is not None:
+            PROFILER.count('Source._leak_flow.cache_hits')
+            return q_std
         d = (4*area/math.pi)**0.5  # diameter for the leak opening
         exit_ = ht.piping.Exit(d)
         TempPiping = ht.piping.Piping(fluid)
@@ -395,14 +543,20 @@ class Source:
         if area != tube.area:
             Hole = ht.piping.Orifice(d)
             TempPiping.insert(1, Hole)
-        m_dot = TempPiping.m_dot(ht.P_NTP)
-        fluid_NTP = fluid.copy()
-        fluid_NTP.update_kw(P=ht.P_NTP, T=ht.T_NTP)
-        return m_dot.to(ureg.ft**3/ureg.min, 'sf', rho=fluid_NTP.Dmass)
+        with PROFILER.timer('Piping.m_dot'):
+            m_dot = TempPiping.m_dot(ht.P_NTP)
+        rho = NTP_STATES.Dmass(fluid)
+        with PROFILER.timer('pint'):
+            q_std = m_dot.to(ureg.ft**3/ureg.min, 'sf', rho=rho)
+        LEAK_FLOW_CACHE.put(key, q_std)
+        return q_std
 
-    def _make_leak(self, name, failure_rate, q_std, N):
-        """Format failure rate, flow rate and expected time duration of the
-        failure event for a leak.
+    def _add_leak(self, name, failure_rate, q_std, N, rate_key=None):
+        """Add failure rate, flow rate and expected time duration of the
+        failure event for a leak to the leaks table.
+
+        Units are checked and converted to canonical units here, the leak is
+        stored as plain floats.
 
         Parameters
         ----------
@@ -415,12 +569,18 @@ class Source:
             Standard volumetric flow rate
         N : int
             Quantity of similar failure modes.
+        rate_key : tuple
+            (component, mode) of the failure rate in `failure_rates`; None
+            if the failure rate is not taken from the catalog.
         """
         N_events = N * self.N
-        tau = self.volume/q_std
+        with PROFILER.timer('pint'):
+            q_leak = q_std.to(FLOW_UNIT).magnitude
+            failure_rate = failure_rate.to(RATE_UNIT).magnitude
+        tau = self._volume/q_leak
         total_failure_rate = N_events*failure_rate
-        total_failure_rate.ito(1/ureg.hr)
-        return (name, total_failure_rate, q_std, tau.to(ureg.min), N_events)
+        self.leaks.add(name, total_failure_rate, q_leak, tau, N_events,
+                       rate_key)
 
     @staticmethod
     def combine(name, sources):
@@ -465,10 +625,24 @@ class Source:
 
 
 class Volume:
-    """Volume/building affected by inert gases."""
-    def __init__(self, name, volume, *, Q_fan, N_fans, T_fan,
-                 lambda_fan=TABLE_2['Fan']['Failure to run'],
-                 vent_rate=0*ureg.ft**3/ureg.min):
+    """Volume/building affected by inert gases.
+
+    Quantity attributes `volume`, `vent_rate`, `Q_fan`, `Test_period`,
+    `lambda_fan` and `PFD_ODH` are converted to canonical units when set;
+    calculations use the stored magnitudes.
+    """
+    volume = CanonicalQuantity(VOLUME_UNIT)
+    vent_rate = CanonicalQuantity(FLOW_UNIT)
+    Q_fan = CanonicalQuantity(FLOW_UNIT)
+    Test_period = CanonicalQuantity(ureg.hr)
+    lambda_fan = CanonicalQuantity(RATE_UNIT)
+    PFD_ODH = CanonicalQuantity(ureg.dimensionless)
+
+    def __init__(self, name, volume, *, Q_fan=0*ureg.ft**3/ureg.min,
+                 N_fans=0, T_fan=None,
+                 lambda_fan=FAILURE_RATES.rate('Fan', 'Failure to run'),
+                 vent_rate=0*ureg.ft**3/ureg.min, fans=(),
+                 fan_resolution=None):
         """Define a volume affected by inert gas release from  a `Source`.
 
         Parameters
@@ -482,12 +656,22 @@ class Volume:
         N_fans : int
             Number of fans installed.
         T_fan : ureg.Quantity {time: 1}
-            Test period of the fans.
+            Test period of the fans; required if `N_fans` > 0 or `fans`
+            are given. Used for `fans` without own test period.
         vent_rate : ureg.Quantity {length: 3, time: -1}
             Min volumetric flow required or present in the building.
         lambda_fan : ureg.Quantity {time: -1}
             Failure rate of the fans in the building.
+        fans : list of Fan
+            Fans with different flows, test periods or failure rates
+            installed in addition to `N_fans` identical fans.
+        fan_resolution : ureg.Quantity {length: 3, time: -1}
+            Fan states with flows within this resolution are merged,
+            see `fan_state_distribution`.
         """
+        if (N_fans or fans) and T_fan is None:
+            raise ODHError(f'Test period T_fan is required for the fans in '
+                           f'{name}.')
         self.name = name
         self.volume = volume
         self.vent_rate = vent_rate
@@ -496,12 +680,22 @@ class Volume:
         self.lambda_fan = lambda_fan
         self.Q_fan = Q_fan
         self.N_fans = N_fans
-        self.Test_period = T_fan
+        self.Test_period = T_fan if T_fan is not None else 0*ureg.hr
+        self.fans = [fan if fan.T_fan is not None else
+                     fan._replace(T_fan=T_fan) for fan in fans]
+        self.fan_resolution = fan_resolution
         # Calculate fan probability of failure
         self._fan_fail()
         # TODO should be external function; Don't need to keep fan info?
-
-    def odh(self, sources, power_outage=False):
+        # Results of the last batch calculation for each source
+        # used to avoid recalculation of unchanged leaks
+        self._source_results = {}
+        # Shows whether fail_modes are from the batch calculation, i.e.
+        # _source_results describe the last calculation
+        self._batch_current = False
+
+    @PROFILER.timed('Volume.odh')
+    def odh(self, sources, power_outage=False, batch=True):
         """Calculate ODH fatality rate for given `Source`s.
 
         For each leak of each source ODH conditions are analyzed and
@@ -515,21 +709,211 @@ class Volume:
         power_outage : bool
             Shows whether there is a power outage is in effect.
             Default is no outage.
+        batch : bool
+            If True (default) all leaks and fan states are evaluated at once
+            using NumPy arrays (see `_odh_batch`), otherwise each failure mode
+            is calculated separately. Batch results are kept between calls
+            and only leaks and volume parameters that changed since the
+            previous call are recalculated.
         """
-        self.fail_modes = []
+        self.fail_modes = FailModeTable()
         # Probability of power failure in the building:
         # PFD_power if no outage, 1 if there is outage
         PFD_power_build = (power_outage or
-                           TABLE_1['Electrical Power Failure']['Demand rate'])
+                           FAILURE_RATES.rate('Electrical Power Failure',
+                                              'Demand rate'))
+        self._batch_current = batch
+        if batch:
+            self._odh_batch(sources, PFD_power_build)
+            return
         # Calculate fatality rates for each source
         for source in sources:
-            for leak in source.leaks:
-                leak_failure_rate = leak[0]
-                if leak_failure_rate is not None:  # None for constant leak
-                    self._fatality_no_response(source, leak, source.sol_PFD,
-                                               PFD_power_build)
-                    self._fatality_fan_powered(source, leak, source.sol_PFD,
-                                               PFD_power_build)
+            for i in range(len(source.leaks)):
+                leak = source.leaks.values(i)
+                self._fatality_no_response(source, leak, source.sol_PFD,
+                                           PFD_power_build)
+                self._fatality_fan_powered(source, leak, source.sol_PFD,
+                                           PFD_power_build)
+
+    def _odh_batch(self, sources, PFD_power_build):
+        """Calculate fatality rates for all leaks of all sources at once.
+
+        Units are stripped once and the oxygen concentration and fatality
+        probability are calculated for the whole leak x fan state grid as
+        NumPy arrays. The first column of the grid is the no response case
+        (see `_fatality_no_response`), the rest are the fan states from
+        `Fan_flowrates` (see `_fatality_fan_powered`). The results are added
+        to the fail_modes list in the same order as for the scalar
+        calculation.
+
+        Results for each source are kept in `_source_results` and reused
+        on the next call. Leaks are matched using `LeakTable.uid`; if volume
+        and ventilation rates are unchanged only new or replaced leaks are
+        evaluated. Probabilities (`PFD_ODH`, `sol_PFD`, power) are always
+        updated.
+
+        Parameters
+        ----------
+        sources : list
+            Sources affecting the volume.
+        PFD_power_building : float
+            Probability of power failure.
+        """
+        P_fan, Q, N_fans = self._fan_arrays()
+        state = {'V': self._volume, 'Q': Q, 'N_fans': N_fans,
+                 'outage': PFD_power_build == 1}
+        PFD_power = float(PFD_power_build)
+        PFD_ODH = self._PFD_ODH
+        source_results = {}
+        for source in sources:
+            result = self._source_results.get(id(source))
+            if result is None or result['source'] is not source:
+                result = None
+            source_results[id(source)] = self._evaluate_source(
+                source, result, state, P_fan, PFD_power, PFD_ODH)
+        self._source_results = source_results
+
+    def _evaluate_source(self, source, result, state, P_fan, PFD_power,
+                         PFD_ODH):
+        """Calculate fatality rates for leaks of a source reusing results of
+        the previous calculation and add them to fail_modes.
+
+        Parameters
+        ----------
+        source : Source
+        result : dict or None
+            Previous result for the source.
+        state : dict
+            Volume (ft^3), ventilation rates (ft^3/min), number of fans
+            working and power outage flag.
+        P_fan : numpy.ndarray
+            Probability of each fan state.
+        PFD_power : float
+            Probability of power failure.
+        PFD_ODH : float
+            Probability of ODH system failure.
+
+        Returns
+        -------
+        dict
+            Leak ids and O2 concentrations for the source.
+        """
+        leaks = source.leaks
+        uid = leaks.uid()
+        leak_fr = leaks.array('leak_fr')
+        q_leak = leaks.array('q_leak')
+        tau = leaks.array('tau')
+        same_state = (result is not None and
+                      result['V'] == state['V'] and
+                      np.array_equal(result['Q'], state['Q']))
+        if same_state:
+            # Index of the same leak in the previous result or -1 for new
+            old_uid = result['uid']
+            old_index = np.full(len(leaks), -1)
+            if len(old_uid):
+                sorter = np.argsort(old_uid)
+                position = np.searchsorted(old_uid, uid, sorter=sorter)
+                candidate = sorter[np.minimum(position, len(old_uid)-1)]
+                old_index = np.where(old_uid[candidate] == uid, candidate, -1)
+            reused = np.flatnonzero(old_index >= 0)
+            new = np.flatnonzero(old_index < 0)
+            O2_conc = np.empty((len(leaks), len(state['Q'])))
+            O2_conc[reused] = result['O2_conc'][old_index[reused]]
+            O2_conc[new], _ = self._fatality_grid(q_leak[new], state['Q'],
+                                                  tau[new])
+            F_i = fatality_prob_array(O2_conc)
+            PROFILER.count('Volume.odh.leaks_evaluated', len(new))
+        else:
+            O2_conc, F_i = self._fatality_grid(q_leak, state['Q'], tau)
+            PROFILER.count('Volume.odh.leaks_evaluated', len(leaks))
+        sol_PFD = float(source.sol_PFD)
+        P_no_response = PFD_power*sol_PFD + (1-PFD_power)*PFD_ODH
+        P_response = (1-PFD_power) * (1-PFD_ODH) * sol_PFD * P_fan
+        P_i = leak_fr[:, None] * np.concatenate(([P_no_response],
+                                                 P_response))
+        self.fail_modes.add_block(
+            source, leaks.name_list(), leak_fr=leak_fr, q_leak=q_leak,
+            tau=tau, N=leaks.array('N'), Q_fan=state['Q'],
+            N_fan=state['N_fans'], O2_conc=O2_conc, F_i=F_i, P_i=P_i,
+            phi=P_i*F_i, outage=state['outage'])
+        return dict(state, source=source, uid=uid.copy(), O2_conc=O2_conc)
+
+    @staticmethod
+    def _leak_arrays(sources):
+        """Collect leaks of the sources into arrays in canonical units.
+
+        Parameters
+        ----------
+        sources : list
+            Sources affecting the volume.
+
+        Returns
+        -------
+        names : list of str
+            Leak names.
+        leak_fr : numpy.ndarray
+            Leak failure rates, 1/hr.
+        q_leak : numpy.ndarray
+            Leak flow rates, ft^3/min.
+        tau : numpy.ndarray
+            Event durations, min.
+        sol_PFD : numpy.ndarray
+            Probability of source solenoid failure.
+        """
+        names = [name for source in sources
+                 for name in source.leaks.name_list()]
+
+        def column(name):
+            return np.concatenate([np.empty(0)] +
+                                  [source.leaks.array(name)
+                                   for source in sources])
+        sol_PFD = np.concatenate(
+            [np.empty(0)] + [np.full(len(source.leaks), float(source.sol_PFD))
+                             for source in sources])
+        return names, column('leak_fr'), column('q_leak'), column('tau'), \
+            sol_PFD
+
+    def _fan_arrays(self):
+        """Collect fan states into arrays in canonical units.
+
+        The first ventilation rate is the one without ODH system response,
+        i.e. `vent_rate`, followed by the rates from `Fan_flowrates`.
+
+        Returns
+        -------
+        P_fan : numpy.ndarray
+            Probability of each fan state.
+        Q : numpy.ndarray
+            Ventilation rates, ft^3/min, including no response case.
+        N_fans : numpy.ndarray
+            Number of fans working including no response case.
+        """
+        P_fan, Q_fans, N_fans = self._fan_states
+        return P_fan, np.concatenate(([self._vent_rate], Q_fans)), \
+            np.concatenate(([0], N_fans))
+
+    def _fatality_grid(self, q_leak, Q, tau):
+        """Calculate O2 concentration and fatality probability for all
+        combinations of leaks and ventilation rates.
+
+        Parameters
+        ----------
+        q_leak : numpy.ndarray
+            Leak flow rates, ft^3/min.
+        Q : numpy.ndarray
+            Ventilation rates, ft^3/min.
+        tau : numpy.ndarray
+            Event durations, min.
+
+        Returns
+        -------
+        O2_conc, F_i : numpy.ndarray
+            Oxygen concentration and fatality probability,
+            shape (len(q_leak), len(Q)).
+        """
+        O2_conc = conc_vent_array(self._volume, q_leak[:, None], Q[None, :],
+                                  tau[:, None])
+        return O2_conc, fatality_prob_array(O2_conc)
 
     def _fatality_no_response(self, source, leak, sol_PFD,
                               PFD_power_build):
@@ -545,30 +929,27 @@ class Volume:
         Parameters
         ----------
         source : Source
-        leak : tuple (str,
-                      ureg.Quantity {time: -1},
-                      ureg.Quantity {length: 3, time: -1},
-                      ureg.Quantity {time: 1},
-                      int)
-            Leak failure rate, volumetric flow rate, event duration, and number
-            of events.
+        leak : tuple (str, float, float, float, int)
+            Leak name, failure rate (1/hr), volumetric flow rate (ft^3/min),
+            event duration (min), and number of events.
         sol_PFD : float
             Probability of source solenoid failure.
         PFD_power_building : float
             Probability of power failure.
         """
         (failure_mode_name, leak_failure_rate, q_leak, tau, N) = leak
-        P_no_response = float(PFD_power_build) * sol_PFD + \
-            (1-PFD_power_build)*self.PFD_ODH
+        PFD_power_build = float(PFD_power_build)
+        P_no_response = PFD_power_build * float(sol_PFD) + \
+            (1-PFD_power_build)*self._PFD_ODH
         P_i = leak_failure_rate * P_no_response
-        Q_fan = self.vent_rate
-        O2_conc = conc_vent(self.volume, q_leak, Q_fan, tau)
+        Q_fan = self._vent_rate
+        O2_conc = conc_vent(self._volume, q_leak, Q_fan, tau)
         F_i = self._fatality_prob(O2_conc)
         phi_i = P_i*F_i
-        f_mode = failure_mode(phi_i, source, failure_mode_name, O2_conc,
-                              leak_failure_rate, P_i, F_i,
-                              PFD_power_build == 1, q_leak, tau, Q_fan, 0, N)
-        self.fail_modes.append(f_mode)
+        self.fail_modes.add(phi=phi_i, source=source, name=failure_mode_name,
+                            O2_conc=O2_conc, leak_fr=leak_failure_rate,
+                            P_i=P_i, F_i=F_i, outage=PFD_power_build == 1,
+                            q_leak=q_leak, tau=tau, Q_fan=Q_fan, N_fan=0, N=N)
 
     def _fatality_fan_powered(self, source, leak, sol_PFD, PFD_power_build):
         """Calculate fatality rates for fan failure on demand.
@@ -581,53 +962,78 @@ class Volume:
         Parameters
         ----------
         source : Source
-        leak : tuple (str,
-                      ureg.Quantity {time: -1},
-                      ureg.Quantity {length: 3, time: -1},
-                      ureg.Quantity {time: 1},
-                      int)
-            Leak failure rate, volumetric flow rate, event duration, and number
-            of events.
+        leak : tuple (str, float, float, float, int)
+            Leak name, failure rate (1/hr), volumetric flow rate (ft^3/min),
+            event duration (min), and number of events.
         sol_PFD : float
             Probability of source solenoid failure.
         PFD_power_building : float
             Probability of power failure.
         """
         (failure_mode_name, leak_failure_rate, q_leak, tau, N) = leak
-        for (P_fan, Q_fan, N_fan) in self.Fan_flowrates:
+        PFD_power_build = float(PFD_power_build)
+        for (P_fan, Q_fan, N_fan) in zip(*self._fan_states):
             # Probability of power on, ODH system working, and m number of fans
             # with flow rate Q_fan on.
-            P_response = (1-PFD_power_build) * (1-self.PFD_ODH) * \
-                sol_PFD * P_fan
+            P_response = (1-PFD_power_build) * (1-self._PFD_ODH) * \
+                float(sol_PFD) * P_fan
             P_i = leak_failure_rate * P_response
-            O2_conc = conc_vent(self.volume, q_leak, Q_fan, tau)
+            O2_conc = conc_vent(self._volume, q_leak, Q_fan, tau)
             F_i = self._fatality_prob(O2_conc)
             phi_i = P_i*F_i
-            f_mode = failure_mode(phi_i, source, failure_mode_name, O2_conc,
-                                  leak_failure_rate, P_i, F_i,
-                                  PFD_power_build == 1, q_leak, tau, Q_fan,
-                                  N_fan, N)
-            self.fail_modes.append(f_mode)
+            self.fail_modes.add(phi=phi_i, source=source,
+                                name=failure_mode_name, O2_conc=O2_conc,
+                                leak_fr=leak_failure_rate, P_i=P_i, F_i=F_i,
+                                outage=PFD_power_build == 1, q_leak=q_leak,
+                                tau=tau, Q_fan=Q_fan, N_fan=N_fan, N=N)
 
     def _fan_fail(self):
         """Calculate (Probability, flow) pairs for all combinations of fans
         working.
 
-        All fans are expected to have same volume flow.
+        If only identical fans are installed, `prob_m_of_n` is used for
+        each number of fans working. Otherwise the distribution is found
+        using `fan_state_distribution` for all fans.
         """
-        # TODO add fans with different volumetric rates (see report as well)
-        Fail_rate = self.lambda_fan
-        Fan_flowrates = []
-        for m in range(self.N_fans+1):
-            # Probability of exactly m units starting
-            P_m_fan_work = prob_m_of_n(m, self.N_fans, self.Test_period,
-                                       Fail_rate)
-            flowrate = self.Q_fan*m
-            if flowrate == Q_('0 m**3/min'):
-                flowrate = self.vent_rate
-            Fan_flowrates.append((P_m_fan_work, flowrate, m))
-        self.Fan_flowrates = Fan_flowrates
+        if self.N_fans and not self._Test_period:
+            raise ODHError(f'Test period of the fans in {self.name} should '
+                           f'be positive.')
+        if self.fans:
+            P, Q, m = fan_state_distribution(self._all_fans(),
+                                             self.fan_resolution)
+            flowrate = Q.to(FLOW_UNIT).magnitude
+            flowrate[flowrate == 0] = self._vent_rate
+            self._fan_states = (P, flowrate, m)
+            return
+        m = np.arange(self.N_fans+1)
+        # Probability of exactly m units starting
+        P_m_fan_work = prob_m_of_n_array(self.N_fans, self._Test_period,
+                                         self._lambda_fan)
+        flowrate = self._Q_fan*m
+        flowrate[flowrate == 0] = self._vent_rate
+        self._fan_states = (P_m_fan_work, flowrate, m)
+
+    def _all_fans(self):
+        """List of identical fans followed by `fans`."""
+        return [Fan(self.Q_fan, self.Test_period, self.lambda_fan)] * \
+            self.N_fans + self.fans
 
+    @property
+    def Fan_flowrates(self):
+        """List of (probability, flow rate, number of fans working) for all
+        fan states."""
+        return [(float(P), Q_(Q, FLOW_UNIT), int(m))
+                for P, Q, m in zip(*self._fan_states)]
+
+    @Fan_flowrates.setter
+    def Fan_flowrates(self, Fan_flowrates):
+        self._fan_states = (
+            np.array([float(P) for P, _, _ in Fan_flowrates]),
+            np.array([Q.to(FLOW_UNIT).magnitude
+                      for _, Q, _ in Fan_flowrates]),
+            np.array([m for _, _, m in Fan_flowrates], dtype=int))
+
+    @PROFILER.timed('fatality_prob')
     def _fatality_prob(self, O2_conc):
         """Calculate fatality probability for given oxygen concentration.
 
@@ -660,27 +1066,28 @@ class Volume:
         int
             ODH class.
         """
-        if self.phi < 1e-7/ureg.hr:
-            return 0
-        elif self.phi < 1e-5/ureg.hr:
-            return 1
-        elif self.phi < 1e-3/ureg.hr:
-            return 2
-        else:
-            # TODO add a custom exception for ODH > 2
-            print('ODH fatality rate is too high. Please, check calculations')
-            return None
+        phi = self.phi.to(RATE_UNIT).magnitude
+        for odh_class, limit in enumerate(ODH_CLASS_LIMITS):
+            if phi < limit:
+                return odh_class
+        # TODO add a custom exception for ODH > 2
+        print('ODH fatality rate is too high. Please, check calculations')
+        return None
 
     @property
     def phi(self):
-        return sum((fm.phi for fm in self.fail_modes))
+        return Q_(self.fail_modes.array('phi').sum(), RATE_UNIT)
 
     def report(self, brief=True, sens=None):
         """Print a report for failure modes and effects.
 
-        The report is sorted by fatality rate descending."""
-        self.fail_modes.sort(key=lambda x: x.phi, reverse=True)
+        The report is sorted by fatality rate descending; order of
+        fail_modes is not changed."""
         sens = sens or SHOW_SENS
+        if brief:
+            f_modes = self.fail_modes.above(sens.to(RATE_UNIT).magnitude)
+        else:
+            f_modes = self.fail_modes.top(len(self.fail_modes))
         title = f'ODH report for {self}'
         padding = len(title) + 10
         print('#'*padding)
@@ -689,113 +1096,68 @@ class Volume:
         if brief:
             print('Printing brief ODH report')
             print(f'Only leaks with Fatality rate > {sens} are shown')
-        for f_mode in self.fail_modes:
-            if f_mode.phi >= sens or not brief:
-                print()
-                print(f' Source:               {f_mode.source.name}')
-                print(f' Failure:              {f_mode.name}')
-                print(f' Fatality rate:        {f_mode.phi.to(1/ureg.hr):.2~}')
-                print(f' Building is powered:  {not f_mode.outage}')
-                print(f' Oxygen concentration: {f_mode.O2_conc:.0%}, '
-                      f'{f_mode.O2_conc/0.21:.0%} percent of norm')
-                print(f' Leak failure rate:    {f_mode.leak_fr:.3g~}')
-                print(' ODH protection PFD:    '
-                      f'{(f_mode.P_i/f_mode.leak_fr).to(ureg.dimensionless):.2~}')
-                print(f' Total failure rate:   {f_mode.P_i.to(1/ureg.hr):.2~}')
-                print(f' Leak rate:            {f_mode.q_leak:.2~}')
-                print(f' Event duration:       {f_mode.tau:.2~}')
-                print(f' Fans working:         {f_mode.N_fan}')
-                print(f' Fan rate:             {f_mode.Q_fan:.2~}')
-                print(f' Fatality prob:        {f_mode.F_i:.0%}')
+        for f_mode in f_modes:
+            print()
+            print(f' Source:               {f_mode.source.name}')
+            print(f' Failure:              {f_mode.name}')
+            print(f' Fatality rate:        {f_mode.phi.to(1/ureg.hr):.2~}')
+            print(f' Building is powered:  {not f_mode.outage}')
+            print(f' Oxygen concentration: {f_mode.O2_conc:.0%}, '
+                  f'{f_mode.O2_conc/0.21:.0%} percent of norm')
+            print(f' Leak failure rate:    {f_mode.leak_fr:.3g~}')
+            print(' ODH protection PFD:    '
+                  f'{(f_mode.P_i/f_mode.leak_fr).to(ureg.dimensionless):.2~}')
+            print(f' Total failure rate:   {f_mode.P_i.to(1/ureg.hr):.2~}')
+            print(f' Leak rate:            {f_mode.q_leak:.2~}')
+            print(f' Event duration:       {f_mode.tau:.2~}')
+            print(f' Fans working:         {f_mode.N_fan}')
+            print(f' Fan rate:             {f_mode.Q_fan:.2~}')
+            print(f' Fatality prob:        {f_mode.F_i:.0%}')
 
     def report_short_table(self, sens=None):
         """Prepare a short table for failure modes and effects.
 
-        The report is sorted by fatality rate descending."""
-        self.fail_modes.sort(key=lambda x: x.phi, reverse=True)
+        The report is sorted by fatality rate descending; order of
+        fail_modes is not changed."""
         sens = sens or SHOW_SENS
         table = [["Failure mode", "Fans on", "O_2", "Duration, min", "\\phi_i"]]
         table.append(None)
-        for f_mode in self.fail_modes:
-            if f_mode.phi >= sens:
-                row = []
-                row.append(f'{f_mode.source.name} {f_mode.name}')
-                row.append(f'{f_mode.N_fan}')
-                row.append(f'{f_mode.O2_conc:.0%}')
-                row.append(f'{f_mode.tau.to(ureg.min).magnitude:,.1f}')
-                row.append(f'{f_mode.phi.to(1/ureg.hr).magnitude:.2}')
-                table.append(row)
+        for f_mode in self.fail_modes.above(sens.to(RATE_UNIT).magnitude):
+            row = []
+            row.append(f'{f_mode.source.name} {f_mode.name}')
+            row.append(f'{f_mode.N_fan}')
+            row.append(f'{f_mode.O2_conc:.0%}')
+            row.append(f'{f_mode.tau.to(ureg.min).magnitude:,.1f}')
+            row.append(f'{f_mode.phi.to(1/ureg.hr).magnitude:.2}')
+            table.append(row)
         return table
 
-    def report_table(self, filename='ODH_report'):
-        """Make a table with the calculation results."""
-        table = []
-        header = ['Source', 'Failure', 'Event failure rate, 1/hr', '# of',
-                  'Total failure rate, 1/hr', 'Leak rate, SCFM',
-                  '# fans working', 'Fan rate, SCFM', 'Event duration, min',
-                  'Oxygen concentration', 'Fatality prob',
-                  'Fatality rate, 1/hr']
-        # 'Total failure rate', 'ODH protection PFD', 'Building is powered'
-        table.append(header)
-        self.fail_modes.sort(key=lambda x: x.source.name)
-        for f_mode in self.fail_modes:
-            table.append([
-                f_mode.source.name,
-                f_mode.name,
-                (f_mode.leak_fr/f_mode.N).to(1/ureg.hr).magnitude,
-                f_mode.N,
-                f_mode.leak_fr.to(1/ureg.hr).magnitude,
-                f_mode.q_leak.to(ureg.ft**3/ureg.min).magnitude,
-                f_mode.N_fan,
-                f_mode.Q_fan.to(ureg.ft**3/ureg.min).magnitude,
-                f_mode.tau.to(ureg.min).magnitude,
-                f_mode.O2_conc,
-                f_mode.F_i,
-                f_mode.phi.to(1/ureg.hr).magnitude])
-        filename += '.xlsx'
-        with xlsxwriter.Workbook(filename) as workbook:
-            header_format = workbook.add_format({'bold': True,
-                                                 'font_size': 12,
-                                                 'bottom': 3})
-            worksheet = workbook.add_worksheet()
-            col_width = [len(x) for x in table[0]]
-            for row_n, row in enumerate(table):
-                for col_n, data in enumerate(row):
-                    worksheet.write(row_n, col_n, data)
-                    if col_n in (0, 1, 10):
-                        # For source names, failure names
-                        # and 'Total failure rate'
-                        col_width[col_n] = max(col_width[col_n], len(str(data)))
-            sci_format = workbook.add_format({'num_format': '0.00E+00'},)
-            flow_format = workbook.add_format({'num_format': '#'},)
-            percent_format = workbook.add_format({'num_format': '0%'},)
-            number_format = workbook.add_format({'num_format': '0'},)
-            worksheet.set_row(0, None, header_format)
-            worksheet.set_column(2, 2, None, sci_format)
-            worksheet.set_column(4, 4, None, sci_format)
-            worksheet.set_column(5, 5, None, flow_format)
-            worksheet.set_column(8, 8, None, sci_format)
-            worksheet.set_column(9, 9, None, percent_format)
-            worksheet.set_column(10, 11, None, sci_format)
-            # Writing total/summary
-            N_rows = len(table)
-            N_cols = len(table[0])
-            worksheet.write(N_rows+1, N_cols-2, 'Total fatality rate, 1/hr')
-            worksheet.write(N_rows+1, N_cols-1,
-                            self.phi.to(1/ureg.hr).magnitude)
-            worksheet.write(N_rows+2, N_cols-2, 'ODH class')
-            worksheet.write(N_rows+2, N_cols-1, self.odh_class(),
-                            number_format)
-            # Autofit column width
-            for col_n, width in enumerate(col_width):
-                adj_width = width - 0.005 * width**2
-                worksheet.set_column(col_n, col_n, adj_width)
-            # Adding usability
-            worksheet.conditional_format(
-                1, N_cols-1, N_rows-1, N_cols-1,
-                {'type': '3_color_scale', 'min_color': '#008000',
-                 'max_color': '#FF0000'})
-            worksheet.freeze_panes(1, 0)
+    def report_table(self, filename='ODH_report', max_rows=EXCEL_MAX_ROWS):
+        """Make a table with the calculation results.
+
+        See `write_report_table`.
+        """
+        write_report_table(filename, self, max_rows=max_rows)
+
+    def _report_rows(self, chunk_size=10000):
+        """Generate rows of the results table sorted by source name.
+
+        Rows are created from fail_modes columns in chunks; fail_modes
+        itself is not reordered.
+        """
+        table = self.fail_modes
+        order = table._source_index()
+        source_names = [source.name for source in table.sources.values]
+        names = table.names.values
+        for start in range(0, len(order), chunk_size):
+            index = order[start:start+chunk_size]
+            columns = [table.array(name)[index].tolist() for name in
+                       ('source', 'name', 'leak_fr', 'N', 'q_leak', 'N_fan',
+                        'Q_fan', 'tau', 'O2_conc', 'F_i', 'phi')]
+            for (source, name, leak_fr, N, q_leak, N_fan, Q_fan, tau,
+                 O2_conc, F_i, phi) in zip(*columns):
+                yield [source_names[source], names[name], leak_fr/N, N,
+                       leak_fr, q_leak, N_fan, Q_fan, tau, O2_conc, F_i, phi]
 
     def __str__(self):
         return (f'Volume: {self.name}, {self.volume.to(ureg.ft**3):.2~}')
@@ -811,6 +1173,49 @@ class Volume:
     #    return self._fatality_prob(O2_conc) == 0
 
 
+def leak_flow_executor(processes=None):
+    """Create a process pool for leak flow calculation.
+
+    The pool can be reused by several `Source.add_failures` calls, e.g. in
+    a long running service, to avoid starting the worker processes and
+    importing heat_transfer in them for every call.
+
+    Parameters
+    ----------
+    processes : int
+        Number of worker processes, `os.cpu_count()` by default.
+
+    Returns
+    -------
+    concurrent.futures.ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(processes, initializer=_init_leak_flow_worker)
+
+
+def _init_leak_flow_worker():
+    """Use the units registry of heat_transfer for unpickled quantities."""
+    import pint
+    pint.set_application_registry(ureg)
+
+
+def _solve_leak_flow(case):
+    """Calculate leak flow in a worker process, see `Source._leak_flows`.
+
+    Parameters
+    ----------
+    case : tuple
+        Tube, leak area and (name, temperature, pressure) of the fluid.
+
+    Returns
+    -------
+    float
+        Standard volumetric flow, ft^3/min.
+    """
+    tube, area, (name, T, P) = case
+    fluid = ht.ThermState(name, T=T, P=P)
+    return Source._leak_flow(tube, area, fluid).to(FLOW_UNIT).magnitude
+
+
 def prob_m_of_n(m, n, T, l):
     """Calculate the probability of m out of n units working.
 
@@ -832,7 +1237,7 @@ def prob_m_of_n(m, n, T, l):
     float
         Probability of m out of n units working.
     """
-    C_n_m = math.factorial(n)/(math.factorial(n-m)*math.factorial(m))
+    C_n_m = math.comb(n, m)
     PFD_one_unit = l*T
     # Adjustment coefficient: T/(n-m+1) will be average failure reveal time
     # (D. Smith, Reliability..., p. 108)
@@ -841,6 +1246,147 @@ def prob_m_of_n(m, n, T, l):
     return m_of_n
 
 
+def prob_m_of_n_array(n, T, l):
+    """Calculate the probabilities of m = 0..n out of n units working.
+
+    Vectorized version of `prob_m_of_n`. For n up to `EXACT_BINOMIAL_N`
+    the binomial coefficients are exact; for larger n the calculation is
+    done in log space to avoid overflow and underflow.
+
+    Parameters
+    ----------
+    n : int
+        Total number of units.
+    T : ureg.Quantity {time: 1} or float or numpy.ndarray
+        Test period.
+    l : ureg.Quantity {time: -1} or float or numpy.ndarray
+        Failure rate (\\lambda) of a unit. Floats should be in units
+        consistent with `T`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Probability of m units working, shape of T*l with an extra last
+        axis for m = 0..n.
+    """
+    PFD_one_unit = l*T
+    if hasattr(PFD_one_unit, 'to'):
+        PFD_one_unit = PFD_one_unit.to(ureg.dimensionless).magnitude
+    p = np.asarray(PFD_one_unit, dtype=float)[..., None]
+    m = np.arange(n+1)
+    # Adjustment coefficient, see `prob_m_of_n`
+    F_adj = 1/(n-m+1)
+    if n <= EXACT_BINOMIAL_N:
+        C_n_m = np.array([math.comb(n, m_) for m_ in m], dtype=float)
+        return C_n_m*p**(n-m)*(1-p)**m*F_adj
+    log_factorial = np.concatenate(([0], np.cumsum(np.log(np.arange(1,
+                                                                    n+1)))))
+    log_C_n_m = log_factorial[n] - log_factorial[m] - log_factorial[n-m]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 0*log(0) terms are 0, same as 0**0 = 1 for the powers
+        log_fail = np.where(n-m > 0, (n-m)*np.log(p), 0)
+        log_work = np.where(m > 0, m*np.log1p(-p), 0)
+    return np.exp(log_C_n_m + log_fail + log_work)*F_adj
+
+
+def fan_state_distribution(fans, resolution=None):
+    """Calculate probability and flow for the states of a set of fans.
+
+    The distribution is built one fan at a time by convolution of the
+    current states with the working and failed states of the fan; states
+    with equal supply flow, exhaust flow and number of failed fans are
+    merged after each step. The probability of each state is adjusted by
+    1/(k+1), where k is the number of failed fans, same as in
+    `prob_m_of_n`, so that identical fans give the same result.
+
+    Total ventilation of a state is the supply flow if it is larger than
+    the exhaust flow, and the (negative) exhaust flow otherwise. This is
+    conservative for the combined supply and exhaust ventilation.
+
+    Parameters
+    ----------
+    fans : list of Fan
+        Fans installed in the volume.
+    resolution : ureg.Quantity {length: 3, time: -1}
+        If given, flows within the same multiple of the resolution are
+        merged into the lowest of them, which keeps the number of states
+        small for many fans of different sizes.
+
+    Returns
+    -------
+    P : numpy.ndarray
+        Probability of the fan state.
+    Q : ureg.Quantity {length: 3, time: -1}
+        Ventilation flow of the state.
+    m : numpy.ndarray
+        Number of fans working.
+    """
+    r = resolution.to(FLOW_UNIT).magnitude if resolution is not None else 0
+    supply = np.zeros(1)
+    exhaust = np.zeros(1)
+    k = np.zeros(1)
+    P = np.ones(1)
+    for fan in fans:
+        if fan.T_fan is None or fan.T_fan.magnitude <= 0:
+            raise ODHError(f'Test period of the fan should be positive: '
+                           f'{fan}')
+        q = fan.Q_fan.to(FLOW_UNIT).magnitude
+        PFD_one_unit = float(fan.lambda_fan*fan.T_fan)
+        supply = np.concatenate((supply+max(q, 0), supply))
+        exhaust = np.concatenate((exhaust+max(-q, 0), exhaust))
+        k = np.concatenate((k, k+1))
+        P = np.concatenate((P*(1-PFD_one_unit), P*PFD_one_unit))
+        keys = [k, supply, exhaust]
+        if r:
+            keys = [k, np.floor(supply/r), np.floor(exhaust/r)]
+        P, (k, supply, exhaust) = _merge_states(keys, P,
+                                                [k, supply, exhaust])
+    P = P/(k+1)
+    Q = np.where(supply >= exhaust, supply, -exhaust)
+    m = len(fans) - k
+    P, (m, Q) = _merge_states([m, Q], P, [m, Q])
+    return P, Q_(Q, FLOW_UNIT), m.astype(int)
+
+
+def _merge_states(keys, P, values):
+    """Merge states with equal keys.
+
+    Probabilities are summed, other values are replaced with the lowest
+    value in the group. States are sorted by the keys.
+    """
+    _, index = np.unique(np.column_stack(keys), axis=0, return_inverse=True)
+    index = index.ravel()
+    n = index.max() + 1
+    merged = []
+    for value in values:
+        lowest = np.full(n, np.inf)
+        np.minimum.at(lowest, index, value)
+        merged.append(lowest)
+    return np.bincount(index, weights=P, minlength=n), merged
+
+
+def odh_class_array(phi):
+    """Calculate ODH class as defined in FESHM 4240 for an array of
+    fatality rates.
+
+    Vectorized version of `Volume.odh_class`.
+
+    Parameters
+    ----------
+    phi : float or numpy.ndarray
+        Fatality rate, 1/hr.
+
+    Returns
+    -------
+    numpy.ndarray
+        ODH class; -1 if the fatality rate is too high, i.e. where
+        `Volume.odh_class` returns None.
+    """
+    odh_class = np.searchsorted(ODH_CLASS_LIMITS, phi, side='right')
+    return np.where(odh_class < len(ODH_CLASS_LIMITS), odh_class, -1)
+
+
+@PROFILER.timed('conc_vent')
 def conc_vent(V, R, Q, t):
     """Calculate the oxygen concentration at the end of the event.
 
@@ -859,6 +1405,9 @@ def conc_vent(V, R, Q, t):
     t : ureg.Quantity {time: 1}
         time, beginning of release is at `t` = 0.
 
+    Floats in consistent units, e.g. ft^3, ft^3/min, and min, can be used
+    instead of quantities.
+
     Returns
     -------
     float
@@ -873,6 +1422,68 @@ def conc_vent(V, R, Q, t):
     return C
 
 
+@PROFILER.timed('conc_vent_array')
+def conc_vent_array(V, R, Q, t):
+    """Calculate the oxygen concentration at the end of the event for arrays
+    of spill rates, ventilation rates and durations.
+
+    Vectorized version of `conc_vent`. Inputs are floats or NumPy arrays
+    in consistent units, e.g. ft^3, ft^3/min, and min, and are broadcast
+    against each other.
+
+    Parameters
+    ----------
+    V : float or numpy.ndarray
+        Volume of the confined space.
+    R : float or numpy.ndarray
+        Volumetric spill rate into confined space.
+    Q : float or numpy.ndarray
+        Volumetric ventilation rate of fan(s); positive value corresponds
+        to blowing air into the confined space, negative - drawing contaminated
+        air outside.
+    t : float or numpy.ndarray
+        time, beginning of release is at `t` = 0.
+
+    Returns
+    -------
+    numpy.ndarray
+        Oxygen concentration.
+    """
+    V, R, Q, t = np.broadcast_arrays(*(np.asarray(x, dtype=float)
+                                       for x in (V, R, Q, t)))
+    Q_abs = np.abs(Q)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        C_supply = 0.21/(Q+R) * (Q+R*np.exp(-(Q+R)/V*t))
+        C_spill = 0.21*np.exp(-R/V*t)
+        C_exhaust = 0.21*(1-R/Q_abs*(1-np.exp(-Q_abs*t/V)))
+    return np.where(Q > 0, C_supply,
+                    np.where(Q_abs <= R, C_spill, C_exhaust))
+
+
+@PROFILER.timed('fatality_prob_array')
+def fatality_prob_array(O2_conc):
+    """Calculate fatality probability for an array of oxygen concentrations.
+
+    Vectorized version of `Volume._fatality_prob`.
+
+    Parameters
+    ----------
+    O2_conc : float or numpy.ndarray
+        Oxygen concentration.
+
+    Returns
+    -------
+    numpy.ndarray
+        Fatality probability.
+    """
+    O2_conc = np.asarray(O2_conc, dtype=float)
+    # Values outside of 8.8%-18% range are masked below
+    with np.errstate(over='ignore'):
+        F_i = 10**(6.5-76*O2_conc)
+    return np.where(O2_conc >= 0.18, 0.0,
+                    np.where(O2_conc <= 0.088, 1.0, F_i))
+
+
 def conc_final(V, R, Q):
     """Calculate the final oxygen concentration for continuous flow.
 
@@ -933,6 +1544,110 @@ def conc_after(V, C_e, Q, t, t_e):
     return C
 
 
+@PROFILER.timed('write_report_table')
+def write_report_table(filename, *Volumes, max_rows=EXCEL_MAX_ROWS):
+    """Write tables with the calculation results for volumes into a single
+    xlsx workbook.
+
+    The workbook is written in constant memory mode: rows are streamed to
+    the file as they are generated. Each volume gets its own sheet; if the
+    results don't fit into `max_rows` they are continued on the next sheet.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file without extension.
+    *Volumes : Volume
+        Volumes with calculated fail_modes.
+    max_rows : int
+        Max number of rows on a sheet.
+    """
+    # Imported here to keep the package import fast
+    import xlsxwriter
+    filename += '.xlsx'
+    with xlsxwriter.Workbook(filename,
+                             {'constant_memory': True}) as workbook:
+        formats = {
+            'header': workbook.add_format({'bold': True, 'font_size': 12,
+                                           'bottom': 3}),
+            'sci': workbook.add_format({'num_format': '0.00E+00'}),
+            'flow': workbook.add_format({'num_format': '#'}),
+            'percent': workbook.add_format({'num_format': '0%'}),
+            'number': workbook.add_format({'num_format': '0'}),
+            }
+        for volume in Volumes:
+            _write_volume_sheets(workbook, formats, volume, max_rows)
+
+
+def _write_volume_sheets(workbook, formats, volume, max_rows):
+    """Write results for a volume to one or more sheets."""
+    # Header row and 3 rows for summary
+    rows_per_sheet = max_rows - 4
+    names = volume.fail_modes.names.values
+    sources = volume.fail_modes.sources.values
+    col_width = [len(x) for x in REPORT_HEADER]
+    # For source names and failure names
+    col_width[0] = max([col_width[0]] + [len(x.name) for x in sources])
+    col_width[1] = max([col_width[1]] + [len(x) for x in names])
+    worksheet = None
+    row_n = 0
+    for row in volume._report_rows():
+        if worksheet is None or row_n > rows_per_sheet:
+            if worksheet is not None:
+                _finish_sheet(worksheet, row_n)
+            worksheet = _new_report_sheet(workbook, formats, volume.name,
+                                          col_width)
+            row_n = 1
+        worksheet.write_row(row_n, 0, row)
+        row_n += 1
+        PROFILER.count('write_report_table.rows')
+    if worksheet is None:
+        worksheet = _new_report_sheet(workbook, formats, volume.name,
+                                      col_width)
+        row_n = 1
+    _finish_sheet(worksheet, row_n)
+    # Writing total/summary
+    N_cols = len(REPORT_HEADER)
+    worksheet.write(row_n+1, N_cols-2, 'Total fatality rate, 1/hr')
+    worksheet.write(row_n+1, N_cols-1, volume.phi.to(1/ureg.hr).magnitude)
+    worksheet.write(row_n+2, N_cols-2, 'ODH class')
+    worksheet.write(row_n+2, N_cols-1, volume.odh_class(), formats['number'])
+
+
+def _new_report_sheet(workbook, formats, name, col_width):
+    """Add a sheet with the results table header."""
+    # Excel sheet names are limited to 31 characters without []:*?/\
+    base = ''.join('_' if c in '[]:*?/\\' else c for c in name)[:31]
+    sheet_name = base
+    n = 1
+    while workbook.get_worksheet_by_name(sheet_name) is not None:
+        n += 1
+        suffix = f' ({n})'
+        sheet_name = base[:31-len(suffix)] + suffix
+    worksheet = workbook.add_worksheet(sheet_name)
+    col_format = {2: 'sci', 4: 'sci', 5: 'flow', 8: 'sci', 9: 'percent',
+                  10: 'sci', 11: 'sci'}
+    # Autofit column width
+    for col_n, width in enumerate(col_width):
+        adj_width = width - 0.005 * width**2
+        worksheet.set_column(col_n, col_n, adj_width,
+                             formats.get(col_format.get(col_n)))
+    worksheet.set_row(0, None, formats['header'])
+    worksheet.write_row(0, 0, REPORT_HEADER)
+    worksheet.freeze_panes(1, 0)
+    return worksheet
+
+
+def _finish_sheet(worksheet, row_n):
+    """Add formatting for the written rows."""
+    # Adding usability
+    N_cols = len(REPORT_HEADER)
+    worksheet.conditional_format(
+        1, N_cols-1, row_n-1, N_cols-1,
+        {'type': '3_color_scale', 'min_color': '#008000',
+         'max_color': '#FF0000'})
+
+
 def print_result(*Volumes):
     """Print the results of the ODH analysis for a volume.
 
@@ -1 +1,11 @@
 from .ODH_class import *
+from .monte_carlo import monte_carlo, LogNormal
+from .sweep import sweep
+from .instrumentation import PROFILER, profile
+from .transient import transient
+from .facility import Facility
+from .cache import enable_persistent_cache, disable_persistent_cache
+from .loader import load_facility
+from .importance import importance
+from .ventilation import min_ventilation
+from .scenarios import evaluate_scenarios, Scenario, NORMAL_POWER, POWER_OUTAGE
@@ -0,0 +1,221 @@
+"""Evaluate many facility files at once.
+
+Usage::
+
+    python -m ODH_analysis.batch areas/*.yaml --output results --jobs 8
+
+Each facility file (see `loader`) is loaded and evaluated in a separate
+worker process. For each facility an xlsx workbook with the report tables
+and a JSON file with the fatality rates and ODH classes are written to the
+output directory; `summary.json` lists the results for all files. Failed
+files are recorded in the summary and the exit status is 1.
+
+Output files are named after the input files relative to their common
+directory, e.g. `north_hall.json` for `areas/north/hall.yaml`, so that
+facilities with the same name or file name in different directories don't
+overwrite each other. Files are written under a temporary name and
+renamed, so a concurrent run never leaves a partially written file."""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .ODH_class import ODHError, odh_class_array, write_report_table
+from .loader import load_facility
+from .storage import RATE_UNIT
+
+SUMMARY_FILE = 'summary.json'
+
+
+def evaluate_file(path, output, xlsx=True, processes=None, name=None):
+    """Load a facility file, calculate fatality rates and write results.
+
+    Parameters
+    ----------
+    path : str
+        Facility file.
+    output : str
+        Output directory.
+    xlsx : bool
+        If True, report tables are written to `<name>.xlsx`.
+    processes : int
+        Number of worker processes used for leak flow calculation.
+    name : str
+        Name of the output files without extension; name of the facility
+        file by default, see `output_names`.
+
+    Returns
+    -------
+    dict
+        Facility results as written to `<name>.json`.
+    """
+    start = time.perf_counter()
+    model = load_facility(path, processes)
+    model.odh()
+    if name is None:
+        name = output_names([path])[0]
+    filename = os.path.join(output, name)
+    # Unique temporary name for this process
+    temp = f'{filename}.{os.getpid()}.tmp'
+    if xlsx:
+        write_report_table(temp, *model.volumes)
+        os.replace(temp + '.xlsx', filename + '.xlsx')
+    result = dict(summarize(model), file=path, output=name,
+                  time=time.perf_counter()-start)
+    with open(temp, 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(temp, filename + '.json')
+    return result
+
+
+def output_names(paths):
+    """Return names of the output files for facility files.
+
+    Names are the paths relative to the common directory of the files
+    without extension, with path separators and other special characters
+    replaced by underscores.
+
+    Raises
+    ------
+    ODHError
+        If two files have the same output name.
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    names = [_file_name(os.path.splitext(os.path.relpath(path, root))[0])
+             for path in paths]
+    files = {}
+    for path, name in zip(paths, names):
+        if name in files:
+            raise ODHError(f'{files[name]} and {path} have the same output '
+                           f'name {name}')
+        files[name] = path
+    return names
+
+
+def summarize(model):
+    """Collect fatality rates and ODH classes of a calculated facility.
+
+    Parameters
+    ----------
+    model : FacilityModel
+        Facility after `FacilityModel.odh`.
+
+    Returns
+    -------
+    dict
+        Facility name, rate unit and for each volume: fatality rate, ODH
+        class (-1 if too high) and number of fail modes; with exchange
+        flows also the fatality rate and ODH class of the connected zone.
+    """
+    volumes = {}
+    for volume in model.volumes:
+        phi = volume.phi.to(RATE_UNIT).magnitude
+        volumes[volume.name] = {'phi': float(phi),
+                                'odh_class': int(odh_class_array(phi)),
+                                'fail_modes': len(volume.fail_modes)}
+    if model.facility is not None:
+        phi = model.facility.phi.to(RATE_UNIT).magnitude
+        for volume, zone_phi, zone_class in zip(
+                model.facility.volumes, phi, model.facility.odh_class()):
+            volumes[volume.name]['facility_phi'] = float(zone_phi)
+            volumes[volume.name]['facility_odh_class'] = int(zone_class)
+    return {'name': model.name, 'rate_unit': str(RATE_UNIT),
+            'volumes': volumes}
+
+
+def run_batch(paths, output, jobs=None, xlsx=True, processes=None):
+    """Evaluate facility files concurrently.
+
+    Parameters
+    ----------
+    paths : list of str
+        Facility files.
+    jobs : int
+        Number of files evaluated at once; `os.cpu_count()` by default.
+
+    Returns
+    -------
+    dict
+        Results for each file and errors for files that failed.
+
+    Raises
+    ------
+    ODHError
+        If two files have the same output name, see `output_names`.
+
+    See `evaluate_file` for other parameters.
+    """
+    names = output_names(paths)
+    os.makedirs(output, exist_ok=True)
+    results = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(evaluate_file, path, output, xlsx,
+                                   processes, name): path
+                   for path, name in zip(paths, names)}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as error:
+                errors[path] = f'{type(error).__name__}: {error}'
+    summary = {'results': [results[path] for path in paths
+                           if path in results],
+               'errors': errors}
+    with open(os.path.join(output, SUMMARY_FILE), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_summary(summary):
+    """Print fatality rate and ODH class for each volume."""
+    print(f'{"Facility":<30} {"Volume":<30} {"phi, " + str(RATE_UNIT):>12} '
+          f'{"Class":>5}')
+    for result in summary['results']:
+        for name, volume in result['volumes'].items():
+            phi = volume.get('facility_phi', volume['phi'])
+            odh_class = volume.get('facility_odh_class', volume['odh_class'])
+            odh_class = odh_class if odh_class >= 0 else 'high'
+            print(f'{result["name"]:<30} {name:<30} {phi:12.2e} '
+                  f'{odh_class:>5}')
+    for path, error in summary['errors'].items():
+        print(f'Failed: {path}: {error}', file=sys.stderr)
+
+
+def _file_name(name):
+    """Make a file name from the facility or file name."""
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Evaluate ODH for facility files.')
+    parser.add_argument('files', nargs='+', help='JSON, TOML or YAML files')
+    parser.add_argument('-o', '--output', default='.',
+                        help='output directory')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='number of files evaluated at once')
+    parser.add_argument('--processes', type=int,
+                        help='worker processes for leak flow calculation '
+                        'in each job')
+    parser.add_argument('--no-xlsx', dest='xlsx', action='store_false',
+                        help='write JSON results only')
+    args = parser.parse_args(argv)
+    try:
+        output_names(args.files)
+    except ODHError as error:
+        parser.error(str(error))
+    summary = run_batch(args.files, args.output, args.jobs, args.xlsx,
+                        args.processes)
+    print_summary(summary)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""Benchmarks for ODH analysis with synthetic facility models.
+
+Run `python -m ODH_analysis.benchmarks.run --help` for usage."""
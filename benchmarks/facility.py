@@ -0,0 +1,98 @@
+"""Synthetic facility generators for benchmarks.
+
+Facilities consist of helium and nitrogen sources with a given number of
+leaks and a volume with a given number of fans. Leak parameters are
+drawn from log-uniform distributions covering the range of values typical
+for FESHM 4240 analyses; the same seed always produces the same facility."""
+
+import numpy as np
+import heat_transfer as ht
+
+from ..ODH_class import Source, Volume, ureg, Q_
+
+# Storage conditions of the synthetic sources
+FLUIDS = {'helium': (Q_(4.5, ureg.K), Q_(1.3, ureg.bar)),
+          'nitrogen': (Q_(77, ureg.K), Q_(1.5, ureg.bar))}
+# Tube sizes used for piping, OD and wall
+TUBES = [(Q_(0.5, ureg.inch), Q_(0.035, ureg.inch)),
+         (Q_(1, ureg.inch), Q_(0.065, ureg.inch)),
+         (Q_(2, ureg.inch), Q_(0.065, ureg.inch)),
+         (Q_(4, ureg.inch), Q_(0.083, ureg.inch))]
+
+
+def _log_uniform(rng, low, high, size):
+    return np.exp(rng.uniform(np.log(low), np.log(high), size))
+
+
+def synthetic_sources(n_leaks, fluids=('helium', 'nitrogen'), seed=0):
+    """Create sources with `n_leaks` leaks in total.
+
+    Leaks are added directly to the leak tables in canonical units, so that
+    large facilities can be created without flow calculations.
+
+    Parameters
+    ----------
+    n_leaks : int
+        Total number of leaks split between the sources.
+    fluids : tuple of str
+        Fluids of the sources, one source per fluid.
+    seed : int
+        Seed for the random number generator.
+
+    Returns
+    -------
+    list of Source
+    """
+    rng = np.random.default_rng(seed)
+    sources = []
+    for i, fluid_name in enumerate(fluids):
+        T, P = FLUIDS[fluid_name]
+        fluid = ht.ThermState(fluid_name, T=T, P=P)
+        source = Source(f'{fluid_name} dewar', fluid, Q_(1000, ureg.L))
+        n = n_leaks // len(fluids) + (i < n_leaks % len(fluids))
+        leak_fr = _log_uniform(rng, 1e-11, 1e-5, n)
+        q_leak = _log_uniform(rng, 1, 10000, n)
+        N = rng.integers(1, 10, n)
+        for j in range(n):
+            source.leaks.add(f'Synthetic leak {j}', leak_fr[j]*N[j],
+                             q_leak[j], source._volume/q_leak[j], N[j])
+        sources.append(source)
+    return sources
+
+
+def synthetic_volume(n_fans, volume=Q_(50000, ureg.ft**3)):
+    """Create a volume with `n_fans` fans."""
+    return Volume('Synthetic hall', volume,
+                  Q_fan=Q_(2000, ureg.ft**3/ureg.min), N_fans=n_fans,
+                  T_fan=Q_(3, ureg.month),
+                  vent_rate=Q_(500, ureg.ft**3/ureg.min))
+
+
+def synthetic_facility(n_leaks, n_fans, fluids=('helium', 'nitrogen'),
+                       seed=0):
+    """Create sources and a volume for a synthetic facility.
+
+    Returns
+    -------
+    sources : list of Source
+    volume : Volume
+    """
+    return synthetic_sources(n_leaks, fluids, seed), synthetic_volume(n_fans)
+
+
+def synthetic_tubes(n_tubes, seed=0):
+    """Create tubes for piping failure benchmarks.
+
+    Tubes have a few standard sizes and random lengths.
+
+    Returns
+    -------
+    list of heat_transfer.piping.Tube
+    """
+    rng = np.random.default_rng(seed)
+    tubes = []
+    for k, L in zip(rng.integers(0, len(TUBES), n_tubes),
+                    _log_uniform(rng, 1, 100, n_tubes)):
+        OD, wall = TUBES[k]
+        tubes.append(ht.piping.Tube(OD, wall, L=Q_(L, ureg.ft)))
+    return tubes
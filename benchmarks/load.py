@@ -0,0 +1,173 @@
+"""Load test of the ODH evaluation server.
+
+Usage::
+
+    python -m ODH_analysis.benchmarks.load --clients 32 --requests 20
+    python -m ODH_analysis.benchmarks.load --socket /tmp/odh.sock
+
+Without `--host`/`--socket` of a running server, a server is started in
+this process. Each client sends requests over one keep-alive connection;
+facilities are drawn from a set of `--variants` synthetic facilities, so
+that repeated facilities show the effect of the result cache and of the
+request batching. Throughput and latency percentiles are printed."""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import numpy as np
+
+from ..server import ODHServer
+
+FLUIDS = ('helium', 'nitrogen')
+
+
+def synthetic_facility(seed, n_tubes=5):
+    """Create a facility description in the format of `loader`.
+
+    Parameters
+    ----------
+    seed : int
+        Facility variant; equal seeds give equal facilities.
+    n_tubes : int
+        Number of pipes of each source.
+    """
+    rng = random.Random(seed)
+    sources = []
+    for i, fluid in enumerate(FLUIDS):
+        pipes = [{'type': 'Tube', 'OD': f'{rng.choice([0.5, 1, 2])} inch',
+                  'wall': '0.035 inch', 'L': f'{rng.randint(1, 20)} m'}
+                 for _ in range(n_tubes)]
+        sources.append({
+            'name': f'Dewar {i}',
+            'fluid': {'name': fluid, 'T': '300 K', 'P': '200 psi'},
+            'volume': f'{rng.choice([100, 500, 1000])} L',
+            'failures': [{'type': 'pipe_failure', 'tube': pipe,
+                          'N_welds': 2} for pipe in pipes]})
+    return {'name': f'Facility {seed}',
+            'sources': sources,
+            'volumes': [{'name': 'Hall', 'volume': '5000 m^3',
+                         'Q_fan': '2000 ft^3/min', 'N_fans': 2,
+                         'T_fan': '3 month',
+                         'sources': [s['name'] for s in sources]}]}
+
+
+class Client:
+    """HTTP/1.1 client with a keep-alive connection."""
+    def __init__(self, host=None, port=None, path=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        if self.path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                self.path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port)
+
+    async def request(self, method, target, data=None):
+        """Send a request and return status and decoded JSON response."""
+        body = b'' if data is None else json.dumps(data).encode()
+        self._writer.write(f'{method} {target} HTTP/1.1\r\n'
+                           f'Host: localhost\r\n'
+                           f'Content-Type: application/json\r\n'
+                           f'Content-Length: {len(body)}\r\n\r\n'
+                           .encode('latin-1') + body)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self._reader.readexactly(length))
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def run_client(client, facilities, n_requests, latencies, errors):
+    await client.connect()
+    try:
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            status, response = await client.request(
+                'POST', '/odh', random.choice(facilities))
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(response.get('error', status))
+    finally:
+        await client.close()
+
+
+async def load_test(args):
+    server = None
+    host, port, path = args.host, args.port, args.socket
+    if host is None and path is None:
+        server = ODHServer(args.processes)
+        host = '127.0.0.1'
+        port = (await server.start(host, 0)).sockets[0].getsockname()[1]
+    facilities = [synthetic_facility(seed, args.tubes)
+                  for seed in range(args.variants)]
+    latencies = []
+    errors = []
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_client(Client(host, port, path),
+                                          facilities, args.requests,
+                                          latencies, errors)
+                               for _ in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        client = Client(host, port, path)
+        await client.connect()
+        _, stats = await client.request('GET', '/stats')
+        await client.close()
+    finally:
+        if server is not None:
+            await server.close()
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f'{len(latencies)} requests in {elapsed:.2f} s: '
+          f'{len(latencies)/elapsed:.1f} requests/s')
+    print(f'Latency, ms: p50 {p50:.1f}, p95 {p95:.1f}, p99 {p99:.1f}')
+    print(f'Batches: {stats["batches"]}, evaluated: {stats["evaluated"]}, '
+          f'errors: {len(errors)}')
+    print(f'Result cache: {stats["results"]}')
+    print(f'Leak flow cache: {stats["leak_flows"]}')
+    for error in sorted(set(map(str, errors))):
+        print(f'Error: {error}', file=sys.stderr)
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Load test of the ODH evaluation server.')
+    parser.add_argument('--host', help='host of a running server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help='Unix socket of a running server')
+    parser.add_argument('--clients', type=int, default=16,
+                        help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='number of requests of each client')
+    parser.add_argument('--variants', type=int, default=8,
+                        help='number of distinct facilities')
+    parser.add_argument('--tubes', type=int, default=5,
+                        help='number of pipes of each source')
+    parser.add_argument('--processes', type=int,
+                        help='leak flow worker processes of the started '
+                        'server')
+    args = parser.parse_args(argv)
+    return asyncio.run(load_test(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Run benchmarks and compare the results with a stored baseline.
+
+Usage::
+
+    python -m ODH_analysis.benchmarks.run --save benchmarks/baseline.json
+    python -m ODH_analysis.benchmarks.run --compare benchmarks/baseline.json
+
+Each benchmark is timed (best of several repeats) and its peak memory
+allocation is measured with `tracemalloc` in a separate run. Comparison
+reports time and memory ratios against the baseline and exits with
+status 1 if any benchmark is slower or uses more memory than allowed by
+the tolerance.
+
+Timings depend on the machine, so the baseline is not a part of the
+package: save it on the reference machine from the version to compare
+against, e.g. the main branch, then compare the working tree with it. The
+baseline stores its run settings (`--filter`, `--quick`, `--repeat`);
+`--compare` uses them unless given explicitly.
+
+The benchmarks use internal interfaces (`Volume._source_results`, the leak
+tables `Source.leaks`, `Volume._fan_fail`, `Source._leak_flow`), so the
+reference version has to contain this harness: comparisons are supported
+between versions from the introduction of the benchmarks on, not with
+earlier versions."""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+import numpy as np
+
+from .. import ODH_class as odh
+from ..cache import LEAK_FLOW_CACHE
+from .facility import synthetic_facility, synthetic_sources, \
+    synthetic_volume, synthetic_tubes
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+LEAKS = [10, 100, 1000, 10000, 100000]
+FANS = [1, 5, 20]
+# Largest size used with --quick
+QUICK_LEAKS = 1000
+# Name of the package as imported, e.g. ODH_analysis
+PACKAGE = __package__.split('.')[0]
+
+
+def bench_odh(n_leaks, n_fans):
+    sources, volume = synthetic_facility(n_leaks, n_fans)
+
+    def run():
+        # Discard stored results so that every leak is evaluated
+        volume._source_results = {}
+        volume.odh(sources)
+    return run
+
+
+def bench_odh_incremental(n_leaks, n_fans):
+    sources, volume = synthetic_facility(n_leaks, n_fans)
+    volume.odh(sources)
+
+    def run():
+        # Replaced leak gets a new id and is the only one reevaluated
+        sources[0].leaks[0] = sources[0].leaks[0]
+        volume.odh(sources)
+    return run
+
+
+def bench_fan_fail(n_fans):
+    volume = synthetic_volume(n_fans)
+
+    return volume._fan_fail
+
+
+def bench_pipe_failure(n_tubes, fluid, cache):
+    tubes = synthetic_tubes(n_tubes)
+    source = synthetic_sources(0, fluids=(fluid,))[0]
+
+    def run():
+        LEAK_FLOW_CACHE.clear()
+        LEAK_FLOW_CACHE.enabled = cache
+        try:
+            source.leaks.clear()
+            for tube in tubes:
+                source.pipe_failure(tube, N_welds=2)
+        finally:
+            LEAK_FLOW_CACHE.enabled = True
+    return run
+
+
+def bench_leak_flow(n_tubes, fluid):
+    tubes = synthetic_tubes(n_tubes)
+    source = synthetic_sources(0, fluids=(fluid,))[0]
+    area = odh.Q_(10, odh.ureg.mm**2)
+
+    def run():
+        LEAK_FLOW_CACHE.enabled = False
+        try:
+            for tube in tubes:
+                odh.Source._leak_flow(tube, area, source.fluid)
+        finally:
+            LEAK_FLOW_CACHE.enabled = True
+    return run
+
+
+def bench_report_table(n_leaks, n_fans):
+    sources, volume = synthetic_facility(n_leaks, n_fans)
+    volume.odh(sources)
+    directory = tempfile.mkdtemp()
+
+    def run():
+        volume.report_table(os.path.join(directory, 'ODH_report'))
+    return run
+
+
+def bench_report_short_table(n_leaks, n_fans):
+    sources, volume = synthetic_facility(n_leaks, n_fans)
+    volume.odh(sources)
+
+    def run():
+        volume.report_short_table()
+    return run
+
+
+def bench_import(module):
+    # Fresh interpreter for each import; includes the interpreter start
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    def run():
+        subprocess.run([sys.executable, '-c', f'import {module}'],
+                       check=True, env=env)
+    return run
+
+
+def benchmarks(quick=False):
+    """Return dict of benchmark names and setup functions.
+
+    Setup function prepares the data and returns the function to time.
+    """
+    leaks = [n for n in LEAKS if not quick or n <= QUICK_LEAKS]
+    cases = {}
+    # heat_transfer import is the lower bound for the package import
+    for module in ('heat_transfer', PACKAGE):
+        cases[f'import[{module}]'] = (bench_import, module)
+    for n in leaks:
+        cases[f'odh[leaks={n},fans=3]'] = (bench_odh, n, 3)
+    for n_fans in FANS:
+        cases[f'odh[leaks={leaks[-1]},fans={n_fans}]'] = \
+            (bench_odh, leaks[-1], n_fans)
+        cases[f'fan_fail[fans={n_fans}]'] = (bench_fan_fail, n_fans)
+    cases[f'odh_incremental[leaks={leaks[-1]},fans=3]'] = \
+        (bench_odh_incremental, leaks[-1], 3)
+    for fluid in ('helium', 'nitrogen'):
+        for n in (10, 100):
+            cases[f'leak_flow[tubes={n},{fluid}]'] = \
+                (bench_leak_flow, n, fluid)
+            for cache in (False, True):
+                cases[f'pipe_failure[tubes={n},{fluid},cache={cache}]'] = \
+                    (bench_pipe_failure, n, fluid, cache)
+    for n in leaks[-3:]:
+        cases[f'report_table[leaks={n},fans=3]'] = \
+            (bench_report_table, n, 3)
+        cases[f'report_short_table[leaks={n},fans=3]'] = \
+            (bench_report_short_table, n, 3)
+    return cases
+
+
+def measure(setup, *args, repeat=3):
+    """Time the benchmark and measure its peak memory allocation.
+
+    Fast benchmarks are run in a loop long enough for a reliable timing,
+    see `timeit.Timer.autorange`.
+
+    Returns
+    -------
+    dict
+        Best time per run, s, and peak allocated memory, bytes.
+    """
+    run = setup(*args)
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    times = [t/number for t in timer.repeat(repeat, number)]
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'time': min(times), 'peak_memory': peak}
+
+
+def run_benchmarks(pattern='*', quick=False, repeat=3):
+    """Run benchmarks with names matching the pattern.
+
+    Returns
+    -------
+    dict
+        Machine information, run settings and results for each benchmark.
+    """
+    results = {}
+    for name, (setup, *args) in benchmarks(quick).items():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        results[name] = measure(setup, *args, repeat=repeat)
+        print(f'{name:<50} {results[name]["time"]*1e3:10.3f} ms '
+              f'{results[name]["peak_memory"]/2**20:10.2f} MiB')
+    return {'machine': {'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'platform': platform.platform(),
+                        'processor': platform.processor()},
+            'settings': {'filter': pattern, 'quick': quick,
+                         'repeat': repeat},
+            'results': results}
+
+
+def compare(results, baseline, tolerance):
+    """Print comparison with the baseline.
+
+    Returns
+    -------
+    list of str
+        Names of the benchmarks exceeding the tolerance.
+    """
+    regressions = []
+    print(f'\n{"Benchmark":<50} {"time":>8} {"memory":>8}')
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            print(f'{name:<50} {"new":>8}')
+            continue
+        base = baseline['results'][name]
+        time_ratio = result['time'] / base['time']
+        memory_ratio = result['peak_memory'] / max(base['peak_memory'], 1)
+        flag = ''
+        if time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<50} {time_ratio:8.2f} {memory_ratio:8.2f}{flag}')
+    for name in baseline['results']:
+        if name not in results['results']:
+            print(f'{name:<50} {"missing":>8}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run ODH analysis benchmarks.')
+    # Settings default to None so that the baseline settings can be used
+    parser.add_argument('-k', '--filter',
+                        help='run benchmarks matching the glob pattern, '
+                        'all by default')
+    parser.add_argument('--quick', action='store_true', default=None,
+                        help=f'limit facilities to {QUICK_LEAKS} leaks')
+    parser.add_argument('--repeat', type=int,
+                        help='number of timed runs, best is reported; 3 by '
+                        'default')
+    parser.add_argument('--save', metavar='PATH', nargs='?', const=BASELINE,
+                        help='save results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', nargs='?',
+                        const=BASELINE,
+                        help='compare results with a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase of time and memory')
+    args = parser.parse_args(argv)
+    settings = {'filter': '*', 'quick': False, 'repeat': 3}
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            parser.error(f'baseline {args.compare} not found; create it on '
+                         'this machine from the reference version with '
+                         '--save, see the module docstring')
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        settings.update(baseline.get('settings', {}))
+    settings.update({key: value for key, value in vars(args).items()
+                     if key in settings and value is not None})
+    results = run_benchmarks(settings['filter'], settings['quick'],
+                             settings['repeat'])
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if baseline is not None:
+        if baseline['machine'] != results['machine']:
+            print('\nWarning: baseline was recorded on a different machine: '
+                  f'{baseline["machine"]}')
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,452 @@
+"""Caches for expensive fluid property and flow calculations.
+
+Leak flow calculation requires solving the flow through a piping element
+using CoolProp based fluid properties. Identical piping elements are
+very common in the models (e.g. multiple bellows or transfer lines), so
+the results are stored and reused based on the content of the inputs.
+Fluid properties at Normal Temperature and Pressure (NTP) are calculated
+once per fluid and stored in `NTP_STATES`.
+
+Both can be backed by an optional on-disk `PersistentCache` shared between
+sessions and processes, see `enable_persistent_cache`."""
+
+import hashlib
+import numbers
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from importlib import metadata
+import heat_transfer as ht
+from .instrumentation import PROFILER
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+# Part of a key valid only in the current session: an object compared by
+# identity or by its repr; keys containing it are not stored on disk
+SessionKey = namedtuple('SessionKey', ['value'])
+# Version of the cached calculations included in every persistent cache
+# key; increase whenever leak flow or NTP density calculation changes
+CACHE_FORMAT_VERSION = 1
+
+
+class LRUCache:
+    """Content-keyed cache with least recently used eviction.
+
+    Attributes
+    ----------
+    enabled : bool
+        If False, the cache is bypassed: nothing is stored or returned.
+    hits : int
+        Number of successful lookups.
+    misses : int
+        Number of failed lookups.
+    persistent : PersistentCache or None
+        Second level cache checked on a miss and updated on every store.
+    """
+    def __init__(self, maxsize=1024, enabled=True):
+        """Create an empty cache.
+
+        Parameters
+        ----------
+        maxsize : int or None
+            Max number of entries stored. None means unbounded.
+        enabled : bool
+            Whether the cache is used.
+        """
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.persistent = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return cached value for the key and mark it as recently used."""
+        if not self.enabled:
+            return default
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                pass
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        if self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Store the value evicting least recently used entries if full."""
+        if not self.enabled:
+            return
+        self._store(key, value)
+        if self.persistent is not None:
+            self.persistent.put(key, value)
+
+    def _store(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """Change max number of entries evicting extra entries if needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Return cache statistics.
+
+        Returns
+        -------
+        CacheInfo
+            Hits, misses, max size and current size of the cache.
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+def quantity_key(value):
+    """Convert a value to a hashable key.
+
+    Quantities are converted to base units so that equal values
+    defined in different units produce the same key. Numbers, strings and
+    None are used as is, lists and tuples are converted element-wise. Other
+    values are wrapped in `SessionKey`: their repr or identity may differ
+    between sessions.
+    """
+    if hasattr(value, 'to_base_units'):
+        value = value.to_base_units()
+        return (float(value.magnitude), str(value.units))
+    if value is None or isinstance(value, (numbers.Number, str, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(quantity_key(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return SessionKey(repr(value))
+    return SessionKey(value)
+
+
+def is_persistent(key):
+    """Return True if the key is the same in every session."""
+    if isinstance(key, SessionKey):
+        return False
+    if isinstance(key, tuple):
+        return all(is_persistent(item) for item in key)
+    return True
+
+
+def element_key(element):
+    """Create a content key for a piping element.
+
+    The key consists of the element type and all its attributes,
+    e.g. OD, wall thickness, length and roughness for a tube.
+    """
+    attributes = tuple((name, quantity_key(value)) for name, value in
+                       sorted(vars(element).items()))
+    return (type(element).__name__, attributes)
+
+
+def fluid_key(fluid):
+    """Create a content key for a thermodynamic state: (name, T, P)."""
+    return (fluid.name, quantity_key(fluid.T), quantity_key(fluid.P))
+
+
+def leak_flow_key(tube, area, fluid):
+    """Create a content key for the leak flow calculation."""
+    return (element_key(tube), quantity_key(area), fluid_key(fluid))
+
+
+class NTPRegistry:
+    """Registry of fluid states at Normal Temperature and Pressure.
+
+    States are keyed by fluid name and calculated once per process.
+
+    Attributes
+    ----------
+    persistent : PersistentCache or None
+        On-disk cache of the densities at NTP.
+    """
+    def __init__(self):
+        self._states = {}
+        self._Dmass = {}
+        self._lock = threading.Lock()
+        self.persistent = None
+
+    def state(self, fluid):
+        """Return the state of the fluid at NTP.
+
+        Parameters
+        ----------
+        fluid : heat_transfer.ThermState
+            Fluid at any conditions.
+
+        Returns
+        -------
+        heat_transfer.ThermState
+            Fluid at `ht.T_NTP` and `ht.P_NTP`. The returned state is shared
+            and should not be updated.
+        """
+        try:
+            return self._states[fluid.name]
+        except KeyError:
+            pass
+        with self._lock:
+            if fluid.name not in self._states:
+                fluid_NTP = fluid.copy()
+                with PROFILER.timer('NTPRegistry.update'):
+                    fluid_NTP.update_kw(P=ht.P_NTP, T=ht.T_NTP)
+                self._states[fluid.name] = fluid_NTP
+            return self._states[fluid.name]
+
+    def Dmass(self, fluid):
+        """Return mass density of the fluid at NTP."""
+        try:
+            return self._Dmass[fluid.name]
+        except KeyError:
+            pass
+        key = ('Dmass', fluid.name, quantity_key(ht.T_NTP),
+               quantity_key(ht.P_NTP))
+        Dmass = None
+        if self.persistent is not None:
+            Dmass = self.persistent.get(key)
+        if Dmass is None:
+            with PROFILER.timer('NTPRegistry.Dmass'):
+                Dmass = self.state(fluid).Dmass
+            if self.persistent is not None:
+                self.persistent.put(key, Dmass)
+        self._Dmass[fluid.name] = Dmass
+        return Dmass
+
+    def clear(self):
+        """Remove all stored states."""
+        with self._lock:
+            self._states.clear()
+            self._Dmass.clear()
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, name):
+        return name in self._states
+
+
+def library_versions():
+    """Return versions of the libraries the cached results depend on."""
+    versions = []
+    for name in ('heat_transfer', 'CoolProp', 'pint'):
+        try:
+            version = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            module = {'heat_transfer': ht}.get(name)
+            version = getattr(module, '__version__', None)
+        versions.append((name, version))
+    return tuple(versions)
+
+
+def default_cache_path():
+    """Return path of the cache file in the user cache directory.
+
+    `ODH_CACHE_DIR` environment variable overrides the directory.
+    """
+    directory = os.environ.get('ODH_CACHE_DIR')
+    if directory is None:
+        if os.name == 'nt':
+            base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        else:
+            base = os.environ.get('XDG_CACHE_HOME',
+                                  os.path.expanduser('~/.cache'))
+        directory = os.path.join(base, 'ODH_analysis')
+    return os.path.join(directory, 'cache.sqlite3')
+
+
+class PersistentCache:
+    """Cache of quantities and floats stored in an SQLite database.
+
+    Keys are content keys (see `leak_flow_key`) combined with
+    `CACHE_FORMAT_VERSION` and the versions of the libraries and hashed
+    with SHA-256, so results calculated by a different version of the
+    calculation, CoolProp or heat_transfer are never returned.
+    The database is opened in WAL mode and may be shared by several
+    processes; each thread and process uses its own connection. Keys that
+    are valid only in the current session (see `is_persistent`) are
+    neither stored nor looked up.
+
+    Attributes
+    ----------
+    path : str
+        Database file.
+    maxsize : int or None
+        Max number of entries. Oldest stored entries are removed when
+        the limit is exceeded, checked every `EVICT_EVERY` stores.
+        None means unbounded.
+    """
+    # Version of the database layout and value encoding
+    FORMAT = 1
+    EVICT_EVERY = 64
+
+    def __init__(self, path=None, maxsize=100000, versions=None,
+                 timeout=30):
+        """Open or create the cache database.
+
+        Parameters
+        ----------
+        path : str
+            Database file; `default_cache_path` by default.
+        maxsize : int or None
+            Max number of entries.
+        versions : tuple
+            Versions included in every key; `library_versions` by default.
+        timeout : float
+            Time to wait for a lock held by another process, s.
+        """
+        self.path = path if path is not None else default_cache_path()
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._salt = repr((self.FORMAT, CACHE_FORMAT_VERSION,
+                           versions if versions is not None
+                           else library_versions()))
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, magnitude REAL NOT NULL, units TEXT, '
+                'stored REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_stored ON cache (stored)')
+            self._evict(connection)
+
+    def get(self, key):
+        """Return stored value for the key or None."""
+        if not is_persistent(key):
+            return None
+        row = self._connection().execute(
+            'SELECT magnitude, units FROM cache WHERE key = ?',
+            (self._hash(key),)).fetchone()
+        if row is None:
+            return None
+        magnitude, units = row
+        return magnitude if units is None else ht.ureg.Quantity(magnitude,
+                                                                units)
+
+    def put(self, key, value):
+        """Store a quantity or a float."""
+        if not is_persistent(key):
+            return
+        if hasattr(value, 'magnitude'):
+            magnitude, units = float(value.magnitude), str(value.units)
+        else:
+            magnitude, units = float(value), None
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                (self._hash(key), magnitude, units, time.time()))
+            self._local.stores += 1
+            if self._local.stores % self.EVICT_EVERY == 0:
+                self._evict(connection)
+
+    def _evict(self, connection):
+        if self.maxsize is not None:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY stored DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+
+    def clear(self):
+        """Remove all entries, including the ones of other versions."""
+        with self._connection() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self):
+        """Close the connection of the current thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _hash(self, key):
+        return hashlib.sha256((self._salt + repr(key)).encode()).hexdigest()
+
+    def _connection(self):
+        """Return connection of the current thread and process."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.stores = 0
+        return connection
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+def enable_persistent_cache(path=None, maxsize=100000):
+    """Back `LEAK_FLOW_CACHE` and `NTP_STATES` with an on-disk cache.
+
+    Parameters
+    ----------
+    path : str
+        Database file; `default_cache_path` by default.
+    maxsize : int or None
+        Max number of entries.
+
+    Returns
+    -------
+    PersistentCache
+    """
+    persistent = PersistentCache(path, maxsize)
+    LEAK_FLOW_CACHE.persistent = persistent
+    NTP_STATES.persistent = persistent
+    return persistent
+
+
+def disable_persistent_cache():
+    """Stop using the on-disk cache."""
+    LEAK_FLOW_CACHE.persistent = None
+    NTP_STATES.persistent = None
+
+
+# Cache used by `Source._leak_flow`
+LEAK_FLOW_CACHE = LRUCache(maxsize=4096)
+# Fluid states at NTP used by `Source` methods
+NTP_STATES = NTPRegistry()
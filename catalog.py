@@ -0,0 +1,167 @@
+"""Failure rates indexed by component and failure mode.
+
+FESHM 4240 Tables 1 and 2 are flattened into `FailureRate` entries keyed by
+(component, mode); nested components are joined with a comma, e.g.
+('Solid State Device, HI PWR', 'Short'). Each entry has the rate, the leak
+area if the table defines one (None for ruptures through the full bore),
+the kind of the rate and its magnitude in canonical units of the kind.
+
+Site-specific rates are added as override layers in the same nested
+format as the tables::
+
+    site_rates = FAILURE_RATES.with_overrides(
+        {'Fan': {'Failure to run': '5e-6 1/hr'},
+         'Piping': {'Small leak': {'Area': '5 mm^2',
+                                   'Failure rate': '2e-9 1/(m*hr)'}}})
+    source = Source('Dewar', fluid, volume, failure_rates=site_rates)
+"""
+
+from collections import namedtuple
+
+from .FESHM4240_TABLES import TABLE_1, TABLE_2
+from .storage import Q_, ureg, RATE_UNIT
+
+FailureRate = namedtuple('FailureRate', ['component', 'mode', 'rate',
+                                         'area', 'kind', 'magnitude'])
+# Canonical units of the failure rate for each kind: probability of failure
+# on demand, rate per unit time and rate per unit time and length of piping
+KIND_UNITS = {'demand': ureg.dimensionless,
+              'time': RATE_UNIT,
+              'length': RATE_UNIT/ureg.m}
+# Keys of a table entry with leak area
+_ENTRY_KEYS = {'Area', 'Failure rate'}
+
+
+class FailureRateCatalog:
+    """Failure rates indexed by (component, mode).
+
+    Later layers override entries of earlier ones; overridden entries keep
+    their position, new modes are added after the modes of the component.
+
+    Attributes
+    ----------
+    layers : tuple of dict
+        `FailureRate` entries keyed by (component, mode) for each layer,
+        base layer first.
+    """
+    def __init__(self, *layers):
+        self.layers = layers
+        self._index = {}
+        for layer in layers:
+            self._index.update(layer)
+        components = {}
+        for (component, _), entry in self._index.items():
+            components.setdefault(component, []).append(entry)
+        self._components = {component: tuple(entries) for component, entries
+                            in components.items()}
+
+    @classmethod
+    def from_table(cls, *tables):
+        """Create catalog from nested tables in the format of `TABLE_2`.
+
+        Rates and areas may be quantities or strings with units.
+        """
+        layer = {}
+        for table in tables:
+            layer.update(_layer(table))
+        return cls(layer)
+
+    def with_overrides(self, table):
+        """Return new catalog with the table added as the top layer.
+
+        Overrides are merged with the entries they replace: a leak entry
+        given only the failure rate keeps its area, and vice versa. Use
+        `{'Area': None}` to override the area with a full bore rupture.
+        """
+        return FailureRateCatalog(*self.layers, _layer(table, self._index))
+
+    def rate(self, component, mode):
+        """Return failure rate of the mode."""
+        return self[component, mode].rate
+
+    def area(self, component, mode):
+        """Return leak area of the mode; None if not defined."""
+        return self[component, mode].area
+
+    def modes(self, component):
+        """Return tuple of `FailureRate` entries of the component."""
+        try:
+            return self._components[component]
+        except KeyError:
+            raise KeyError(f'Unknown component: {component}') from None
+
+    def components(self):
+        """Return tuple of component names."""
+        return tuple(self._components)
+
+    def __getitem__(self, key):
+        try:
+            return self._index[key]
+        except KeyError:
+            raise KeyError(f'Unknown failure mode: {key}') from None
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index.values())
+
+    def __len__(self):
+        return len(self._index)
+
+
+def _layer(table, base=None):
+    """Flatten a nested table into entries keyed by (component, mode).
+
+    Values missing in the table are taken from the `base` entries.
+    """
+    entries = {}
+    for component, modes in table.items():
+        _add_entries(entries, component, modes, base or {})
+    return entries
+
+
+def _add_entries(entries, component, modes, base):
+    for mode, value in modes.items():
+        if isinstance(value, dict) and not set(value) <= _ENTRY_KEYS:
+            # Nested component, e.g. Solid State Device
+            _add_entries(entries, f'{component}, {mode}', value, base)
+        else:
+            entries[component, mode] = _entry(component, mode, value,
+                                              base.get((component, mode)))
+
+
+def _entry(component, mode, value, base=None):
+    """Create `FailureRate` from a rate or a dict with area and rate.
+
+    Area and rate missing in the value are taken from the `base` entry.
+    """
+    area = None if base is None else base.area
+    if isinstance(value, dict):
+        if 'Area' in value:
+            area = _quantity(value['Area'])
+        if 'Failure rate' in value:
+            value = value['Failure rate']
+        elif base is not None:
+            value = base.rate
+        else:
+            raise KeyError(f'Failure rate of {component} {mode.lower()} is '
+                           f'not defined')
+    rate = _quantity(value)
+    for kind, units in KIND_UNITS.items():
+        if rate.dimensionality == units.dimensionality:
+            return FailureRate(component, mode, rate, area, kind,
+                               float(rate.to(units).magnitude))
+    raise TypeError(f'Failure rate of {component} {mode.lower()} should be '
+                    f'a probability, a rate or a rate per unit length: '
+                    f'{rate}')
+
+
+def _quantity(value):
+    if value is None or hasattr(value, 'to'):
+        return value
+    return Q_(value)
+
+
+# FESHM 4240 failure rates
+FAILURE_RATES = FailureRateCatalog.from_table(TABLE_1, TABLE_2)
@@ -0,0 +1,332 @@
+"""Facility of connected volumes exchanging air.
+
+Each zone of the facility is a `Volume` with its own ventilation; zones
+exchange air with constant flows. The inert gas fraction x in the zones
+after a release of inert gas at rate R into zone s is given by the linear
+ODE system
+
+    V_i dx_i/dt = R*delta_is + sum_j F_ji*x_j - (E_i + sum_j F_ij)*x_i,
+
+where F_ij is the flow from zone i to zone j and E_i is the exhaust of
+zone i to the outside, found from the air balance of the zone. For a
+single zone the system gives FESHM 4240 6.1.A Cases A, B, and C. The
+system is solved for all leak events at once using eigendecomposition of
+the system matrix, computed once for each distinct ventilation state; only
+zones reachable from the leak zone are included.
+
+The system matrix depends on the exhaust flows E, which depend on the case
+(fan state of the leak zone) and, through the air balance of the leak zone,
+on the leak flow. Exhaust fans dominating the balance make E independent
+of the leak flow, but in general there is a state for each combination of
+a distinct leak flow and a case. The cost is O(states*n**3) for n zones
+reachable from the leak zone; it is practical for tens of zones, not for
+thousands of distinct leak flows in a facility with hundreds of zones.
+
+Fan states are enumerated in the zone of the leak; other zones are
+assumed to have all fans working when ODH system responds, and `vent_rate`
+otherwise. Oxygen concentration in each zone is taken at the end of the
+release, same as in `Volume.odh`."""
+
+import numpy as np
+
+from .ODH_class import Q_, FAILURE_RATES, ODHError, Volume, \
+    fatality_prob_array, odh_class_array
+from .storage import RATE_UNIT, FLOW_UNIT
+
+# Padé approximant coefficients and max norm for `_expm`, Higham (2005)
+_PADE_13 = (64764752532480000., 32382376266240000., 7771770303897600.,
+            1187353796428800., 129060195264000., 10559470521600.,
+            670442572800., 33522128640., 1323241920., 40840800., 960960.,
+            16380., 182., 1.)
+_THETA_13 = 5.371920351148152
+# Max condition number of eigenvectors used for the state matrices;
+# matrices with worse conditioned eigenvectors use `_expm`
+_EIG_MAX_COND = 1e6
+
+
+class Facility:
+    """Volumes connected by air exchange flows.
+
+    Attributes
+    ----------
+    volumes : list of Volume
+        Zones of the facility.
+    """
+    def __init__(self, name, volumes, exchange=()):
+        """Define a facility.
+
+        Parameters
+        ----------
+        name : str
+            Name of the facility.
+        volumes : list of Volume
+            Zones of the facility.
+        exchange : list of tuple
+            (from_volume, to_volume, flow) for each exchange flow, see
+            `connect`.
+        """
+        self.name = name
+        self.volumes = list(volumes)
+        # Exchange flow matrix, ft^3/min; _flows[i, j] is from zone i to j
+        self._flows = np.zeros((len(self.volumes), len(self.volumes)))
+        self._phi = None
+        for from_volume, to_volume, flow in exchange:
+            self.connect(from_volume, to_volume, flow)
+
+    def connect(self, from_volume, to_volume, flow):
+        """Add air exchange flow between two zones.
+
+        Parameters
+        ----------
+        from_volume, to_volume : Volume
+            Zones of the facility.
+        flow : ureg.Quantity {length: 3, time: -1}
+            Volumetric flow of air from `from_volume` to `to_volume`.
+        """
+        i = self._index(from_volume)
+        j = self._index(to_volume)
+        if i == j:
+            raise ODHError(f'Exchange flow from {from_volume} to itself')
+        flow = flow.to(FLOW_UNIT).magnitude
+        if flow < 0:
+            raise ODHError('Exchange flow should be positive; swap the '
+                           'volumes to reverse it')
+        self._flows[i, j] += flow
+
+    def odh(self, sources, power_outage=False, chunk_size=1000000):
+        """Calculate fatality rates in all zones for given `Source`s.
+
+        Parameters
+        ----------
+        sources : dict
+            Lists of sources releasing into each zone keyed by `Volume`.
+        power_outage : bool
+            Shows whether there is a power outage is in effect.
+        chunk_size : int
+            Max number of matrix elements evaluated at once.
+        """
+        PFD_power = (1.0 if power_outage else
+                     FAILURE_RATES['Electrical Power Failure',
+                                   'Demand rate'].magnitude)
+        n = len(self.volumes)
+        V = np.array([volume._volume for volume in self.volumes])
+        Q_full = np.array([volume._fan_states[1][-1]
+                           for volume in self.volumes])
+        Q_vent = np.array([volume._vent_rate for volume in self.volumes])
+        self._phi = np.zeros((n, n))
+        for volume, zone_sources in sources.items():
+            s = self._index(volume)
+            _, leak_fr, q_leak, tau, sol_PFD = \
+                Volume._leak_arrays(zone_sources)
+            if not len(leak_fr):
+                continue
+            # Ventilation of the zones for each case: no response and
+            # fan states of the leak zone
+            P_fan, Q_fans, _ = volume._fan_states
+            Q_cases = np.tile(Q_full, (len(P_fan)+1, 1))
+            Q_cases[0] = Q_vent
+            Q_cases[1:, s] = Q_fans
+            P_no_response = PFD_power*sol_PFD + \
+                (1-PFD_power)*volume._PFD_ODH
+            P_response = (1-PFD_power) * (1-volume._PFD_ODH) * \
+                sol_PFD[:, None] * P_fan[None, :]
+            P_i = leak_fr[:, None] * np.column_stack((P_no_response,
+                                                      P_response))
+            zones = self._reachable(s)
+            x = self._inert_fraction(zones, zones.index(s), V[zones],
+                                     Q_cases[:, zones], q_leak, tau,
+                                     chunk_size)
+            F_i = fatality_prob_array(0.21*(1-x))
+            self._phi[s, zones] = np.einsum('lc,lcz->z', P_i, F_i)
+
+    @property
+    def phi(self):
+        """Fatality rate for each zone, in order of `volumes`."""
+        return Q_(self._phi.sum(axis=0), RATE_UNIT)
+
+    def contributions(self):
+        """Fatality rate in each zone caused by leaks in each zone.
+
+        Returns
+        -------
+        ureg.Quantity
+            Array of shape (leak zone, zone).
+        """
+        return Q_(self._phi.copy(), RATE_UNIT)
+
+    def odh_class(self):
+        """Calculate ODH class for each zone.
+
+        Returns
+        -------
+        numpy.ndarray
+            ODH class; -1 if the fatality rate is too high.
+        """
+        return odh_class_array(self._phi.sum(axis=0))
+
+    def _index(self, volume):
+        for i, zone in enumerate(self.volumes):
+            if zone is volume:
+                return i
+        raise ODHError(f'{volume} is not a part of {self.name}')
+
+    def _reachable(self, s):
+        """Return sorted indices of zones reachable from zone s."""
+        reached = {s}
+        front = [s]
+        while front:
+            i = front.pop()
+            for j in np.flatnonzero(self._flows[i]):
+                if j not in reached:
+                    reached.add(int(j))
+                    front.append(int(j))
+        return sorted(reached)
+
+    def _inert_fraction(self, zones, s, V, Q_cases, q_leak, tau,
+                        chunk_size):
+        """Calculate inert gas fraction in the zones at the end of release.
+
+        Parameters
+        ----------
+        zones : list of int
+            Indices of the zones included.
+        s : int
+            Position of the leak zone in `zones`.
+        V : numpy.ndarray
+            Zone volumes, ft^3, shape (zones,).
+        Q_cases : numpy.ndarray
+            Zone ventilation rates for each case, ft^3/min,
+            shape (cases, zones).
+        q_leak, tau : numpy.ndarray
+            Leak flow rates, ft^3/min, and durations, min, shape (leaks,).
+
+        Returns
+        -------
+        numpy.ndarray
+            Inert gas fraction, shape (leaks, cases, zones).
+        """
+        F = self._flows[np.ix_(zones, zones)]
+        n = len(zones)
+        n_cases = len(Q_cases)
+        # Events are all combinations of leaks and cases; ventilation state
+        # of an event depends on the case and the leak flow, so the states
+        # are all combinations of distinct leak flows and cases
+        flows, leak_state = np.unique(q_leak, return_inverse=True)
+        state = (leak_state.reshape(-1, 1)*n_cases +
+                 np.arange(n_cases)).ravel()
+        R = np.repeat(q_leak, n_cases)
+        t = np.repeat(tau, n_cases)
+        Q = np.tile(Q_cases, (len(flows), 1))
+        # Air balance: supply + R + inflow = exhaust + outflow;
+        # inflow includes fresh air from the zones that are not reachable
+        inflow = self._flows[:, zones].sum(axis=0) + \
+            np.where(np.arange(n) == s, np.repeat(flows, n_cases)[:, None], 0)
+        outflow = F.sum(axis=1)
+        E = np.where(Q > 0, np.maximum(Q + inflow - outflow, 0),
+                     np.maximum(-Q, inflow - outflow))
+        # States with the same exhaust flows have the same matrix
+        E, unique_state = np.unique(E, axis=0, return_inverse=True)
+        state = unique_state.ravel()[state]
+        # dx/dt = A x + b, x(0) = 0, where A depends only on the state and
+        # b = R/V_s in zone s. A of each state is decomposed once,
+        # A = W diag(lam) W^-1, and x(t) = W diag((exp(lam*t) - 1)/lam) W^-1 b
+        order = np.argsort(state, kind='stable')
+        first = np.searchsorted(state[order], np.arange(len(E)+1))
+        x = np.empty((len(t), n))
+        step = max(1, chunk_size // (n+1)**2)
+        for j in range(0, len(E), step):
+            lam, C = _modes(_state_matrix(F, V, outflow, E[j:j+step]), s)
+            C /= V[s]
+            events = order[first[j]:first[min(j+step, len(E))]]
+            for i in range(0, len(events), step):
+                part = events[i:i+step]
+                k = state[part] - j
+                lam_t = lam[k] * t[part, None]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    growth = np.where(lam_t != 0, np.expm1(lam_t)/lam_t, 1)
+                x[part] = np.einsum('eij,ej->ei', C[k], growth).real * \
+                    (R[part]*t[part])[:, None]
+                # Padé approximation for states without eigenvector basis;
+                # augmented system y = [x, 1]: dy/dt = M y, y(0) = [0, 1]
+                part = part[np.isnan(lam[k, 0])]
+                if len(part):
+                    M = np.zeros((len(part), n+1, n+1))
+                    M[:, :n, :n] = _state_matrix(F, V, outflow, E[state[part]])
+                    M[:, s, n] = R[part]/V[s]
+                    x[part] = _expm(M*t[part, None, None])[:, :n, n]
+        return np.clip(x, 0, 1).reshape(len(q_leak), n_cases, n)
+
+    def __str__(self):
+        return self.name
+
+
+def _state_matrix(F, V, outflow, E):
+    """Return matrices A of dx/dt = A x + b for exhaust E, shape (k, n)."""
+    n = len(V)
+    A = np.empty(E.shape + (n,))
+    A[:] = F.T/V[:, None]
+    diagonal = np.arange(n)
+    A[:, diagonal, diagonal] = -(E + outflow)/V
+    return A
+
+
+def _modes(A, s):
+    """Eigenvalues and modal contributions of a unit source in zone s.
+
+    Parameters
+    ----------
+    A : numpy.ndarray
+        Stack of matrices, shape (k, n, n).
+    s : int
+        Source zone.
+
+    Returns
+    -------
+    lam, C : numpy.ndarray
+        Eigenvalues, shape (k, n), and C[k, i, j] = W[k, i, j]*W^-1[k, j, s]
+        for eigenvectors W. Eigenvalues are NaN for defective or nearly
+        defective matrices.
+    """
+    lam, W = np.linalg.eig(A)
+    try:
+        W_inv = np.linalg.inv(W)
+    except np.linalg.LinAlgError:
+        W_inv = np.array([_inverse(w) for w in W])
+    # Eigenvectors have unit norm, so the norm of the inverse estimates
+    # the condition number
+    defective = ~(np.abs(W_inv).sum(axis=2).max(axis=1) < _EIG_MAX_COND)
+    lam[defective] = np.nan
+    return lam, W * W_inv[:, None, :, s]
+
+
+def _inverse(W):
+    try:
+        return np.linalg.inv(W)
+    except np.linalg.LinAlgError:
+        return np.full_like(W, np.nan)
+
+
+def _expm(A):
+    """Matrix exponential of a stack of matrices, shape (k, n, n).
+
+    Padé approximation of order 13 with scaling and squaring.
+    """
+    norm = np.abs(A).sum(axis=1).max(axis=1)
+    with np.errstate(divide='ignore'):
+        s = np.ceil(np.log2(norm/_THETA_13))
+    s = np.maximum(s, 0).astype(int)
+    A = A / (2.0**s)[:, None, None]
+    b = _PADE_13
+    identity = np.eye(A.shape[-1])
+    A2 = A @ A
+    A4 = A2 @ A2
+    A6 = A4 @ A2
+    U = A @ (A6 @ (b[13]*A6 + b[11]*A4 + b[9]*A2) +
+             b[7]*A6 + b[5]*A4 + b[3]*A2 + b[1]*identity)
+    V = A6 @ (b[12]*A6 + b[10]*A4 + b[8]*A2) + \
+        b[6]*A6 + b[4]*A4 + b[2]*A2 + b[0]*identity
+    result = np.linalg.solve(V - U, V + U)
+    for step in range(s.max(initial=0)):
+        square = s > step
+        result[square] = result[square] @ result[square]
+    return result
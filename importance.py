@@ -0,0 +1,195 @@
+"""Importance measures and sensitivities of the volume fatality rate.
+
+For each source the fatality rate is
+
+    phi = sum_l lambda_l*(F_l0*(p*v + (1-p)*o) + sum_m F_lm*P_m*(1-p)*(1-o)*v),
+
+where lambda_l is the leak failure rate, F_l0 and F_lm are the fatality
+probabilities without ODH system response and for fan state m, P_m is the
+probability of the fan state and p, o and v are the probabilities of power,
+ODH system and isolation valve failure. `phi` is affine in each probability
+and linear in each failure rate, so all derivatives are found from the
+fatality probabilities calculated by `Volume.odh` without recalculation of
+the O2 concentration. Only the fan state probabilities depend on the fan
+failure rate nonlinearly; they are recalculated for the scaled rate.
+
+Inputs are identified by (component, mode) keys:
+- failure rates from `FailureRateCatalog` used by the leaks of the sources,
+  e.g. ('Piping', 'Small leak');
+- (source name, leak name) for leaks with failure rates not taken from the
+  catalog, e.g. added with `Source.failure_mode`;
+- ('Electrical Power Failure', 'Demand rate') unless there is a power
+  outage, ('Valve, solenoid', 'Failure to operate') for sources with
+  isolation valves;
+- (volume name, 'PFD_ODH') and (volume name, 'lambda_fan') of the volume.
+"""
+
+from collections import namedtuple
+import numpy as np
+
+from .ODH_class import ureg, FAILURE_RATES, ODHError, \
+    fan_state_distribution, fatality_prob_array, prob_m_of_n_array
+
+Importance = namedtuple('Importance', ['key', 'kind', 'value', 'birnbaum',
+                                       'sensitivity', 'fussell_vesely',
+                                       'raw', 'rrw'])
+# Relative step of the fan failure rate for the fan state derivative
+FAN_RATE_STEP = 1e-5
+
+
+def importance(volume):
+    """Calculate importance measures for all inputs of the fatality rate.
+
+    `Volume.odh` should be called first (with `batch=True`).
+
+    Birnbaum importance of a catalog failure rate of zero is 0: the
+    multipliers (number, length) of its leaks are not known. For a zero fan
+    failure rate the derivative is taken at zero.
+
+    Parameters
+    ----------
+    volume : Volume
+
+    Returns
+    -------
+    list of Importance
+        Measures for each input sorted by the absolute sensitivity:
+        input value in canonical units (1/hr for failure rates); Birnbaum
+        importance d(phi)/d(value), 1/hr per unit of the value;
+        sensitivity d(ln phi)/d(ln value); Fussell-Vesely importance
+        (phi - phi(0))/phi; risk achievement worth phi(1)/phi for
+        probabilities (nan for failure rates) and risk reduction worth
+        phi/phi(0).
+    """
+    if not volume._batch_current:
+        raise ODHError(f'Importance of {volume.name} needs the results of '
+                       f'Volume.odh with batch=True; recalculate the volume '
+                       f'first.')
+    inputs = {}
+    PFD_ODH = volume._PFD_ODH
+    P_fan = volume._fan_states[0]
+    dP_fan, P_fan_zero = _fan_derivatives(volume, P_fan)
+    fan_key = (volume.name, 'lambda_fan')
+    PFD_power_key = ('Electrical Power Failure', 'Demand rate')
+    phi = 0.0
+    for result in volume._source_results.values():
+        source = result['source']
+        leaks = source.leaks
+        if not np.array_equal(result['uid'], leaks.uid()):
+            raise ODHError(f'Leaks of {source.name} changed after '
+                           f'Volume.odh; recalculate the volume first.')
+        F_i = fatality_prob_array(result['O2_conc'])
+        leak_fr = leaks.array('leak_fr')
+        p = 1.0 if result['outage'] else FAILURE_RATES[PFD_power_key].magnitude
+        o = PFD_ODH
+        v = float(source.sol_PFD)
+        c_no_response = p*v + (1-p)*o
+        c_response = (1-p) * (1-o) * v
+        # Fatality rate of each leak and of each fan state
+        F_response = F_i[:, 1:] @ P_fan
+        phi_leak = leak_fr * (F_i[:, 0]*c_no_response + F_response*c_response)
+        phi += phi_leak.sum()
+        S_A = leak_fr @ F_i[:, 0]
+        S_B = leak_fr @ F_response
+        _add(inputs, (volume.name, 'PFD_ODH'), 'demand', o,
+             (1-p) * (S_A - S_B*v))
+        if not result['outage']:
+            _add(inputs, PFD_power_key, 'demand', p,
+                 S_A*(v-o) - S_B*(1-o)*v)
+        if v < 1:
+            _add(inputs, ('Valve, solenoid', 'Failure to operate'),
+                 'demand', v, S_A*p + S_B*(1-p)*(1-o))
+        _add_rates(inputs, source, leaks, leak_fr, phi_leak)
+        if dP_fan is not None:
+            phi_state = c_response * (leak_fr @ F_i[:, 1:])
+            _add(inputs, fan_key, 'time', volume._lambda_fan,
+                 phi_state @ dP_fan, drop=phi_state @ (P_fan - P_fan_zero))
+    return sorted((_measures(key, phi, *values)
+                   for key, values in inputs.items()),
+                  key=lambda x: -abs(x.sensitivity))
+
+
+def _add(inputs, key, kind, value, birnbaum, drop=None):
+    """Add contributions of a source to the input.
+
+    `drop` is phi - phi(0); for affine inputs it is birnbaum*value.
+    """
+    if drop is None:
+        drop = birnbaum*value
+    total = inputs.setdefault(key, [kind, value, 0.0, 0.0])
+    total[2] += birnbaum
+    total[3] += drop
+
+
+def _add_rates(inputs, source, leaks, leak_fr, phi_leak):
+    """Add failure rate inputs of the leaks of a source."""
+    codes = leaks.array('rate')
+    names = leaks.name_list()
+    for code in np.unique(codes):
+        key = leaks.rate_keys[code]
+        index = np.flatnonzero(codes == code)
+        if key is None:
+            for i in index:
+                _add(inputs, (source.name, names[i]), 'time', leak_fr[i],
+                     phi_leak[i]/leak_fr[i] if leak_fr[i] else 0.0)
+        else:
+            entry = source.failure_rates[key]
+            _add(inputs, key, entry.kind, entry.magnitude,
+                 phi_leak[index].sum()/entry.magnitude if entry.magnitude
+                 else 0.0)
+
+
+def _fan_derivatives(volume, P_fan):
+    """Calculate d(P_fan)/d(lambda) and P_fan for zero failure rate.
+
+    All fan failure rates are scaled together; the derivative is the central
+    difference of the polynomial P_fan(lambda). For zero failure rate of
+    the volume the rates are increased by a small step instead and the
+    derivative is the forward difference.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (None, None) if there are no fans.
+    """
+    if not volume.N_fans and not volume.fans:
+        return None, None
+    P_zero = _fan_probabilities(volume, 0.0)
+    if volume._lambda_fan:
+        P_up, P_down = (_fan_probabilities(volume, scale) for scale in
+                        (np.exp(FAN_RATE_STEP), np.exp(-FAN_RATE_STEP)))
+        step = 2*FAN_RATE_STEP*volume._lambda_fan
+    else:
+        # Step of the failure probability lambda*T of the fans
+        T_max = max([volume._Test_period] +
+                    [fan.T_fan.to(ureg.hr).magnitude for fan in volume.fans])
+        step = FAN_RATE_STEP/T_max if T_max else FAN_RATE_STEP
+        P_up = _fan_probabilities(volume, 1.0, step)
+        P_down = P_fan
+    if any(len(P) != len(P_fan) for P in (P_up, P_down, P_zero)):
+        raise ODHError(f'Fan states of {volume.name} do not match its fans.')
+    return (P_up-P_down)/step, P_zero
+
+
+def _fan_probabilities(volume, scale, shift=0.0):
+    """Fan state probabilities with fan failure rates multiplied by scale
+    and increased by shift, 1/hr."""
+    if volume.fans:
+        fans = [fan._replace(lambda_fan=fan.lambda_fan*scale +
+                             shift*ureg.hr**-1)
+                for fan in volume._all_fans()]
+        return fan_state_distribution(fans, volume.fan_resolution)[0]
+    return prob_m_of_n_array(volume.N_fans, volume._Test_period,
+                             volume._lambda_fan*scale + shift)
+
+
+def _measures(key, phi, kind, value, birnbaum, drop):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sensitivity = np.float64(birnbaum*value) / phi
+        fussell_vesely = np.float64(drop) / phi
+        rrw = np.float64(phi) / (phi - drop)
+        raw = np.nan
+        if kind == 'demand':
+            raw = (phi + birnbaum*(1-value)) / np.float64(phi)
+    return Importance(key, kind, value, birnbaum, float(sensitivity),
+                      float(fussell_vesely), float(raw), float(rrw))
@@ -0,0 +1,216 @@
+"""Counters and timers for the calculation hot paths.
+
+Leak flow solves, NTP state updates, O2 concentration and fatality
+probability evaluations, `Volume.odh` and report writing are instrumented
+using the module level `PROFILER`. Instrumentation is disabled by default;
+disabled counters and timers only check the `enabled` flag.
+
+Typical use::
+
+    with profile() as prof:
+        volume.odh(sources)
+    prof.to_json('odh_profile.json')
+    prof.dump_stats('odh.prof')  # pstats.Stats('odh.prof').print_stats()
+"""
+
+import functools
+import json
+import marshal
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from collections import namedtuple
+
+
+TimerStats = namedtuple('TimerStats', ['count', 'total', 'own', 'max'])
+# Placeholder file name and line number for pstats entries
+_PSTATS_FILE = 'ODH_analysis'
+_NULL_TIMER = nullcontext()
+
+
+class Profiler:
+    """Collection of named counters and timers.
+
+    Timers may be nested; time spent in nested timers is subtracted from
+    the own time of the enclosing timer, same as `tottime` of `cProfile`.
+
+    Attributes
+    ----------
+    enabled : bool
+        If False, counters and timers are not updated.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._timers = {}
+        self._callers = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def count(self, name, n=1):
+        """Increase counter `name` by `n`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def timer(self, name):
+        """Return context manager measuring time of its block under `name`.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator measuring time of each call of the function."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        """Remove all collected counters and timers."""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+            self._callers.clear()
+
+    def counters(self):
+        """Return dict of counter values."""
+        with self._lock:
+            return dict(self._counters)
+
+    def timers(self):
+        """Return dict of `TimerStats` for each timer.
+
+        Times are in seconds.
+        """
+        with self._lock:
+            return {name: TimerStats(*stats)
+                    for name, stats in self._timers.items()}
+
+    def summary(self):
+        """Return structured summary of counters and timers.
+
+        Returns
+        -------
+        dict
+            'counters' with counter values and 'timers' with count, total,
+            own, mean and max time (s) for each timer.
+        """
+        timers = {}
+        for name, stats in self.timers().items():
+            timers[name] = dict(stats._asdict(),
+                                mean=stats.total/stats.count)
+        return {'counters': self.counters(), 'timers': timers}
+
+    def to_json(self, path=None):
+        """Return summary as JSON string and write it to `path` if given."""
+        text = json.dumps(self.summary(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def dump_stats(self, path):
+        """Write timers in the format read by `pstats.Stats`.
+
+        Each timer is an entry with `_PSTATS_FILE` as the file name, line
+        number 0 and the timer name as the function name. Enclosing timers
+        are listed as callers.
+        """
+        def key(name):
+            return (_PSTATS_FILE, 0, name)
+        with self._lock:
+            stats = {}
+            for name, (count, total, own, _) in self._timers.items():
+                callers = {key(parent): tuple(edge) for (parent, child), edge
+                           in self._callers.items() if child == name}
+                stats[key(name)] = (count, count, own, total, callers)
+        with open(path, 'wb') as f:
+            marshal.dump(stats, f)
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _record(self, name, parent, elapsed, own):
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                self._timers[name] = [1, elapsed, own, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += own
+                stats[3] = max(stats[3], elapsed)
+            if parent is not None:
+                edge = self._callers.setdefault((parent, name), [0, 0, 0, 0])
+                edge[0] += 1
+                edge[1] += 1
+                edge[2] += own
+                edge[3] += elapsed
+
+
+class _Timer:
+    """Context manager measuring time of a block; see `Profiler.timer`."""
+    __slots__ = ('profiler', 'name', 'start', 'children')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0
+        self.profiler._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            parent.children += elapsed
+        self.profiler._record(self.name, parent and parent.name, elapsed,
+                              elapsed - self.children)
+        return False
+
+
+@contextmanager
+def profile(profiler=None, reset=True):
+    """Enable instrumentation for the duration of the block.
+
+    Parameters
+    ----------
+    profiler : Profiler
+        Profiler to enable, `PROFILER` by default.
+    reset : bool
+        If True, previously collected data is removed.
+
+    Yields
+    ------
+    Profiler
+    """
+    profiler = PROFILER if profiler is None else profiler
+    if reset:
+        profiler.reset()
+    enabled = profiler.enabled
+    profiler.enabled = True
+    try:
+        yield profiler
+    finally:
+        profiler.enabled = enabled
+
+
+# Profiler used by the instrumented functions
+PROFILER = Profiler()
@@ -0,0 +1,245 @@
+"""Declarative facility description files.
+
+A facility file (JSON, TOML or YAML) describes sources with their failure
+modes and the volumes affected by them. Quantities are given as strings
+with units, e.g. '10 ft^3/min'; piping elements are tables with the class
+name from `heat_transfer.piping` in `type` and the constructor arguments::
+
+    name: Cryo hall
+    sources:
+      - name: Helium dewar
+        fluid: {name: helium, T: 4.5 K, P: 1.3 bar}
+        volume: 1000 L
+        isol_valve: true
+        failures:
+          - type: pipe_failure
+            tube: {type: Tube, OD: 1 inch, wall: 0.065 inch, L: 20 ft}
+            N_welds: 4
+          - type: dewar_insulation_failure
+            q_std: 150 ft^3/min
+    volumes:
+      - name: Hall
+        volume: 50000 ft^3
+        Q_fan: 2000 ft^3/min
+        N_fans: 2
+        T_fan: 3 month
+        vent_rate: 500 ft^3/min
+        sources: [Helium dewar]
+    exchange:
+      - {from: Hall, to: Tunnel, flow: 300 ft^3/min}
+    failure_rates:
+      Fan: {Failure to run: 5e-6 1/hr}
+
+Failure `type` is the name of the `Source` method; other keys are its
+arguments. Volume `fans` is a list of tables with `Q_fan`, optional
+`T_fan` (volume `T_fan` by default) and `lambda_fan`; volume `T_fan` is
+required with fans. Optional `exchange` connects the volumes into a
+`Facility`. Optional `failure_rates` overrides FESHM 4240 rates used by the
+sources and the default fan failure rate, see
+`FailureRateCatalog.with_overrides`."""
+
+import json
+import os
+import heat_transfer as ht
+
+from .ODH_class import Q_, FAILURE_RATES, ODHError, Source, Volume, Fan
+from .facility import Facility
+
+# Keys that are never converted to quantities
+TEXT_KEYS = {'name', 'type', 'sources', 'from', 'to'}
+# Failure methods without leak flow calculation
+DIRECT_FAILURES = ('dewar_insulation_failure', 'constant_leak',
+                   'failure_mode')
+
+
+class FacilityModel:
+    """Objects created from a facility file.
+
+    Attributes
+    ----------
+    name : str
+    sources : dict
+        Sources keyed by name.
+    volumes : list of Volume
+    volume_sources : dict
+        Lists of sources affecting each volume keyed by volume name.
+    facility : Facility or None
+        Connected volumes if the file defines exchange flows.
+    power_outage : bool
+    """
+    def __init__(self, name, sources, volumes, volume_sources, facility=None,
+                 power_outage=False):
+        self.name = name
+        self.sources = sources
+        self.volumes = volumes
+        self.volume_sources = volume_sources
+        self.facility = facility
+        self.power_outage = power_outage
+
+    def odh(self):
+        """Calculate fatality rates for all volumes (and the facility)."""
+        for volume in self.volumes:
+            volume.odh(self.volume_sources[volume.name],
+                       power_outage=self.power_outage)
+        if self.facility is not None:
+            self.facility.odh({volume: self.volume_sources[volume.name]
+                               for volume in self.volumes},
+                              power_outage=self.power_outage)
+
+    def __str__(self):
+        return self.name
+
+
+def read_file(path):
+    """Read a JSON, TOML or YAML file into a dict based on its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as f:
+            return json.load(f)
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ODHError('PyYAML is required to read YAML facility files.')
+        with open(path) as f:
+            return yaml.safe_load(f)
+    raise ODHError(f'Unknown facility file format: {path}')
+
+
+def load_facility(path, processes=None):
+    """Create sources and volumes from a facility file.
+
+    Parameters
+    ----------
+    path : str
+        JSON, TOML or YAML file.
+    processes : int
+        Number of worker processes used for leak flow calculation, see
+        `Source.add_failures`.
+
+    Returns
+    -------
+    FacilityModel
+    """
+    data = read_file(path)
+    name = data.get('name', os.path.splitext(os.path.basename(path))[0])
+    return build_facility(data, name, processes)
+
+
+def build_facility(data, name, processes=None):
+    """Create sources and volumes from a facility description dict.
+
+    See `load_facility`.
+    """
+    failure_rates = FAILURE_RATES
+    if data.get('failure_rates'):
+        failure_rates = FAILURE_RATES.with_overrides(data['failure_rates'])
+    sources = {}
+    for source_data in data.get('sources', []):
+        source = _build_source(source_data, failure_rates, processes)
+        if source.name in sources:
+            raise ODHError(f'Duplicate source name: {source.name}')
+        sources[source.name] = source
+    volumes = []
+    volume_sources = {}
+    for volume_data in data.get('volumes', []):
+        volume = _build_volume(volume_data, failure_rates)
+        try:
+            volume_sources[volume.name] = [
+                sources[source_name]
+                for source_name in volume_data.get('sources', sources)]
+        except KeyError as error:
+            raise ODHError(f'Unknown source {error} for volume '
+                           f'{volume.name}') from None
+        volumes.append(volume)
+    facility = None
+    if data.get('exchange'):
+        by_name = {volume.name: volume for volume in volumes}
+        facility = Facility(name, volumes)
+        for flow in data['exchange']:
+            facility.connect(by_name[flow['from']], by_name[flow['to']],
+                             _quantity(flow['flow']))
+    return FacilityModel(name, sources, volumes, volume_sources, facility,
+                         data.get('power_outage', False))
+
+
+def _quantity(value):
+    """Convert a string with units to a quantity."""
+    if isinstance(value, str):
+        return Q_(value)
+    return value
+
+
+def _value(key, value):
+    """Convert a value of the file to the argument of a constructor."""
+    if key in TEXT_KEYS:
+        return value
+    if isinstance(value, dict):
+        return _element(value)
+    return _quantity(value)
+
+
+def _element(data):
+    """Create a piping element from a table with `type` key."""
+    try:
+        element_class = getattr(ht.piping, data['type'])
+    except (KeyError, AttributeError):
+        raise ODHError(f'Unknown piping element: {data}') from None
+    return element_class(**{key: _value(key, value)
+                            for key, value in data.items() if key != 'type'})
+
+
+def _fluid(data):
+    return ht.ThermState(data['name'], T=_quantity(data['T']),
+                         P=_quantity(data['P']))
+
+
+def _build_source(data, failure_rates, processes):
+    source = Source(data['name'], _fluid(data['fluid']),
+                    _quantity(data['volume']), N=data.get('N', 1),
+                    isol_valve=data.get('isol_valve', False),
+                    failure_rates=failure_rates)
+    batch = []
+    for failure in data.get('failures', []):
+        failure_type = failure['type']
+        kwargs = {key: _value(key, value) for key, value in failure.items()
+                  if key not in ('type', 'fluid')}
+        if 'fluid' in failure:
+            kwargs['fluid'] = _fluid(failure['fluid'])
+        if failure_type in Source.BATCH_FAILURES:
+            batch.append((failure_type, kwargs))
+        elif failure_type in DIRECT_FAILURES:
+            # Keep the order of the leaks as in the file
+            source.add_failures(batch, processes)
+            batch = []
+            getattr(source, failure_type)(**kwargs)
+        else:
+            raise ODHError(f'Unknown failure type: {failure_type}')
+    source.add_failures(batch, processes)
+    return source
+
+
+def _build_volume(data, failure_rates):
+    lambda_fan = failure_rates.rate('Fan', 'Failure to run')
+    kwargs = {key: _quantity(value) for key, value in data.items()
+              if key not in ('name', 'volume', 'sources', 'fans', 'PFD_ODH',
+                             'fan_resolution')}
+    kwargs.setdefault('lambda_fan', lambda_fan)
+    if 'fans' in data:
+        kwargs['fans'] = [Fan(**dict({'lambda_fan': lambda_fan},
+                                     **{key: _quantity(value)
+                                        for key, value in fan.items()}))
+                          for fan in data['fans']]
+    if 'fan_resolution' in data:
+        kwargs['fan_resolution'] = _quantity(data['fan_resolution'])
+    volume = Volume(data['name'], _quantity(data['volume']), **kwargs)
+    if 'PFD_ODH' in data:
+        volume.PFD_ODH = _quantity(data['PFD_ODH'])
+    return volume
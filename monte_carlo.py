@@ -0,0 +1,223 @@
+"""Monte Carlo uncertainty propagation for ODH analysis.
+
+Failure rates of FESHM 4240 tables are point estimates. Here the failure
+rates, `PFD_ODH`, probability of power failure, fan failure rate and fan
+test period are sampled from lognormal distributions defined by error
+factors, and the distribution of the fatality rate `phi` and of the ODH
+class is calculated.
+
+Leak flows, O2 concentrations and fatality probabilities do not depend on
+the sampled values and are calculated once; only the probabilities are
+recalculated for each sample."""
+
+import math
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .ODH_class import ureg, Q_, FAILURE_RATES, ODHError, \
+    odh_class_array, prob_m_of_n_array
+
+
+# Standard normal quantile for 95th percentile
+Z_95 = 1.6448536269514722
+# Default error factors (95th percentile/median); None for fixed values.
+# FESHM 4240 leak rates are order of magnitude estimates.
+DEFAULT_ERROR_FACTORS = {'rates': 10,
+                         'PFD_ODH': 3,
+                         'PFD_power': 3,
+                         'lambda_fan': 3,
+                         'Test_period': None}
+
+MonteCarloResult = namedtuple('MonteCarloResult', ['phi', 'percentiles',
+                                                   'mean', 'class_prob'])
+
+
+class LogNormal:
+    """Lognormal multiplier for a point estimate.
+
+    Median of the multiplier is 1, i.e. the point estimate is treated as
+    the median of the distribution.
+    """
+    def __init__(self, EF):
+        """Define lognormal distribution using error factor.
+
+        Parameters
+        ----------
+        EF : float
+            Error factor, ratio of 95th percentile to median.
+        """
+        self.EF = EF
+        self.sigma = math.log(EF) / Z_95
+
+    def sample(self, rng, size):
+        """Draw `size` multipliers using numpy.random.Generator `rng`."""
+        return rng.lognormal(0, self.sigma, size)
+
+    def __repr__(self):
+        return f'LogNormal(EF={self.EF})'
+
+
+def leak_group(name, rate_key=None):
+    """Return failure rate group of a leak.
+
+    Leaks with failure rates from the same catalog entry, e.g.
+    ('Piping', 'Small leak'), share the failure rate estimate and its
+    uncertainty and are sampled together. Leaks without catalog key, e.g.
+    added with `Source.failure_mode`, are grouped by name.
+    """
+    return name if rate_key is None else rate_key
+
+
+def monte_carlo(volume, sources, n_samples=100000, *, error_factors=None,
+                power_outage=False, percentiles=(5, 50, 95), seed=None,
+                processes=None, chunk_size=100000, group=leak_group):
+    """Propagate failure rate uncertainties to the fatality rate.
+
+    Parameters
+    ----------
+    volume : Volume
+        Volume affected by the sources.
+    sources : list
+        Sources affecting the volume. Leaks of the sources are used as is,
+        no flows are recalculated.
+    n_samples : int
+        Number of samples.
+    error_factors : dict
+        Error factors or distributions updating `DEFAULT_ERROR_FACTORS`.
+        Keys are 'rates' (default for all leaks), leak groups (see `group`;
+        (component, mode) catalog keys or leak names by default),
+        'PFD_ODH', 'PFD_power', 'lambda_fan', and 'Test_period'. Values are
+        error factors, None for fixed values, or objects with
+        `sample(rng, size)` method returning multipliers for the point
+        estimate.
+    power_outage : bool
+        Shows whether there is a power outage is in effect.
+    percentiles : tuple of float
+        Percentiles of fatality rate to calculate.
+    seed : int
+        Seed for the random number generator.
+    processes : int
+        Number of worker processes. By default samples are calculated in
+        the current process.
+    chunk_size : int
+        Number of samples calculated at once.
+    group : callable
+        Function returning failure rate group for a leak name and its
+        failure rate catalog key (None if unknown). Leaks in the same group
+        are sampled together (full correlation).
+
+    Returns
+    -------
+    MonteCarloResult
+        Fatality rate samples, percentiles dict, mean fatality rate, and
+        probabilities of ODH classes (None if the fatality rate is too high).
+    """
+    model = _prepare(volume, sources, error_factors, power_outage, group)
+    n_chunks = max(1, math.ceil(n_samples/chunk_size))
+    sizes = [chunk_size] * (n_chunks-1) + \
+        [n_samples - chunk_size*(n_chunks-1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    if processes:
+        with ProcessPoolExecutor(processes) as executor:
+            chunks = list(executor.map(_sample_phi, [model]*n_chunks, sizes,
+                                       seeds))
+    else:
+        chunks = [_sample_phi(model, size, seed_)
+                  for size, seed_ in zip(sizes, seeds)]
+    phi = np.concatenate(chunks)
+    phi_percentiles = dict(zip(percentiles,
+                               np.percentile(phi, percentiles) / ureg.hr))
+    odh_class = odh_class_array(phi)
+    class_prob = {key: float(np.count_nonzero(odh_class == i)) / len(phi)
+                  for i, key in [(0, 0), (1, 1), (2, 2), (-1, None)]}
+    return MonteCarloResult(Q_(phi, 1/ureg.hr), phi_percentiles,
+                            phi.mean() / ureg.hr, class_prob)
+
+
+def _distribution(spec):
+    """Convert error factor to distribution; None for fixed values."""
+    if spec is None or spec == 1:
+        return None
+    if hasattr(spec, 'sample'):
+        return spec
+    return LogNormal(spec)
+
+
+def _prepare(volume, sources, error_factors, power_outage, group):
+    """Reduce the volume and sources to arrays needed for sampling.
+
+    Fatality rate for a sample is
+    phi = sum_g M_g * (PFD_power*A_g + (1-PFD_power)*PFD_ODH*B_g +
+                       (1-PFD_power)*(1-PFD_ODH)*sum_m P_m*C_gm),
+    where M_g is the failure rate multiplier of the group g and P_m is the
+    probability of m fans working.
+    """
+    if volume.fans:
+        raise ODHError('Monte Carlo analysis supports identical fans only.')
+    factors = dict(DEFAULT_ERROR_FACTORS)
+    factors.update(error_factors or {})
+    names, leak_fr, q_leak, tau, sol_PFD = volume._leak_arrays(sources)
+    _, Q, _ = volume._fan_arrays()
+    _, F_i = volume._fatality_grid(q_leak, Q, tau)
+    rate_keys = [key for source in sources
+                 for key in source.leaks.rate_key_list()]
+    # Groups in order of the first leak; keys may be tuples or strings
+    group_index = {}
+    index = np.array([group_index.setdefault(group(name, key),
+                                             len(group_index))
+                      for name, key in zip(names, rate_keys)], dtype=int)
+    groups = list(group_index)
+    A = np.bincount(index, weights=leak_fr*sol_PFD*F_i[:, 0],
+                    minlength=len(groups))
+    B = np.bincount(index, weights=leak_fr*F_i[:, 0], minlength=len(groups))
+    C = np.zeros((len(groups), F_i.shape[1]-1))
+    np.add.at(C, index, (leak_fr*sol_PFD)[:, None]*F_i[:, 1:])
+    return {
+        'A': A, 'B': B, 'C': C,
+        'rate_dists': [_distribution(factors.get(g, factors['rates']))
+                       for g in groups],
+        'PFD_ODH': volume._PFD_ODH,
+        'PFD_power': (1.0 if power_outage else
+                      FAILURE_RATES['Electrical Power Failure',
+                                    'Demand rate'].magnitude),
+        'power_outage': power_outage,
+        'N_fans': volume.N_fans,
+        'lambda_fan': volume._lambda_fan,
+        'Test_period': volume._Test_period,
+        'dists': {name: _distribution(factors[name]) for name in
+                  ('PFD_ODH', 'PFD_power', 'lambda_fan', 'Test_period')},
+    }
+
+
+def _sample(dist, rng, size):
+    """Draw multipliers; fixed values have multiplier of 1."""
+    if dist is None:
+        return np.ones(size)
+    return dist.sample(rng, size)
+
+
+def _sample_phi(model, size, seed):
+    """Calculate fatality rate, 1/hr, for `size` samples."""
+    rng = np.random.default_rng(seed)
+    dists = model['dists']
+    # Failure rate multipliers, shape (sample, group); no groups without
+    # leaks
+    M = np.empty((size, len(model['rate_dists'])))
+    for i, dist in enumerate(model['rate_dists']):
+        M[:, i] = _sample(dist, rng, size)
+    PFD_ODH = np.minimum(
+        model['PFD_ODH']*_sample(dists['PFD_ODH'], rng, size), 1)
+    if model['power_outage']:
+        PFD_power = np.ones(size)
+    else:
+        PFD_power = np.minimum(
+            model['PFD_power']*_sample(dists['PFD_power'], rng, size), 1)
+    PFD_fan = model['lambda_fan'] * model['Test_period'] * \
+        _sample(dists['lambda_fan'], rng, size) * \
+        _sample(dists['Test_period'], rng, size)
+    P_fan = prob_m_of_n_array(model['N_fans'], np.minimum(PFD_fan, 1), 1)
+    return (PFD_power*(M @ model['A']) +
+            (1-PFD_power)*PFD_ODH*(M @ model['B']) +
+            (1-PFD_power)*(1-PFD_ODH)*np.einsum('sm,sm->s', M @ model['C'],
+                                                P_fan))
@@ -0,0 +1,89 @@
+"""Fatality rates of a volume for several probability scenarios at once.
+
+Oxygen concentrations and fatality probabilities do not depend on the
+probabilities of power, ODH system and isolation valve failure; only the
+weights of the no response and fan state cases do. For each source the
+fatality rate is
+
+    phi = S_0*(p*v + (1-p)*o) + S_fan*(1-p)*(1-o)*v,
+
+where S_0 = sum_l lambda_l*F_l0 and S_fan = sum_lm lambda_l*F_lm*P_m are
+reduced once from the results of `Volume.odh` (see `importance`) and p, o
+and v are the probabilities of power, ODH system and isolation valve
+failure of the scenario. Each scenario then costs a few multiplications::
+
+    results = evaluate_scenarios(volume, sources,
+                                 [NORMAL_POWER, POWER_OUTAGE,
+                                  Scenario('ODH system bypassed',
+                                           PFD_ODH=1)])
+"""
+
+from collections import namedtuple
+import numpy as np
+
+from .ODH_class import Q_, FAILURE_RATES, fatality_prob_array, \
+    odh_class_array
+from .storage import RATE_UNIT
+
+Scenario = namedtuple('Scenario', ['name', 'PFD_power', 'PFD_ODH',
+                                   'sol_PFD'],
+                      defaults=[None, None, None])
+ScenarioResult = namedtuple('ScenarioResult', ['scenario', 'phi',
+                                               'odh_class', 'source_phi'])
+
+NORMAL_POWER = Scenario('Normal power')
+POWER_OUTAGE = Scenario('Power outage', PFD_power=1)
+
+
+def evaluate_scenarios(volume, sources, scenarios=(NORMAL_POWER,
+                                                   POWER_OUTAGE)):
+    """Calculate fatality rate of the volume for each scenario.
+
+    The volume is evaluated once with `Volume.odh` (normal power, batch
+    mode; unchanged leaks are reused) and `fail_modes` of the volume are
+    left for normal power.
+
+    Parameters
+    ----------
+    volume : Volume
+    sources : list
+        Sources affecting the volume.
+    scenarios : list of Scenario
+        Probabilities of power failure (FESHM 4240 demand rate by default,
+        1 for outage), ODH system failure (`Volume.PFD_ODH` by default) and
+        isolation valve failure (`Source.sol_PFD` of each source by
+        default, 1 if the valves are disabled).
+
+    Returns
+    -------
+    list of ScenarioResult
+        Scenario, fatality rate, ODH class (None if too high) and dict of
+        fatality rates of each source for each scenario.
+    """
+    volume.odh(sources)
+    P_fan = volume._fan_states[0]
+    PFD_power_default = FAILURE_RATES['Electrical Power Failure',
+                                      'Demand rate'].magnitude
+    p = np.array([PFD_power_default if s.PFD_power is None else
+                  float(s.PFD_power) for s in scenarios])
+    o = np.array([volume._PFD_ODH if s.PFD_ODH is None else
+                  float(s.PFD_ODH) for s in scenarios])
+    source_phi = {}
+    for result in volume._source_results.values():
+        source = result['source']
+        F_i = fatality_prob_array(result['O2_conc'])
+        leak_fr = source.leaks.array('leak_fr')
+        S_0 = leak_fr @ F_i[:, 0]
+        S_fan = leak_fr @ (F_i[:, 1:] @ P_fan)
+        v = np.array([float(source.sol_PFD) if s.sol_PFD is None else
+                      float(s.sol_PFD) for s in scenarios])
+        source_phi[source.name] = (source_phi.get(source.name, 0) +
+                                   S_0*(p*v + (1-p)*o) +
+                                   S_fan*(1-p)*(1-o)*v)
+    phi = sum(source_phi.values(), np.zeros(len(scenarios)))
+    odh_class = odh_class_array(phi)
+    return [ScenarioResult(scenario, Q_(phi[i], RATE_UNIT),
+                           int(odh_class[i]) if odh_class[i] >= 0 else None,
+                           {name: Q_(values[i], RATE_UNIT)
+                            for name, values in source_phi.items()})
+            for i, scenario in enumerate(scenarios)]
@@ -0,0 +1,376 @@
+"""Local ODH evaluation server.
+
+Usage::
+
+    python -m ODH_analysis.server --port 8765 --processes 4
+    python -m ODH_analysis.server --socket /tmp/odh.sock --cache
+
+The server keeps the leak flow and fluid property caches and a pool of
+leak flow worker processes between requests, so that a facility is
+evaluated without starting Python, importing heat_transfer and solving
+the already known leak flows. Minimal HTTP/1.1 JSON API with keep-alive:
+
+- ``POST /odh`` with a facility description in the format of `loader`
+  (as JSON) returns the results in the format of `batch.summarize`;
+  ``{"facilities": [...]}`` returns a list of results.
+- ``GET /stats`` returns request, batch and cache statistics.
+- ``GET /health`` returns ``{"status": "ok"}``.
+
+Requests arriving within `batch_window` of each other are evaluated as one
+batch: identical facilities are evaluated once and results of the recent
+facilities are reused. Evaluation runs in a worker thread, so the server
+keeps accepting requests while a batch is calculated."""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .ODH_class import leak_flow_executor
+from .batch import summarize
+from .cache import LRUCache, LEAK_FLOW_CACHE, NTP_STATES, \
+    enable_persistent_cache
+from .loader import build_facility, read_file
+
+# Max size of a request body, bytes
+MAX_BODY = 2**24
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 411: 'Length Required',
+            413: 'Payload Too Large'}
+
+
+class ODHServer:
+    """Evaluation server with warm caches and request batching.
+
+    Attributes
+    ----------
+    results : LRUCache
+        Results of the recently evaluated facilities keyed by their
+        canonical JSON.
+    """
+    def __init__(self, processes=None, batch_window=0.005, max_batch=64,
+                 result_cache=1024):
+        """Create the server; `start` begins accepting connections.
+
+        Parameters
+        ----------
+        processes : int
+            Number of leak flow worker processes, `os.cpu_count()` by
+            default; 0 to solve in the server process.
+        batch_window : float
+            Time to wait for more requests before evaluating a batch, s.
+        max_batch : int
+            Max number of facilities evaluated in one batch.
+        result_cache : int
+            Max number of stored facility results.
+        """
+        self.processes = processes
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.results = LRUCache(maxsize=result_cache)
+        self._stats = {'requests': 0, 'facilities': 0, 'batches': 0,
+                       'evaluated': 0, 'errors': 0}
+        self._queue = None
+        self._pool = None
+        self._thread = ThreadPoolExecutor(1)
+        self._server = None
+        self._batcher = None
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """Start accepting connections on TCP host and port or on Unix
+        socket path."""
+        self._queue = asyncio.Queue()
+        if self.processes != 0:
+            self._pool = leak_flow_executor(self.processes)
+        self._batcher = asyncio.create_task(self._run_batches())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle,
+                                                           path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host,
+                                                      port)
+        return self._server
+
+    async def close(self):
+        """Stop the server and the worker processes."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._thread.shutdown()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def warm(self, paths):
+        """Evaluate facility files to fill the caches."""
+        for path in paths:
+            self._evaluate(read_file(path))
+
+    async def evaluate(self, data):
+        """Return results for a facility description dict.
+
+        The facility is queued and evaluated with the next batch.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, future))
+        return await future
+
+    def stats(self):
+        """Return request, batch and cache statistics."""
+        return dict(self._stats,
+                    results=self.results.info()._asdict(),
+                    leak_flows=LEAK_FLOW_CACHE.info()._asdict(),
+                    ntp_states=len(NTP_STATES))
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(
+                    self._thread, self._evaluate_batch,
+                    [data for data, _ in batch])
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as error:
+                # Keep serving; every request of the batch gets the error
+                self._stats['errors'] += 1
+                results = [{'error': f'{type(error).__name__}: {error}'}
+                           ] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _evaluate_batch(self, facilities):
+        """Evaluate a batch of facilities; identical ones are evaluated
+        once."""
+        self._stats['batches'] += 1
+        self._stats['facilities'] += len(facilities)
+        results = {}
+        keys = [_key(data) for data in facilities]
+        for key, data in zip(keys, facilities):
+            if key in results:
+                continue
+            result = self.results.get(key) if isinstance(key, str) else None
+            if result is None:
+                result = self._evaluate(data)
+                if 'error' not in result and isinstance(key, str):
+                    self.results.put(key, result)
+            results[key] = result
+        return [results[key] for key in keys]
+
+    def _evaluate(self, data):
+        start = time.perf_counter()
+        try:
+            model = build_facility(data, data.get('name', 'facility'),
+                                   self._pool)
+            model.odh()
+            result = summarize(model)
+        except Exception as error:
+            self._stats['errors'] += 1
+            return {'error': f'{type(error).__name__}: {error}'}
+        self._stats['evaluated'] += 1
+        result['time'] = time.perf_counter() - start
+        return result
+
+    async def _handle(self, reader, writer):
+        """Serve HTTP requests of a connection until it is closed."""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                self._stats['requests'] += 1
+                status, response = await self._respond(method, target, body)
+                _write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.CancelledError):
+            # Client disconnected or the server is shut down
+            pass
+        except _HTTPError as error:
+            _write_response(writer, error.status, {'error': str(error)},
+                            False)
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, body):
+        """Return status and JSON response for a request."""
+        path = target.split('?')[0]
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/stats':
+            return 200, self.stats()
+        if path != '/odh':
+            return 404, {'error': f'Unknown path: {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST with a facility description'}
+        try:
+            data = json.loads(body)
+        except ValueError as error:
+            return 400, {'error': f'Invalid JSON: {error}'}
+        if not isinstance(data, dict):
+            return 400, {'error': 'Facility description should be an object'}
+        if 'facilities' in data:
+            facilities = data['facilities']
+            if not (isinstance(facilities, list) and
+                    all(isinstance(item, dict) for item in facilities)):
+                return 400, {'error': 'facilities should be a list of '
+                                      'objects'}
+            results = await asyncio.gather(*(self.evaluate(facility)
+                                             for facility in facilities))
+            return 200, list(results)
+        result = await self.evaluate(data)
+        return (400 if 'error' in result else 200), result
+
+
+def _key(data):
+    """Return canonical JSON of a facility; object id if not serializable,
+    so that the facility is evaluated without caching."""
+    try:
+        return json.dumps(data, sort_keys=True)
+    except (TypeError, ValueError):
+        return id(data)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_request(reader):
+    """Read HTTP request; return None if the connection is closed.
+
+    Returns
+    -------
+    tuple
+        Method, target, body and keep-alive flag.
+    """
+    line = await _readline(reader)
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise _HTTPError(400, 'Invalid request line') from None
+    headers = {}
+    while True:
+        line = await _readline(reader)
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = _content_length(method, headers)
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = (connection == 'keep-alive' or
+                  version == 'HTTP/1.1' and connection != 'close')
+    return method, target, body, keep_alive
+
+
+async def _readline(reader):
+    try:
+        return await reader.readline()
+    except ValueError:
+        # Line is longer than the stream buffer limit
+        raise _HTTPError(400, 'Request line or header is too long') \
+            from None
+
+
+def _content_length(method, headers):
+    """Return validated body length of a request."""
+    if 'content-length' not in headers:
+        if method == 'POST':
+            raise _HTTPError(411, 'Content-Length header is required')
+        return 0
+    try:
+        length = int(headers['content-length'])
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise _HTTPError(400, f'Invalid Content-Length: '
+                         f'{headers["content-length"]}')
+    if length > MAX_BODY:
+        raise _HTTPError(413, f'Request body is larger than {MAX_BODY} '
+                         f'bytes')
+    return length
+
+
+def _write_response(writer, status, response, keep_alive):
+    body = json.dumps(response).encode()
+    head = (f'HTTP/1.1 {status} {_REASONS[status]}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            '\r\n')
+    writer.write(head.encode('latin-1') + body)
+
+
+async def serve(args):
+    server = ODHServer(args.processes, args.batch_window/1000,
+                       args.max_batch)
+    await server.start(args.host, args.port, args.socket)
+    # Stop the worker processes on termination
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel)
+    if args.warm:
+        await asyncio.get_running_loop().run_in_executor(
+            server._thread, server.warm, args.warm)
+    address = args.socket or f'http://{args.host}:{args.port}'
+    print(f'ODH server listening on {address}', flush=True)
+    try:
+        await server._server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve ODH evaluations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help='listen on Unix socket path')
+    parser.add_argument('--processes', type=int,
+                        help='leak flow worker processes, 0 to solve in '
+                        'the server process')
+    parser.add_argument('--batch-window', type=float, default=5,
+                        help='time to collect a batch of requests, ms')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--cache', metavar='PATH', nargs='?', const=True,
+                        help='use persistent leak flow cache')
+    parser.add_argument('--warm', metavar='FILE', nargs='*',
+                        help='facility files evaluated at start')
+    args = parser.parse_args(argv)
+    if args.cache:
+        enable_persistent_cache(None if args.cache is True else args.cache)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,585 @@
+"""Columnar storage of leaks and failure modes.
+
+Leaks and failure modes are stored in NumPy arrays in canonical units
+(`RATE_UNIT`, `FLOW_UNIT`, `TIME_UNIT`); sources and failure mode names are
+interned and stored as integer codes. Rows are returned as lightweight views
+and quantities are created only when a row value is accessed, so the code
+working with leak tuples and `failure_mode` named tuples keeps working.
+
+`CanonicalQuantity` attributes are converted to canonical units once when
+set, so that calculations can use plain floats."""
+
+import itertools
+import numpy as np
+import heat_transfer as ht
+
+ureg = ht.ureg
+Q_ = ureg.Quantity
+
+# Canonical units of the stored values
+RATE_UNIT = 1/ureg.hr
+FLOW_UNIT = ureg.ft**3/ureg.min
+TIME_UNIT = ureg.min
+VOLUME_UNIT = ureg.ft**3
+
+# Unique id for each stored leak, see `LeakTable.uid`
+_leak_uid = itertools.count()
+
+
+class CanonicalQuantity:
+    """Attribute stored as a magnitude in canonical units.
+
+    The value is checked and converted when the attribute is set; the
+    magnitude is available as the attribute with leading underscore, e.g.
+    `_volume` for `volume`.
+    """
+    def __init__(self, units):
+        self.units = units
+
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return Q_(getattr(obj, self.name), self.units)
+
+    def __set__(self, obj, value):
+        if hasattr(value, 'to'):
+            value = value.to(self.units).magnitude
+        elif self.units != ureg.dimensionless:
+            raise TypeError(f'{self.name[1:]} should be a quantity with '
+                            f'units of {self.units}')
+        setattr(obj, self.name, float(value))
+
+
+class Pool:
+    """Interned values referenced by integer codes.
+
+    Values are compared by equality for strings and by identity
+    for objects without custom equality, e.g. `Source`.
+    """
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        """Return code of the value adding it to the pool if needed."""
+        try:
+            return self._codes[value]
+        except KeyError:
+            self._codes[value] = len(self.values)
+            self.values.append(value)
+            return self._codes[value]
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ColumnTable:
+    """Table of equal length NumPy columns with amortized appends.
+
+    Subclasses define `_dtypes`: dict of column name and dtype.
+    """
+    _dtypes = {}
+
+    def __init__(self):
+        self._size = 0
+        self._data = {name: np.empty(16, dtype=dtype)
+                      for name, dtype in self._dtypes.items()}
+
+    def array(self, name):
+        """Return column as array in canonical units.
+
+        The array is a view of the stored data in storage order.
+        """
+        return self._data[name][:self._size]
+
+    def _reserve(self, n):
+        """Make sure there is space for n more rows."""
+        capacity = len(next(iter(self._data.values())))
+        if self._size + n <= capacity:
+            return
+        capacity = max(2*capacity, self._size + n)
+        for name, column in self._data.items():
+            new_column = np.empty(capacity, dtype=column.dtype)
+            new_column[:self._size] = column[:self._size]
+            self._data[name] = new_column
+
+    def _append_columns(self, n, **columns):
+        """Append n rows given as arrays or scalars for each column."""
+        self._reserve(n)
+        for name, value in columns.items():
+            self._data[name][self._size:self._size+n] = value
+        self._size += n
+
+    def _take(self, index):
+        """Keep only rows with given storage indices in given order."""
+        for name, column in self._data.items():
+            self._data[name] = column[index]
+        self._size = len(index)
+
+    def nbytes(self):
+        """Return memory used by the stored rows, bytes."""
+        return sum(column[:self._size].nbytes
+                   for column in self._data.values())
+
+    def __len__(self):
+        return self._size
+
+
+class LeakTable(ColumnTable):
+    """Leaks of a `Source`.
+
+    Behaves as a list of leak tuples (name, failure rate, standard
+    volumetric flow, event duration, number of events); see
+    `Source._add_leak`.
+    """
+    _dtypes = {'name': np.int32,
+               'leak_fr': float,
+               'q_leak': float,
+               'tau': float,
+               'N': np.int64,
+               'rate': np.int32,
+               'uid': np.int64}
+
+    def __init__(self, leaks=()):
+        super().__init__()
+        self.names = Pool()
+        # Catalog keys of the failure rates, see `add`
+        self.rate_keys = Pool()
+        self.extend(leaks)
+
+    def append(self, leak):
+        """Add leak tuple to the table."""
+        (name, failure_rate, q_std, tau, N) = leak
+        self.add(name, failure_rate.to(RATE_UNIT).magnitude,
+                 q_std.to(FLOW_UNIT).magnitude, tau.to(TIME_UNIT).magnitude,
+                 N)
+
+    def add(self, name, leak_fr, q_leak, tau, N, rate_key=None):
+        """Add leak given in canonical units to the table.
+
+        Parameters
+        ----------
+        name : str
+            Name of the failure mode.
+        leak_fr : float
+            Total failure rate, 1/hr.
+        q_leak : float
+            Standard volumetric flow rate, ft^3/min.
+        tau : float
+            Event duration, min.
+        N : int
+            Number of events.
+        rate_key : tuple
+            (component, mode) of the failure rate in `FailureRateCatalog`
+            the leak failure rate is proportional to; None if unknown.
+        """
+        self._append_columns(1, name=self.names.code(name), leak_fr=leak_fr,
+                             q_leak=q_leak, tau=tau, N=N,
+                             rate=self.rate_keys.code(rate_key),
+                             uid=next(_leak_uid))
+
+    def extend(self, leaks):
+        """Add several leak tuples to the table."""
+        for leak in leaks:
+            self.append(leak)
+
+    def clear(self):
+        """Remove all leaks."""
+        self._take(np.arange(0))
+
+    def uid(self):
+        """Return unique leak ids.
+
+        Id is assigned when a leak is added or replaced and allows to find
+        leaks that did not change since the previous calculation.
+        """
+        return self.array('uid')
+
+    def name_list(self):
+        """Return list of leak names."""
+        return [self.names[code] for code in self.array('name')]
+
+    def rate_key_list(self):
+        """Return list of failure rate catalog keys, see `add`."""
+        return [self.rate_keys[code] for code in self.array('rate')]
+
+    def values(self, i):
+        """Return leak i in canonical units: (name, failure rate, 1/hr,
+        flow rate, ft^3/min, duration, min, number of events)."""
+        data = self._data
+        i = self._index(i)
+        return (self.names[data['name'][i]], float(data['leak_fr'][i]),
+                float(data['q_leak'][i]), float(data['tau'][i]),
+                int(data['N'][i]))
+
+    def _row(self, i):
+        data = self._data
+        return (self.names[data['name'][i]],
+                Q_(float(data['leak_fr'][i]), RATE_UNIT),
+                Q_(float(data['q_leak'][i]), FLOW_UNIT),
+                Q_(float(data['tau'][i]), TIME_UNIT),
+                int(data['N'][i]))
+
+    def _index(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('leak index out of range')
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._row(j) for j in range(self._size)[i]]
+        return self._row(self._index(i))
+
+    def __setitem__(self, i, leak):
+        (name, failure_rate, q_std, tau, N) = leak
+        self.replace(i, name, failure_rate.to(RATE_UNIT).magnitude,
+                     q_std.to(FLOW_UNIT).magnitude,
+                     tau.to(TIME_UNIT).magnitude, N)
+
+    def replace(self, i, name, leak_fr, q_leak, tau, N, rate_key=None):
+        """Replace leak i with a leak given in canonical units.
+
+        The leak gets a new id; its failure rate catalog key is `rate_key`,
+        not the key of the replaced leak. See `add` for the parameters.
+        """
+        i = self._index(i)
+        data = self._data
+        data['name'][i] = self.names.code(name)
+        data['leak_fr'][i] = leak_fr
+        data['q_leak'][i] = q_leak
+        data['tau'][i] = tau
+        data['N'][i] = N
+        data['rate'][i] = self.rate_keys.code(rate_key)
+        data['uid'][i] = next(_leak_uid)
+
+    def __delitem__(self, i):
+        index = np.arange(self._size)
+        self._take(np.delete(index, index[i]))
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._row(i)
+
+    def __repr__(self):
+        return f'<LeakTable: {len(self)} leaks>'
+
+
+class FailModeRow:
+    """View of a single row of `FailModeTable`.
+
+    Has the same fields as `failure_mode` named tuple.
+    """
+    __slots__ = ('_table', '_i')
+    _fields = ('phi', 'source', 'name', 'O2_conc', 'leak_fr', 'P_i', 'F_i',
+               'outage', 'q_leak', 'tau', 'Q_fan', 'N_fan', 'N')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def _value(self, name):
+        return self._table._data[name][self._i]
+
+    @property
+    def phi(self):
+        return Q_(float(self._value('phi')), RATE_UNIT)
+
+    @property
+    def source(self):
+        return self._table.sources[self._value('source')]
+
+    @property
+    def name(self):
+        return self._table.names[self._value('name')]
+
+    @property
+    def O2_conc(self):
+        return float(self._value('O2_conc'))
+
+    @property
+    def leak_fr(self):
+        return Q_(float(self._value('leak_fr')), RATE_UNIT)
+
+    @property
+    def P_i(self):
+        return Q_(float(self._value('P_i')), RATE_UNIT)
+
+    @property
+    def F_i(self):
+        return float(self._value('F_i'))
+
+    @property
+    def outage(self):
+        return bool(self._value('outage'))
+
+    @property
+    def q_leak(self):
+        return Q_(float(self._value('q_leak')), FLOW_UNIT)
+
+    @property
+    def tau(self):
+        return Q_(float(self._value('tau')), TIME_UNIT)
+
+    @property
+    def Q_fan(self):
+        return Q_(float(self._value('Q_fan')), FLOW_UNIT)
+
+    @property
+    def N_fan(self):
+        return int(self._value('N_fan'))
+
+    @property
+    def N(self):
+        return int(self._value('N'))
+
+    def _asdict(self):
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __getitem__(self, i):
+        return getattr(self, self._fields[i])
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={getattr(self, field)!r}'
+                           for field in self._fields)
+        return f'Failure_mode({values})'
+
+
+class FailModeTable(ColumnTable):
+    """Failure modes calculated by `Volume.odh`.
+
+    Behaves as a list of `failure_mode` named tuples: rows are
+    `FailModeRow` views, and the table can be sorted in place. Sorting
+    changes only the order of the rows, so views stay valid.
+
+    Queries (`top`, `above`, `source_rows`, `fan_rows`) don't change the
+    order of the rows. Ties and rows within a group keep the current order.
+    Indexes by source and number of fans are built when first needed and
+    kept until the table is changed or sorted.
+    """
+    _dtypes = {'phi': float,
+               'source': np.int32,
+               'name': np.int32,
+               'O2_conc': float,
+               'leak_fr': float,
+               'P_i': float,
+               'F_i': float,
+               'outage': bool,
+               'q_leak': float,
+               'tau': float,
+               'Q_fan': float,
+               'N_fan': np.int32,
+               'N': np.int64}
+
+    def __init__(self, f_modes=()):
+        super().__init__()
+        self.sources = Pool()
+        self.names = Pool()
+        # Storage indices of the rows in current order; None if unsorted
+        self._order = None
+        # Lazily built query indexes, see `_group_index`
+        self._indexes = {}
+        for f_mode in f_modes:
+            self.append(f_mode)
+
+    def append(self, f_mode):
+        """Add a `failure_mode` named tuple or row to the table."""
+        self.add(phi=f_mode.phi.to(RATE_UNIT).magnitude,
+                 source=f_mode.source,
+                 name=f_mode.name,
+                 O2_conc=float(f_mode.O2_conc),
+                 leak_fr=f_mode.leak_fr.to(RATE_UNIT).magnitude,
+                 P_i=f_mode.P_i.to(RATE_UNIT).magnitude,
+                 F_i=float(f_mode.F_i),
+                 outage=f_mode.outage,
+                 q_leak=f_mode.q_leak.to(FLOW_UNIT).magnitude,
+                 tau=f_mode.tau.to(TIME_UNIT).magnitude,
+                 Q_fan=f_mode.Q_fan.to(FLOW_UNIT).magnitude,
+                 N_fan=f_mode.N_fan,
+                 N=f_mode.N)
+
+    def add(self, *, phi, source, name, O2_conc, leak_fr, P_i, F_i, outage,
+            q_leak, tau, Q_fan, N_fan, N):
+        """Add a failure mode given in canonical units to the table.
+
+        Fields are the same as for `failure_mode` named tuple.
+        """
+        self._extend_order(1)
+        self._append_columns(
+            1, phi=phi, source=self.sources.code(source),
+            name=self.names.code(name), O2_conc=O2_conc, leak_fr=leak_fr,
+            P_i=P_i, F_i=F_i, outage=outage, q_leak=q_leak, tau=tau,
+            Q_fan=Q_fan, N_fan=N_fan, N=N)
+
+    def add_block(self, source, names, *, leak_fr, q_leak, tau, N, Q_fan,
+                  N_fan, O2_conc, F_i, P_i, phi, outage):
+        """Add failure modes for all leaks of a source and all ventilation
+        cases.
+
+        Rows are added leak by leak, with ventilation cases for each leak.
+
+        Parameters
+        ----------
+        source : Source
+        names : list of str
+            Failure mode names, one for each leak.
+        leak_fr, q_leak, tau, N : numpy.ndarray
+            Leak values in canonical units, shape (leaks,).
+        Q_fan, N_fan : numpy.ndarray
+            Ventilation rates and number of fans working, shape (cases,).
+        O2_conc, F_i, P_i, phi : numpy.ndarray
+            Calculation results, shape (leaks, cases).
+        outage : bool
+            Power outage flag.
+        """
+        n_leaks, n_cases = np.shape(phi)
+        self._extend_order(n_leaks*n_cases)
+        name_codes = np.array([self.names.code(name) for name in names],
+                              dtype=np.int32)
+
+        def per_leak(values):
+            return np.repeat(values, n_cases)
+
+        self._append_columns(
+            n_leaks*n_cases, phi=np.ravel(phi), source=self.sources.code(source),
+            name=per_leak(name_codes), O2_conc=np.ravel(O2_conc),
+            leak_fr=per_leak(leak_fr), P_i=np.ravel(P_i),
+            F_i=np.ravel(F_i), outage=outage, q_leak=per_leak(q_leak),
+            tau=per_leak(tau), Q_fan=np.tile(Q_fan, n_leaks),
+            N_fan=np.tile(N_fan, n_leaks), N=per_leak(N))
+
+    def top(self, k, column='phi'):
+        """Return k rows with the largest values of the column.
+
+        Rows are selected with a partial sort (`numpy.argpartition`); only
+        the selected rows are sorted, largest first.
+        """
+        return self.rows(self._top_index(k, column))
+
+    def above(self, threshold, column='phi'):
+        """Return rows with values of the column >= threshold, largest
+        first."""
+        return self.rows(self._above_index(threshold, column))
+
+    def source_rows(self, source=None):
+        """Return rows of the source, or of all sources grouped by source
+        name if source is None."""
+        if source is None:
+            return self.rows(self._source_index())
+        return self.rows(self._group_index('source').get(
+            self.sources._codes.get(source), ()))
+
+    def fan_rows(self, N_fan):
+        """Return rows with N_fan fans working."""
+        return self.rows(self._group_index('N_fan').get(N_fan, ()))
+
+    def rows(self, index):
+        """Return list of row views for storage indices."""
+        return [FailModeRow(self, i) for i in index]
+
+    def _top_index(self, k, column='phi'):
+        """Storage indices of the rows with k largest values, largest
+        first."""
+        order = self.order()
+        k = min(k, len(order))
+        if k <= 0:
+            return order[:0]
+        values = self.array(column)[order]
+        if k < len(order):
+            # k-th largest value, then all rows with larger or equal values
+            # in current order to keep ties same as for a stable sort
+            kth = np.partition(values, len(order)-k)[len(order)-k]
+            selected = np.flatnonzero(values >= kth)
+        else:
+            selected = np.arange(len(order))
+        selected = selected[np.argsort(-values[selected], kind='stable')]
+        return order[selected[:k]]
+
+    def _above_index(self, threshold, column='phi'):
+        """Storage indices of the rows with values >= threshold, largest
+        first."""
+        order = self.order()
+        values = self.array(column)[order]
+        selected = np.flatnonzero(values >= threshold)
+        selected = selected[np.argsort(-values[selected], kind='stable')]
+        return order[selected]
+
+    def _source_index(self):
+        """Storage indices of the rows stably sorted by source name."""
+        index = self._indexes.get('source_name')
+        if index is None:
+            order = self.order()
+            source_names = np.array([source.name
+                                     for source in self.sources.values])
+            if len(source_names):
+                codes = self.array('source')[order]
+                order = order[np.argsort(source_names[codes], kind='stable')]
+            index = self._indexes['source_name'] = order
+        return index
+
+    def _group_index(self, column):
+        """Dict of storage indices in current order for each value of the
+        column."""
+        groups = self._indexes.get(column)
+        if groups is None:
+            order = self.order()
+            values = self.array(column)[order]
+            keys, inverse = np.unique(values, return_inverse=True)
+            sorter = np.argsort(inverse, kind='stable')
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(keys)))
+            groups = {key.item(): order[part] for key, part in
+                      zip(keys, np.split(sorter, bounds[:-1]))}
+            self._indexes[column] = groups
+        return groups
+
+    def _append_columns(self, n, **columns):
+        self._indexes = {}
+        super()._append_columns(n, **columns)
+
+    def order(self):
+        """Return storage indices of the rows in current order."""
+        if self._order is None:
+            return np.arange(self._size)
+        return self._order
+
+    def sort(self, key=None, reverse=False):
+        """Sort rows in place; same as `list.sort`."""
+        if key is None:
+            raise TypeError('FailModeTable.sort requires a key')
+        rows = list(self)
+        keys = [key(row) for row in rows]
+        positions = sorted(range(len(rows)), key=keys.__getitem__,
+                           reverse=reverse)
+        self._order = self.order()[positions]
+        self._indexes = {}
+
+    def _extend_order(self, n):
+        """Add n rows to the end of current order."""
+        if self._order is not None:
+            self._order = np.concatenate(
+                (self._order, np.arange(self._size, self._size+n)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [FailModeRow(self, j) for j in self.order()[i]]
+        return FailModeRow(self, self.order()[i])
+
+    def __iter__(self):
+        for i in self.order():
+            yield FailModeRow(self, i)
+
+    def __repr__(self):
+        return f'<FailModeTable: {len(self)} failure modes>'
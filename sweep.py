@@ -0,0 +1,205 @@
+"""Parametric design sweep over ventilation parameters of a volume.
+
+Leaks of the sources are calculated once. Fatality probabilities depend
+only on the building volume and the ventilation rate, so they are reduced
+over all leaks for each unique (volume, ventilation rate) pair; the fatality
+rate for every point of the cartesian grid is then assembled from these
+reduced values and fan state probabilities."""
+
+import itertools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .ODH_class import ureg, Q_, FAILURE_RATES, ODHError, Volume, \
+    conc_vent_array, fatality_prob_array, odh_class_array, prob_m_of_n_array
+
+
+# Order of the result dimensions
+SWEEP_DIMS = ('Q_fan', 'N_fans', 'T_fan', 'vent_rate', 'PFD_ODH', 'volume')
+# Canonical units of the sweep parameters
+SWEEP_UNITS = {'Q_fan': ureg.ft**3/ureg.min,
+               'N_fans': None,
+               'T_fan': ureg.hr,
+               'vent_rate': ureg.ft**3/ureg.min,
+               'PFD_ODH': None,
+               'volume': ureg.ft**3}
+
+SweepResult = namedtuple('SweepResult', ['dims', 'coords', 'phi',
+                                         'odh_class'])
+
+
+def sweep(volume, sources, /, *, power_outage=False, processes=None,
+          chunk_size=1000000, **grids):
+    """Calculate fatality rate and ODH class on a grid of volume parameters.
+
+    Parameters
+    ----------
+    volume : Volume
+        Base volume; parameters that are not swept are taken from it.
+    sources : list
+        Sources affecting the volume. Leaks of the sources are used as is,
+        no flows are recalculated.
+    power_outage : bool
+        Shows whether there is a power outage is in effect.
+    processes : int
+        Number of worker processes used to reduce leaks. By default
+        calculation is done in the current process.
+    chunk_size : int
+        Max number of (building volume, leak, ventilation rate)
+        combinations evaluated at once.
+    **grids
+        Values for any of `SWEEP_DIMS`: `Q_fan`, `N_fans`, `T_fan`,
+        `vent_rate`, `PFD_ODH` and `volume`. Values are sequences of
+        quantities or quantity arrays.
+
+    Returns
+    -------
+    SweepResult
+        Dimension names, coordinates (dict of values for each dimension),
+        fatality rate and ODH class arrays with shape of the grid.
+        ODH class is -1 where the fatality rate is too high.
+    """
+    if volume.fans:
+        raise ODHError('Sweep supports identical fans only.')
+    unknown = set(grids) - set(SWEEP_DIMS)
+    if unknown:
+        raise TypeError(f'Unknown sweep parameters: {", ".join(unknown)}')
+    defaults = {'Q_fan': volume.Q_fan,
+                'N_fans': volume.N_fans,
+                'T_fan': volume.Test_period,
+                'vent_rate': volume.vent_rate,
+                'PFD_ODH': volume.PFD_ODH,
+                'volume': volume.volume}
+    coords = {dim: grids.get(dim, [defaults[dim]]) for dim in SWEEP_DIMS}
+    values = {dim: _magnitudes(coords[dim], SWEEP_UNITS[dim])
+              for dim in SWEEP_DIMS}
+    N_fans = values['N_fans'].astype(int)
+    N_max = int(N_fans.max())
+    if N_max and (values['T_fan'] <= 0).any():
+        raise ODHError('Test period T_fan of the fans should be positive.')
+    _, leak_fr, q_leak, tau, sol_PFD = Volume._leak_arrays(sources)
+    # Unique ventilation rates: vent_rate for no response and m*Q_fan
+    n_vent = len(values['vent_rate'])
+    m = np.arange(1, N_max+1)
+    Q = np.concatenate((values['vent_rate'],
+                        np.outer(values['Q_fan'], m).ravel()))
+    S, U = _reduce_leaks(values['volume'], Q, leak_fr, q_leak, tau, sol_PFD,
+                         processes, chunk_size)
+    # S and U have shape (volume, Q); split into no response
+    # and fan working parts
+    S_vent = S[:, :n_vent]
+    U_vent = U[:, :n_vent]
+    S_fan = S[:, n_vent:].reshape(len(values['volume']),
+                                  len(values['Q_fan']), N_max)
+    # Shape (volume, Q_fan, vent_rate, m); with zero fans working
+    # or zero fan flow only ventilation rate is present
+    shape = (S.shape[0], len(values['Q_fan']), n_vent, N_max)
+    no_flow = values['Q_fan'][None, :, None, None] == 0
+    S_fans = np.concatenate(
+        (np.broadcast_to(S_vent[:, None, :, None], shape[:3] + (1,)),
+         np.where(no_flow, S_vent[:, None, :, None], S_fan[:, :, None, :])),
+        axis=3)
+    # Fan state probabilities shape (N_fans, T_fan, m)
+    P_fan = _prob_fans(N_fans, N_max, values['T_fan'], volume._lambda_fan)
+    PFD_power = (1 if power_outage else
+                 FAILURE_RATES['Electrical Power Failure',
+                               'Demand rate'].magnitude)
+    PFD_ODH = values['PFD_ODH']
+    # Shape (volume, Q_fan, N_fans, T_fan, vent_rate)
+    fan_term = np.einsum('vqwm,ntm->vqntw', S_fans, P_fan)
+    V = (slice(None), None, None, None, slice(None), None)
+    phi = (PFD_power*S_vent[V] +
+           (1-PFD_power)*U_vent[V]*PFD_ODH +
+           (1-PFD_power)*fan_term[..., None]*(1-PFD_ODH))
+    # Move volume to the last axis to match SWEEP_DIMS
+    phi = np.moveaxis(phi, 0, -1)
+    return SweepResult(SWEEP_DIMS, coords, Q_(phi, 1/ureg.hr),
+                       odh_class_array(phi))
+
+
+def _magnitudes(values, units):
+    """Convert a sequence of quantities to array of magnitudes."""
+    if units is None:
+        return np.array([float(value) for value in values])
+    if hasattr(values, 'to'):
+        return np.atleast_1d(values.to(units).magnitude).astype(float)
+    return np.array([value.to(units).magnitude for value in values])
+
+
+def _reduce_leaks(V, Q, leak_fr, q_leak, tau, sol_PFD, processes, chunk_size):
+    """Sum fatality rate factors over leaks for each volume and
+    ventilation rate.
+
+    The (volume, leak, ventilation rate) grid is split into blocks of at
+    most `chunk_size` elements, at least one block for each process.
+
+    Returns
+    -------
+    S, U : numpy.ndarray
+        Sum of leak_fr*sol_PFD*F_i and leak_fr*F_i, shape (len(V), len(Q)).
+    """
+    shape = (len(V), len(leak_fr), len(Q))
+    if processes:
+        chunk_size = min(chunk_size, -(-np.prod(shape) // processes))
+    blocks = _blocks(shape, chunk_size)
+    args = [(V[v], Q[q], leak_fr[l], q_leak[l], tau[l], sol_PFD[l])
+            for v, l, q in blocks]
+    if processes:
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(_reduce_chunk, *zip(*args)))
+    else:
+        results = [_reduce_chunk(*block_args) for block_args in args]
+    S = np.zeros((len(V), len(Q)))
+    U = np.zeros((len(V), len(Q)))
+    for (v, _, q), (S_, U_) in zip(blocks, results):
+        S[v, q] += S_
+        U[v, q] += U_
+    return S, U
+
+
+def _blocks(shape, size):
+    """Split a grid into blocks of at most `size` elements.
+
+    Trailing axes are split last, i.e. blocks span whole ventilation rate
+    rows if possible.
+
+    Returns
+    -------
+    list of tuple
+        Slices of each block.
+    """
+    steps = []
+    for n in reversed(shape):
+        step = max(1, min(n, size))
+        size = max(1, size // step)
+        steps.append(step)
+    return list(itertools.product(*[
+        [slice(i, i+step) for i in range(0, n, step)]
+        for n, step in zip(shape, reversed(steps))]))
+
+
+def _reduce_chunk(V, Q, leak_fr, q_leak, tau, sol_PFD):
+    """Reduce a block of leaks for a block of volumes and ventilation
+    rates."""
+    F_i = fatality_prob_array(
+        conc_vent_array(V[:, None, None], q_leak[None, :, None],
+                        Q[None, None, :], tau[None, :, None]))
+    S = np.einsum('l,vlq->vq', leak_fr*sol_PFD, F_i)
+    U = np.einsum('l,vlq->vq', leak_fr, F_i)
+    return S, U
+
+
+def _prob_fans(N_fans, N_max, T, l):
+    """Probability of m = 0..N_max fans working for each number of fans
+    and test period; zero for m > N_fans.
+
+    Returns
+    -------
+    numpy.ndarray
+        Shape (N_fans, T, N_max+1).
+    """
+    P = np.zeros((len(N_fans), len(T), N_max+1))
+    for i, n in enumerate(N_fans):
+        P[i, :, :n+1] = prob_m_of_n_array(int(n), T, l)
+    return P
@@ -0,0 +1,18 @@
+"""Shared fixtures: synthetic sources and volume without flow calculations."""
+
+import pytest
+
+from ..ODH_class import ureg, Q_
+from ..benchmarks.facility import synthetic_sources, synthetic_volume
+
+
+@pytest.fixture
+def sources():
+    """Helium and nitrogen sources with 200 leaks in total."""
+    return synthetic_sources(200)
+
+
+@pytest.fixture
+def volume():
+    """Small hall with 2 fans; leaks cause ODH classes 1 and 2."""
+    return synthetic_volume(2, Q_(20000, ureg.ft**3))
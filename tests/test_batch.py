@@ -0,0 +1,61 @@
+"""Batch evaluation of facility files."""
+
+import json
+import pytest
+
+from ..ODH_class import ODHError
+from ..batch import SUMMARY_FILE, main, output_names, run_batch
+from .test_loader import HALL
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_output_names(tmp_path):
+    paths = [str(tmp_path / 'north' / 'hall.yaml'),
+             str(tmp_path / 'south' / 'hall.json'),
+             str(tmp_path / 'north' / 'Tunnel 2.toml')]
+    assert output_names(paths) == ['north_hall', 'south_hall',
+                                   'north_Tunnel_2']
+    assert output_names(paths[:1]) == ['hall']
+    with pytest.raises(ODHError):
+        output_names([str(tmp_path / 'hall.yaml'),
+                      str(tmp_path / 'hall.json')])
+
+
+def test_run_batch(tmp_path):
+    # Same facility name and file name in different directories
+    paths = [_write(tmp_path / 'in' / area / 'hall.json', HALL)
+             for area in ('north', 'south')]
+    paths.append(_write(tmp_path / 'in' / 'broken.json',
+                        dict(HALL, volumes=[{'name': 'Hall'}])))
+    output = tmp_path / 'out'
+    summary = run_batch(paths, str(output), jobs=2)
+    assert [result['file'] for result in summary['results']] == paths[:2]
+    assert list(summary['errors']) == paths[2:]
+    assert sorted(file.name for file in output.iterdir()) == \
+        ['north_hall.json', 'north_hall.xlsx', 'south_hall.json',
+         'south_hall.xlsx', SUMMARY_FILE]
+    result = json.loads((output / 'north_hall.json').read_text())
+    assert result['name'] == 'Cryo hall'
+    assert set(result['volumes']) == {'Hall', 'Tunnel'}
+    assert result == summary['results'][0]
+    assert json.loads((output / SUMMARY_FILE).read_text()) == summary
+
+
+def test_cli(tmp_path, capsys):
+    path = _write(tmp_path / 'hall.json', HALL)
+    output = tmp_path / 'out'
+    assert main([path, '--output', str(output), '--no-xlsx',
+                 '--jobs', '1']) == 0
+    assert 'Cryo hall' in capsys.readouterr().out
+    assert sorted(file.name for file in output.iterdir()) == \
+        ['hall.json', SUMMARY_FILE]
+    broken = _write(tmp_path / 'broken.json', {'volumes': [{'name': 'X'}]})
+    assert main([path, broken, '-o', str(output), '--no-xlsx']) == 1
+    assert 'broken.json' in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        main([path, path, '-o', str(output)])
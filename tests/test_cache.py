@@ -0,0 +1,36 @@
+"""Content keys and the persistent cache."""
+
+from ..ODH_class import ureg, Q_
+from ..cache import PersistentCache, SessionKey, element_key, is_persistent
+
+
+class Element:
+    def __init__(self, **attributes):
+        vars(self).update(attributes)
+
+
+def test_equal_content_gives_equal_keys():
+    first = Element(D=Q_(1, ureg.inch), L=Q_(10, ureg.ft), K=[0.5, 1])
+    second = Element(D=Q_(25.4, ureg.mm), L=Q_(10, ureg.ft), K=(0.5, 1))
+    assert element_key(first) == element_key(second)
+    assert is_persistent(element_key(first))
+
+
+def test_objects_are_session_keys(tmp_path):
+    marker = object()
+    key = element_key(Element(D=Q_(1, ureg.inch), fitting=marker))
+    assert not is_persistent(key)
+    assert key == element_key(Element(D=Q_(1, ureg.inch), fitting=marker))
+    assert key != element_key(Element(D=Q_(1, ureg.inch),
+                                      fitting=object()))
+    key = element_key(Element(D=Q_(1, ureg.inch), fitting={'K': 1}))
+    assert isinstance(dict(key[1])['fitting'], SessionKey)
+    cache = PersistentCache(str(tmp_path / 'cache.sqlite3'),
+                            versions=('test',))
+    cache.put(key, 1.0)
+    assert cache.get(key) is None
+    assert len(cache) == 0
+    key = element_key(Element(D=Q_(1, ureg.inch)))
+    cache.put(key, 1.0)
+    assert cache.get(key) == 1.0
+    cache.close()
@@ -0,0 +1,40 @@
+"""Failure rate catalog overrides."""
+
+import pytest
+
+from ..ODH_class import ureg, Q_
+from ..catalog import FAILURE_RATES
+
+
+def test_rate_override_keeps_area():
+    base = FAILURE_RATES['Piping', 'Small leak']
+    rates = FAILURE_RATES.with_overrides(
+        {'Piping': {'Small leak': '2e-9 1/(m*hr)'}})
+    entry = rates['Piping', 'Small leak']
+    assert entry.area == base.area
+    assert entry.rate == Q_(2e-9, 1/(ureg.m*ureg.hr))
+    assert entry.kind == 'length'
+    assert FAILURE_RATES['Piping', 'Small leak'] is base
+
+
+def test_area_override_keeps_rate():
+    rates = FAILURE_RATES.with_overrides(
+        {'Piping': {'Small leak': {'Area': '5 mm^2'}}})
+    entry = rates['Piping', 'Small leak']
+    assert entry.area == Q_(5, ureg.mm**2)
+    assert entry.rate == FAILURE_RATES.rate('Piping', 'Small leak')
+
+
+def test_explicit_rupture_override():
+    rates = FAILURE_RATES.with_overrides(
+        {'Piping': {'Small leak': {'Area': None,
+                                   'Failure rate': '2e-9 1/(m*hr)'}}})
+    assert rates.area('Piping', 'Small leak') is None
+
+
+def test_new_mode_requires_rate():
+    rates = FAILURE_RATES.with_overrides({'Fan': {'Failure to start':
+                                                  '1e-5 1/hr'}})
+    assert rates.rate('Fan', 'Failure to start') == Q_(1e-5, 1/ureg.hr)
+    with pytest.raises(KeyError):
+        FAILURE_RATES.with_overrides({'Fan': {'Stall': {'Area': '1 mm^2'}}})
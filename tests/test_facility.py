@@ -0,0 +1,41 @@
+"""Facility of connected zones against single volume calculations."""
+
+import numpy as np
+import pytest
+
+from ..ODH_class import ureg, Q_
+from ..benchmarks.facility import synthetic_volume
+from ..facility import Facility
+
+
+@pytest.mark.parametrize('power_outage', [False, True])
+def test_single_zone_matches_volume(sources, volume, power_outage):
+    facility = Facility('Single zone', [volume])
+    facility.odh({volume: sources}, power_outage=power_outage)
+    volume.odh(sources, power_outage=power_outage)
+    np.testing.assert_allclose(facility.phi.to(1/ureg.hr).magnitude,
+                               [volume.phi.to(1/ureg.hr).magnitude],
+                               rtol=1e-6)
+    assert list(facility.odh_class()) == [volume.odh_class()]
+
+
+def test_unconnected_zones_are_independent(sources, volume):
+    other = synthetic_volume(1, Q_(5000, ureg.ft**3))
+    facility = Facility('Two zones', [volume, other])
+    facility.odh({volume: sources, other: sources[:1]})
+    phi = []
+    for zone, zone_sources in [(volume, sources), (other, sources[:1])]:
+        zone.odh(zone_sources)
+        phi.append(zone.phi.to(1/ureg.hr).magnitude)
+    np.testing.assert_allclose(facility.phi.magnitude, phi, rtol=1e-6)
+    assert np.count_nonzero(facility.contributions().magnitude) == 2
+
+
+def test_exchange_spreads_inert_gas(sources, volume):
+    other = synthetic_volume(1, Q_(5000, ureg.ft**3))
+    facility = Facility('Two zones', [volume, other],
+                        [(volume, other, Q_(2000, ureg.ft**3/ureg.min))])
+    facility.odh({volume: sources, other: []})
+    contributions = facility.contributions().magnitude
+    assert contributions[0, 1] > 0
+    assert contributions[1].sum() == 0
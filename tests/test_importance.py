@@ -0,0 +1,59 @@
+"""Importance measures checked with finite differences of `Volume.odh`."""
+
+import numpy as np
+import pytest
+
+from ..ODH_class import ureg, Q_, FAILURE_RATES, ODHError, Volume
+from ..importance import importance
+
+RATE_KEY = ('Piping', 'Small leak')
+
+
+def _fan_volume(volume, lambda_fan):
+    return Volume('Hall', volume.volume, Q_fan=volume.Q_fan,
+                  N_fans=volume.N_fans, T_fan=volume.Test_period,
+                  vent_rate=volume.vent_rate, lambda_fan=lambda_fan)
+
+
+def _phi(volume, sources):
+    volume.odh(sources)
+    return volume.phi.to(1/ureg.hr).magnitude
+
+
+@pytest.mark.parametrize('lambda_fan', [1e-5, 0.0])
+def test_fan_failure_rate(sources, volume, lambda_fan):
+    rate = Q_(lambda_fan, 1/ureg.hr)
+    hall = _fan_volume(volume, rate)
+    phi = _phi(hall, sources)
+    measures = {x.key: x for x in importance(hall)}
+    fan = measures[('Hall', 'lambda_fan')]
+    assert np.isfinite(fan.birnbaum)
+    step = Q_(1e-7, 1/ureg.hr)
+    phi_up = _phi(_fan_volume(volume, rate + step), sources)
+    assert fan.birnbaum > 0
+    assert np.isclose(fan.birnbaum, (phi_up-phi)/step.magnitude, rtol=1e-3)
+
+
+def test_zero_catalog_rate(sources, volume):
+    rates = FAILURE_RATES.with_overrides(
+        {RATE_KEY[0]: {RATE_KEY[1]: Q_(0, 1/ureg.hr)}})
+    source = sources[0]
+    source.failure_rates = rates
+    source.leaks.add('Catalog leak', 0.0, 1000, source._volume/1000, 1,
+                     rate_key=RATE_KEY)
+    volume.odh(sources)
+    measures = {x.key: x for x in importance(volume)}
+    assert measures[RATE_KEY].birnbaum == 0
+    assert all(np.isfinite(x.birnbaum) for x in measures.values())
+
+
+def test_stale_results(sources, volume):
+    with pytest.raises(ODHError):
+        importance(volume)
+    volume.odh(sources)
+    assert importance(volume)
+    volume.odh(sources[:1], batch=False)
+    with pytest.raises(ODHError):
+        importance(volume)
+    volume.odh(sources)
+    assert importance(volume)
@@ -0,0 +1,95 @@
+"""Facility descriptions."""
+
+import json
+import pytest
+
+from ..ODH_class import ureg, Q_, ODHError
+from ..loader import build_facility, load_facility
+
+HALL = {
+    'name': 'Cryo hall',
+    'sources': [
+        {'name': 'Helium dewar',
+         'fluid': {'name': 'helium', 'T': '4.5 K', 'P': '1.3 bar'},
+         'volume': '1000 L',
+         'isol_valve': True,
+         'failures': [
+             {'type': 'dewar_insulation_failure', 'q_std': '150 ft^3/min'},
+             {'type': 'constant_leak', 'name': 'Relief valve',
+              'q_std': '10 ft^3/min'},
+             {'type': 'failure_mode', 'name': 'Transfer line',
+              'failure_rate': '1e-6 1/hr', 'q_std': '2000 ft^3/min',
+              'N': 2}]},
+        {'name': 'Nitrogen dewar',
+         'fluid': {'name': 'nitrogen', 'T': '77 K', 'P': '1.5 bar'},
+         'volume': '500 L',
+         'failures': [{'type': 'failure_mode', 'name': 'Fill line',
+                       'failure_rate': '1e-5 1/hr',
+                       'q_std': '3000 ft^3/min'}]}],
+    'volumes': [
+        {'name': 'Hall', 'volume': '20000 ft^3', 'Q_fan': '2000 ft^3/min',
+         'N_fans': 2, 'T_fan': '3 month', 'vent_rate': '500 ft^3/min',
+         'sources': ['Helium dewar']},
+        {'name': 'Tunnel', 'volume': '5000 ft^3', 'T_fan': '1 month',
+         'fans': [{'Q_fan': '1000 ft^3/min'},
+                  {'Q_fan': '500 ft^3/min', 'T_fan': '1 year'}]}],
+    'failure_rates': {'Fan': {'Failure to run': '5e-6 1/hr'}},
+}
+
+
+def test_build_facility():
+    model = build_facility(HALL, 'Cryo hall')
+    assert list(model.sources) == ['Helium dewar', 'Nitrogen dewar']
+    helium = model.sources['Helium dewar']
+    assert len(helium.leaks) == 3
+    assert helium.leaks.array('N').tolist() == [1, 1, 2]
+    hall, tunnel = model.volumes
+    assert hall.N_fans == 2
+    assert hall.lambda_fan == Q_(5e-6, 1/ureg.hr)
+    assert [fan.T_fan for fan in tunnel.fans] == [Q_(1, ureg.month),
+                                                  Q_(1, ureg.year)]
+    assert [source.name for source in model.volume_sources['Hall']] == \
+        ['Helium dewar']
+    # All sources by default
+    assert len(model.volume_sources['Tunnel']) == 2
+    assert model.facility is None
+    model.odh()
+    assert hall.phi.magnitude > 0 and tunnel.phi.magnitude > 0
+
+
+def test_exchange_creates_facility():
+    data = dict(HALL, exchange=[{'from': 'Hall', 'to': 'Tunnel',
+                                 'flow': '300 ft^3/min'}])
+    model = build_facility(data, 'Cryo hall')
+    assert model.facility.volumes == model.volumes
+    model.odh()
+    assert model.facility.phi.shape == (2,)
+
+
+def test_load_file(tmp_path):
+    path = tmp_path / 'hall.json'
+    path.write_text(json.dumps(dict(HALL, power_outage=True)))
+    model = load_facility(str(path))
+    assert model.name == 'Cryo hall' and model.power_outage
+    path.write_text(json.dumps({key: value for key, value in HALL.items()
+                                if key != 'name'}))
+    assert load_facility(str(path)).name == 'hall'
+
+
+@pytest.mark.parametrize('change', [
+    {'volumes': [dict(HALL['volumes'][0], sources=['Argon dewar'])]},
+    {'sources': HALL['sources'][:1]*2},
+    {'sources': [dict(HALL['sources'][0],
+                      failures=[{'type': 'magic_failure'}])]},
+    {'volumes': [{'name': 'Hall', 'volume': '100 ft^3', 'N_fans': 1}]},
+])
+def test_invalid_description(change):
+    with pytest.raises(ODHError):
+        build_facility(dict(HALL, **change), 'Cryo hall')
+
+
+def test_unknown_format(tmp_path):
+    path = tmp_path / 'hall.txt'
+    path.write_text('')
+    with pytest.raises(ODHError):
+        load_facility(str(path))
@@ -0,0 +1,38 @@
+"""Monte Carlo propagation against the deterministic fatality rate."""
+
+import numpy as np
+import pytest
+
+from ..ODH_class import ureg
+from ..monte_carlo import monte_carlo, DEFAULT_ERROR_FACTORS
+
+FIXED = dict.fromkeys(DEFAULT_ERROR_FACTORS)
+
+
+@pytest.mark.parametrize('power_outage', [False, True])
+def test_fixed_factors_give_deterministic_phi(sources, volume, power_outage):
+    volume.odh(sources, power_outage=power_outage)
+    phi = volume.phi.to(1/ureg.hr).magnitude
+    result = monte_carlo(volume, sources, 1000, error_factors=FIXED,
+                         power_outage=power_outage, seed=0)
+    np.testing.assert_allclose(result.phi.magnitude, phi, rtol=1e-9)
+    assert result.class_prob[volume.odh_class()] == 1
+
+
+def test_samples_are_reproducible(sources, volume):
+    results = [monte_carlo(volume, sources, 1000, seed=1, chunk_size=300,
+                           processes=processes)
+               for processes in (None, 2)]
+    np.testing.assert_array_equal(results[0].phi.magnitude,
+                                  results[1].phi.magnitude)
+
+
+@pytest.mark.parametrize('power_outage', [False, True])
+def test_no_leaks(sources, volume, power_outage):
+    for source in sources:
+        source.leaks.clear()
+    for case in ([], sources):
+        result = monte_carlo(volume, case, 100, power_outage=power_outage,
+                             seed=0)
+        np.testing.assert_array_equal(result.phi.magnitude, np.zeros(100))
+        assert result.class_prob[0] == 1
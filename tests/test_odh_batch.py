@@ -0,0 +1,77 @@
+"""Batch calculation of `Volume.odh` against the scalar calculation."""
+
+import numpy as np
+import pytest
+
+from ..ODH_class import ureg, Q_, Fan, Volume
+from ..instrumentation import profile
+
+
+def _rows(volume):
+    return [(row.name, row.source, row.N_fan, row.phi.to(1/ureg.hr).magnitude,
+             float(row.O2_conc), float(row.F_i),
+             row.P_i.to(1/ureg.hr).magnitude, row.Q_fan, row.outage)
+            for row in volume.fail_modes]
+
+
+def _assert_rows_equal(rows, expected):
+    assert len(rows) == len(expected)
+    for row, row_expected in zip(rows, expected):
+        name, source, N_fan, *values, Q_fan, outage = row
+        assert (name, N_fan, Q_fan, outage) == \
+            (row_expected[0], row_expected[2], row_expected[7],
+             row_expected[8])
+        assert source is row_expected[1]
+        # phi, O2_conc, F_i and P_i
+        np.testing.assert_allclose(values, row_expected[3:7], rtol=1e-9,
+                                   atol=0)
+
+
+@pytest.mark.parametrize('power_outage', [False, True])
+def test_batch_matches_scalar(sources, volume, power_outage):
+    volume.odh(sources, power_outage=power_outage, batch=False)
+    expected = _rows(volume)
+    phi, odh_class = volume.phi, volume.odh_class()
+    volume.odh(sources, power_outage=power_outage)
+    _assert_rows_equal(_rows(volume), expected)
+    assert volume.phi.magnitude == pytest.approx(phi.magnitude, rel=1e-12)
+    assert volume.odh_class() == odh_class
+    # Some leaks should be fatal for the comparison to be meaningful
+    assert any(row[5] > 0 for row in expected)
+
+
+def test_unchanged_leaks_are_reused(sources, volume):
+    volume.odh(sources)
+    sources[0].leaks[0] = (
+        'Synthetic leak 0', Q_(1e-6, 1/ureg.hr), Q_(3000, ureg.ft**3/ureg.min),
+        Q_(10, ureg.min), 1)
+    with profile() as profiler:
+        volume.odh(sources)
+    assert profiler.counters()['Volume.odh.leaks_evaluated'] == 1
+    incremental = _rows(volume)
+    volume.odh(sources, batch=False)
+    _assert_rows_equal(incremental, _rows(volume))
+
+
+def test_changed_volume_reevaluates_leaks(sources, volume):
+    volume.odh(sources)
+    volume.vent_rate = Q_(1000, ureg.ft**3/ureg.min)
+    with profile() as profiler:
+        volume.odh(sources)
+    assert profiler.counters()['Volume.odh.leaks_evaluated'] == \
+        sum(len(source.leaks) for source in sources)
+    incremental = _rows(volume)
+    volume.odh(sources, batch=False)
+    _assert_rows_equal(incremental, _rows(volume))
+
+
+@pytest.mark.parametrize('power_outage', [False, True])
+def test_identical_fans_match_N_fans(sources, volume, power_outage):
+    fan = Fan(volume.Q_fan, volume.Test_period, volume.lambda_fan)
+    fans = Volume(volume.name, volume.volume, fans=[fan]*volume.N_fans,
+                  T_fan=volume.Test_period, vent_rate=volume.vent_rate)
+    volume.odh(sources, power_outage=power_outage)
+    fans.odh(sources, power_outage=power_outage)
+    assert fans.phi.magnitude == pytest.approx(volume.phi.magnitude,
+                                               rel=1e-9)
+    assert fans.odh_class() == volume.odh_class()
@@ -0,0 +1,109 @@
+"""Evaluation server on an ephemeral port."""
+
+import asyncio
+import json
+
+from ..server import ODHServer
+from .test_loader import HALL
+
+
+async def _request(port, method, target, body=None, headers=None):
+    """Send one HTTP request; return status and decoded JSON response."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [f'{method} {target} HTTP/1.1', 'Connection: close']
+    if body is not None:
+        lines.append(f'Content-Length: {len(body)}')
+    lines.extend(headers or [])
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b''))
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def _serve(test, **kwargs):
+    """Run coroutine function `test(server, port)` with a started server."""
+    async def run():
+        server = ODHServer(processes=0, **kwargs)
+        await server.start(port=0)
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await test(server, port)
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_round_trip():
+    async def test(server, port):
+        assert await _request(port, 'GET', '/health') == \
+            (200, {'status': 'ok'})
+        status, result = await _request(port, 'POST', '/odh',
+                                        json.dumps(HALL).encode())
+        assert status == 200
+        assert result['name'] == 'Cryo hall'
+        assert set(result['volumes']) == {'Hall', 'Tunnel'}
+        status, results = await _request(
+            port, 'POST', '/odh',
+            json.dumps({'facilities': [HALL, HALL]}).encode())
+        assert status == 200
+        assert [item['volumes'] for item in results] == \
+            [result['volumes']]*2
+        status, stats = await _request(port, 'GET', '/stats')
+        assert stats['evaluated'] == 1
+    _serve(test)
+
+
+def test_malformed_requests():
+    async def test(server, port):
+        for method, target, body, headers, expected in [
+                ('POST', '/odh', b'{"name": ', None, 400),
+                ('POST', '/odh', b'[1, 2]', None, 400),
+                ('POST', '/odh', b'{"facilities": [1]}', None, 400),
+                ('POST', '/odh', None, None, 411),
+                ('POST', '/odh', None, ['Content-Length: -1'], 400),
+                ('GET', '/odh', None, None, 405),
+                ('GET', '/unknown', None, None, 404),
+                ('POST', '/odh', b'{"volumes": [{"name": "Hall"}]}', None,
+                 400)]:
+            status, response = await _request(port, method, target, body,
+                                              headers)
+            assert status == expected, (target, body, response)
+            assert 'error' in response
+        assert await _request(port, 'GET', '/health') == \
+            (200, {'status': 'ok'})
+    _serve(test)
+
+
+def test_concurrent_requests_are_batched():
+    async def test(server, port):
+        body = json.dumps(HALL).encode()
+        responses = await asyncio.gather(
+            *(_request(port, 'POST', '/odh', body) for _ in range(8)))
+        assert {status for status, _ in responses} == {200}
+        stats = server.stats()
+        assert stats['facilities'] == 8
+        assert stats['batches'] < 8
+        assert stats['evaluated'] == 1
+    _serve(test, batch_window=0.2)
+
+
+def test_failed_batch_does_not_stop_the_server():
+    async def test(server, port):
+        # Not serializable facility is evaluated without the result cache
+        result = await server.evaluate({'name': object()})
+        assert result['volumes'] == {}
+        assert server.results.info().currsize == 0
+
+        def fail(facilities):
+            raise RuntimeError('Batch failed')
+        evaluate_batch = server._evaluate_batch
+        server._evaluate_batch = fail
+        results = await asyncio.gather(server.evaluate(HALL),
+                                       server.evaluate(HALL))
+        assert results == [{'error': 'RuntimeError: Batch failed'}]*2
+        server._evaluate_batch = evaluate_batch
+        status, _ = await _request(port, 'POST', '/odh',
+                                   json.dumps(HALL).encode())
+        assert status == 200
+    _serve(test)
@@ -0,0 +1,18 @@
+"""Columnar leak table."""
+
+from ..ODH_class import ureg, Q_
+from ..storage import LeakTable
+
+
+def test_replaced_leak_gets_new_key_and_id():
+    leaks = LeakTable()
+    leaks.add('Small leak', 1e-6, 10, 100, 2, ('Piping', 'Small leak'))
+    leaks.add('Rupture', 1e-8, 1000, 1, 1, ('Piping', 'Rupture'))
+    uid = leaks.uid().copy()
+    leaks[0] = ('Custom leak', Q_(1e-5, 1/ureg.hr),
+                Q_(50, ureg.ft**3/ureg.min), Q_(20, ureg.min), 1)
+    assert leaks.rate_key_list() == [None, ('Piping', 'Rupture')]
+    assert leaks.uid()[0] != uid[0] and leaks.uid()[1] == uid[1]
+    leaks.replace(1, 'Large leak', 1e-7, 500, 2, 1, ('Piping', 'Large leak'))
+    assert leaks.rate_key_list() == [None, ('Piping', 'Large leak')]
+    assert leaks.array('q_leak').tolist() == [50, 500]
@@ -0,0 +1,46 @@
+"""Parametric sweep against evaluation of each grid point."""
+
+import itertools
+import numpy as np
+import pytest
+
+from ..ODH_class import ureg, Q_, Volume
+from ..sweep import sweep
+
+
+@pytest.mark.parametrize('power_outage', [False, True])
+def test_sweep_matches_brute_force(sources, volume, power_outage):
+    grids = {'Q_fan': Q_([0, 1000, 3000], ureg.ft**3/ureg.min),
+             'N_fans': [0, 1, 3],
+             'vent_rate': Q_([0, 500], ureg.ft**3/ureg.min),
+             'PFD_ODH': [2e-3, 1e-1],
+             'volume': Q_([5000, 20000], ureg.ft**3)}
+    result = sweep(volume, sources, power_outage=power_outage,
+                   chunk_size=1000, **grids)
+    assert result.phi.shape == (3, 3, 1, 2, 2, 2)
+    for index in itertools.product(*map(range, result.phi.shape)):
+        point = {dim: result.coords[dim][i]
+                 for dim, i in zip(result.dims, index)}
+        case = Volume('Point', point['volume'], Q_fan=point['Q_fan'],
+                      N_fans=int(point['N_fans']), T_fan=point['T_fan'],
+                      lambda_fan=volume.lambda_fan,
+                      vent_rate=point['vent_rate'])
+        case.PFD_ODH = Q_(point['PFD_ODH'], ureg.dimensionless)
+        case.odh(sources, power_outage=power_outage)
+        assert result.phi[index].magnitude == pytest.approx(
+            case.phi.to(1/ureg.hr).magnitude, rel=1e-9), point
+        assert result.odh_class[index] == (case.odh_class()
+                                           if case.odh_class() is not None
+                                           else -1)
+
+
+def test_sweep_chunks_and_processes(sources, volume):
+    grids = {'Q_fan': Q_([500, 1000, 3000], ureg.ft**3/ureg.min),
+             'N_fans': [1, 2],
+             'volume': Q_([5000, 10000, 20000], ureg.ft**3)}
+    expected = sweep(volume, sources, chunk_size=10**9, **grids)
+    for chunk_size, processes in [(7, None), (1000, None), (1000, 2)]:
+        result = sweep(volume, sources, chunk_size=chunk_size,
+                       processes=processes, **grids)
+        np.testing.assert_allclose(result.phi.magnitude,
+                                   expected.phi.magnitude, rtol=1e-12)
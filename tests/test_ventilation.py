@@ -0,0 +1,79 @@
+"""Minimum ventilation search checked with `Volume.odh`."""
+
+import pytest
+
+from ..ODH_class import ureg, Q_, ODH_CLASS_LIMITS, ODHError, Volume
+from ..ventilation import min_ventilation
+
+FLOW = Q_(2000, ureg.ft**3/ureg.min)
+PERIOD = Q_(3, ureg.month)
+
+
+def _phi(volume, sources, **kwargs):
+    """Fatality rate, 1/hr, of a copy of the volume with changed fans."""
+    parameters = dict(Q_fan=volume.Q_fan, N_fans=volume.N_fans,
+                      T_fan=volume.Test_period, vent_rate=volume.vent_rate,
+                      lambda_fan=volume.lambda_fan)
+    parameters.update(kwargs)
+    case = Volume('Case', volume.volume, **parameters)
+    case.odh(sources)
+    return case.phi.to(1/ureg.hr).magnitude
+
+
+def test_fans_for_volume_without_fans(sources, volume):
+    hall = Volume('Hall', volume.volume, vent_rate=volume.vent_rate)
+    with pytest.raises(ODHError):
+        min_ventilation(hall, sources, 'N_fans')
+    with pytest.raises(ODHError):
+        min_ventilation(hall, sources, 'N_fans', Q_fan=FLOW)
+    with pytest.raises(ODHError):
+        min_ventilation(hall, sources, 'N_fans', Q_fan=0*FLOW, T_fan=PERIOD)
+    result = min_ventilation(hall, sources, 'N_fans', target_class=1,
+                             Q_fan=FLOW, T_fan=PERIOD)
+    assert result.odh_class <= 1
+    limit = ODH_CLASS_LIMITS[1]
+    assert _phi(hall, sources, Q_fan=FLOW, T_fan=PERIOD,
+                N_fans=result.value) < limit
+    assert result.value > 0
+    assert _phi(hall, sources, Q_fan=FLOW, T_fan=PERIOD,
+                N_fans=result.value-1) >= limit
+
+
+def test_fan_flow(sources, volume):
+    rtol = 1e-3
+    result = min_ventilation(volume, sources, 'Q_fan', target_class=1,
+                             rtol=rtol)
+    limit = ODH_CLASS_LIMITS[1]
+    assert _phi(volume, sources, Q_fan=result.value) < limit
+    assert _phi(volume, sources, Q_fan=result.value*(1-2*rtol)) >= limit
+
+
+def test_test_period(sources, volume):
+    rtol = 1e-3
+    result = min_ventilation(volume, sources, 'T_fan', target_class=1,
+                             rtol=rtol)
+    limit = ODH_CLASS_LIMITS[1]
+    assert _phi(volume, sources, T_fan=result.value) < limit
+    assert _phi(volume, sources, T_fan=result.value*(1+2*rtol)) >= limit
+
+
+def test_searched_parameter_cannot_be_given(sources, volume):
+    with pytest.raises(TypeError):
+        min_ventilation(volume, sources, 'Q_fan', Q_fan=FLOW)
+
+
+@pytest.mark.parametrize('parameter', ['Q_fan', 'T_fan'])
+def test_grid_is_expanded(sources, volume, parameter):
+    """Few points per step start far from the boundary."""
+    rtol = 1e-3
+    expected = min_ventilation(volume, sources, parameter, target_class=1,
+                               rtol=rtol)
+    result = min_ventilation(volume, sources, parameter, target_class=1,
+                             rtol=rtol, points=2, max_evaluations=100)
+    assert result.value.magnitude == pytest.approx(
+        expected.value.magnitude, rel=2*rtol)
+
+
+def test_unreachable_target(sources, volume):
+    with pytest.raises(ODHError):
+        min_ventilation(volume, sources, 'Q_fan', target_class=0)
@@ -0,0 +1,180 @@
+"""Transient oxygen concentration for failure modes of a volume.
+
+During the release (FESHM 4240 6.1.A, Cases A, B, and C) and after it
+(Case D) the oxygen concentration has the form
+
+    C(t) = a + b*exp(-k*(t-t_0)),
+
+with coefficients depending on the spill rate, ventilation rate and the
+phase of the event. Coefficients are calculated once per failure mode, so
+concentration curves for all failure modes on a shared time grid require a
+single exponent evaluation per point. Minimum concentration, time below the
+limit and the exposure are calculated analytically and do not depend on the
+grid resolution."""
+
+from collections import namedtuple
+import numpy as np
+
+from .ODH_class import Q_
+from .storage import TIME_UNIT
+
+# Oxygen concentration of air
+C_AIR = 0.21
+# Lowest oxygen concentration that is not deficient, see `fatality_prob`
+O2_LIMIT = 0.18
+
+TransientResult = namedtuple('TransientResult', ['t', 'O2_conc', 'min_O2',
+                                                 'time_below', 'exposure'])
+
+
+def transient(volume, t, *, limit=O2_LIMIT, curves=True, chunk_size=1000,
+              dtype=float):
+    """Calculate oxygen concentration curves for fail modes of the volume.
+
+    `Volume.odh` should be called first. Each failure mode is a release
+    with the leak flow `q_leak` and the ventilation `Q_fan` lasting `tau`
+    followed by the recovery with the same ventilation.
+
+    Parameters
+    ----------
+    volume : Volume
+        Volume with calculated fail_modes.
+    t : ureg.Quantity {time: 1}
+        Time grid, beginning of release is at `t` = 0.
+    limit : float
+        Oxygen concentration limit for `time_below`.
+    curves : bool
+        If False, only the summary values are calculated.
+    chunk_size : int
+        Number of failure modes evaluated at once.
+    dtype : numpy.dtype
+        Data type of the concentration curves, e.g. numpy.float32 to
+        reduce memory for plotting.
+
+    Returns
+    -------
+    TransientResult
+        Time grid; oxygen concentration, shape (fail modes, time), in the
+        order of `volume.fail_modes` (None if `curves` is False); minimum
+        concentration, time below the limit and time integral of oxygen
+        deficiency (0.21 - C) on the grid interval for each failure mode.
+    """
+    fail_modes = volume.fail_modes
+    order = fail_modes.order()
+    R = fail_modes.array('q_leak')[order]
+    Q = fail_modes.array('Q_fan')[order]
+    t_e = fail_modes.array('tau')[order]
+    t_grid = np.asarray(t.to(TIME_UNIT).magnitude, dtype=float)
+    O2_conc, min_O2, time_below, exposure = transient_array(
+        volume._volume, R, Q, t_e, t_grid, limit=limit, curves=curves,
+        chunk_size=chunk_size, dtype=dtype)
+    return TransientResult(t, O2_conc, min_O2, Q_(time_below, TIME_UNIT),
+                           Q_(exposure, TIME_UNIT))
+
+
+def transient_array(V, R, Q, t_e, t, *, limit=O2_LIMIT, curves=True,
+                    chunk_size=1000, dtype=float):
+    """Calculate oxygen concentration curves for arrays of events.
+
+    Inputs are floats or NumPy arrays in consistent units, e.g. ft^3,
+    ft^3/min, and min.
+
+    Parameters
+    ----------
+    V : float or numpy.ndarray
+        Volume of the confined space.
+    R, Q, t_e : numpy.ndarray
+        Spill rate, ventilation rate and release duration for each event,
+        shape (events,). See `conc_vent` for the sign of `Q`.
+    t : numpy.ndarray
+        Time grid, shape (time,). Must start at or after 0.
+
+    Returns
+    -------
+    O2_conc : numpy.ndarray or None
+        Oxygen concentration, shape (events, time).
+    min_O2, time_below, exposure : numpy.ndarray
+        Summary values for the interval from 0 to t[-1], shape (events,).
+
+    See `transient` for other parameters.
+    """
+    V, R, Q, t_e = np.broadcast_arrays(*(np.asarray(x, dtype=float)
+                                         for x in (V, R, Q, t_e)))
+    t = np.asarray(t, dtype=float)
+    a, b, k, C_e, k_d = _coefficients(V, R, Q, t_e)
+    t_end = t[-1] if len(t) else 0.0
+    O2_conc = None
+    if curves:
+        O2_conc = np.empty((len(R), len(t)), dtype=dtype)
+        for i in range(0, len(R), chunk_size):
+            part = slice(i, i+chunk_size)
+            O2_conc[part] = _curves(a[part], b[part], k[part], C_e[part],
+                                    k_d[part], t_e[part], t)
+    t_release = np.minimum(t_e, t_end)
+    min_O2 = a + b*np.exp(-k*t_release)
+    time_below = _time_below(a, b, k, C_e, k_d, t_e, t_end, limit)
+    exposure = _exposure(a, b, k, C_e, k_d, t_e, t_end)
+    return O2_conc, min_O2, time_below, exposure
+
+
+def _coefficients(V, R, Q, t_e):
+    """Calculate curve coefficients for the release and the recovery.
+
+    Returns
+    -------
+    a, b, k : numpy.ndarray
+        Release phase: C(t) = a + b*exp(-k*t).
+    C_e, k_d : numpy.ndarray
+        Concentration at the end of the release and the recovery rate:
+        C(t) = 0.21 - (0.21-C_e)*exp(-k_d*(t-t_e)).
+    """
+    Q_abs = np.abs(Q)
+    supply = Q > 0
+    spill = ~supply & (Q_abs <= R)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(supply, C_AIR*Q/(Q+R),
+                     np.where(spill, 0.0, C_AIR*(1-R/Q_abs)))
+        b = np.where(supply, C_AIR*R/(Q+R),
+                     np.where(spill, C_AIR, C_AIR*R/Q_abs))
+    k = np.where(supply, (Q+R)/V, np.where(spill, R/V, Q_abs/V))
+    C_e = a + b*np.exp(-k*t_e)
+    return a, b, k, C_e, Q_abs/V
+
+
+def _curves(a, b, k, C_e, k_d, t_e, t):
+    """Evaluate concentration for a chunk of events on the time grid."""
+    release = t[None, :] <= t_e[:, None]
+    # Both phases share the exponent: time since the phase start times rate
+    x = np.where(release, k[:, None]*t[None, :],
+                 k_d[:, None]*(t[None, :]-t_e[:, None]))
+    C_start = np.where(release, b[:, None], (C_e-C_AIR)[:, None])
+    C_final = np.where(release, a[:, None], C_AIR)
+    return C_final + C_start*np.exp(-x)
+
+
+def _time_below(a, b, k, C_e, k_d, t_e, t_end, limit):
+    """Time the concentration is below the limit between 0 and t_end."""
+    below = C_e < limit
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Concentration is monotonous in each phase
+        t_down = np.where(below, -np.log((limit-a)/b)/k, np.inf)
+        t_up = np.where(below & (k_d > 0),
+                        t_e + np.log((C_AIR-C_e)/(C_AIR-limit))/k_d, np.inf)
+    t_down = np.clip(np.maximum(t_down, 0), 0, t_end)
+    t_up = np.clip(t_up, 0, t_end)
+    return np.where(below, t_up - t_down, 0.0)
+
+
+def _exposure(a, b, k, C_e, k_d, t_e, t_end):
+    """Integral of 0.21 - C over time between 0 and t_end."""
+    t_1 = np.minimum(t_e, t_end)
+    t_2 = np.maximum(t_end - t_e, 0)
+    release = (C_AIR-a)*t_1 - b*_integral_exp(k, t_1)
+    recovery = (C_AIR-C_e)*_integral_exp(k_d, t_2)
+    return release + recovery
+
+
+def _integral_exp(k, t):
+    """Integral of exp(-k*x) from 0 to t; t for k = 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(k > 0, -np.expm1(-k*t)/k, t)
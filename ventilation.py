@@ -0,0 +1,237 @@
+"""Minimum ventilation required to reach a target ODH class.
+
+Oxygen concentration from `conc_vent` grows with the ventilation rate and
+the fatality probability decreases with the concentration, so the
+fatality rate of a volume decreases monotonically with the fan flow
+`Q_fan` and increases with the fan test period `T_fan` (fans fail more
+often). The boundary of the target class is found by k-section search:
+each step evaluates a vector of candidate values with `sweep` and narrows
+the bracket to the interval where the class changes. The number of fans
+is searched over all counts at once."""
+
+from collections import namedtuple
+import numpy as np
+
+from .ODH_class import ureg, Q_, ODH_CLASS_LIMITS, ODHError, \
+    odh_class_array
+from .sweep import sweep, SWEEP_UNITS
+
+VentilationResult = namedtuple('VentilationResult', ['parameter', 'value',
+                                                     'phi', 'odh_class',
+                                                     'evaluations'])
+
+
+def min_ventilation(volume, sources, /, parameter='Q_fan', target_class=0,
+                    *, Q_fan=None, T_fan=None, power_outage=False,
+                    bounds=None, rtol=1e-3, points=16, max_evaluations=20):
+    """Find ventilation parameter required to reach the target ODH class.
+
+    Other parameters are taken from the volume; the volume is not changed.
+
+    Parameters
+    ----------
+    volume : Volume
+        Volume with identical fans, see `sweep`.
+    sources : list
+        Sources affecting the volume.
+    parameter : str
+        'Q_fan' for the smallest flow of a fan, 'N_fans' for the smallest
+        number of fans or 'T_fan' for the longest test period of the fans.
+    target_class : int
+        Required ODH class, 0 or 1 (or 2).
+    Q_fan, T_fan : ureg.Quantity
+        Flow and test period of the fans used instead of the values of the
+        volume, e.g. to find the number of fans for a volume without fans.
+        The parameter searched cannot be given.
+    power_outage : bool
+        Shows whether there is a power outage is in effect.
+    bounds : tuple of ureg.Quantity
+        (low, high) search interval; (low, high) number of fans for
+        'N_fans'. By default the search starts around the value of the
+        volume and the interval is expanded, `points` values at a time,
+        until the target is reached or the fatality rate stops decreasing.
+    rtol : float
+        Relative tolerance of the flow or test period; for 'N_fans' the
+        search stops when the fatality rate decreases less than this.
+    points : int
+        Number of values evaluated at each step.
+    max_evaluations : int
+        Max number of vectorized evaluations.
+
+    Returns
+    -------
+    VentilationResult
+        Parameter name, value meeting the target (quantity or int),
+        fatality rate and ODH class for the value and number of
+        evaluations used.
+    """
+    if parameter not in ('Q_fan', 'N_fans', 'T_fan'):
+        raise TypeError(f'Unknown ventilation parameter: {parameter}')
+    fixed = {key: [value] for key, value in (('Q_fan', Q_fan),
+                                             ('T_fan', T_fan))
+             if value is not None}
+    if parameter in fixed:
+        raise TypeError(f'{parameter} is searched and cannot be given')
+    if parameter != 'N_fans' and not volume.N_fans:
+        raise ODHError(f'{parameter} has no effect without fans in '
+                       f'{volume.name}.')
+    Q_fan = (volume.Q_fan if Q_fan is None else
+             Q_fan).to(SWEEP_UNITS['Q_fan']).magnitude
+    T_fan = (volume.Test_period if T_fan is None else
+             T_fan).to(SWEEP_UNITS['T_fan']).magnitude
+    # Searched parameter has no effect without the fan flow and the fans
+    # fail immediately without the test period
+    if parameter != 'Q_fan' and Q_fan <= 0:
+        raise ODHError(f'Fan flow Q_fan should be positive to find '
+                       f'{parameter} for {volume.name}.')
+    if parameter != 'T_fan' and T_fan <= 0:
+        raise ODHError(f'Test period T_fan should be positive to find '
+                       f'{parameter} for {volume.name}.')
+    limit = ODH_CLASS_LIMITS[target_class]
+
+    def evaluate(values):
+        if parameter != 'N_fans':
+            values = Q_(values, SWEEP_UNITS[parameter])
+        result = sweep(volume, sources, power_outage=power_outage,
+                       **fixed, **{parameter: values})
+        return result.phi.to(1/ureg.hr).magnitude.ravel()
+
+    if parameter == 'N_fans':
+        value, phi, evaluations = _search_fans(evaluate, limit, volume,
+                                               bounds, rtol, max_evaluations)
+    else:
+        value, phi, evaluations = _search(
+            evaluate, limit,
+            _bracket(volume, parameter, bounds, points, Q_fan, T_fan),
+            parameter == 'Q_fan', rtol, points, max_evaluations,
+            expand=bounds is None,
+            end=0 if parameter == 'Q_fan' else _max_test_period(volume))
+        value = Q_(value, SWEEP_UNITS[parameter])
+    return VentilationResult(parameter, value, Q_(phi, 1/ureg.hr),
+                             int(odh_class_array(phi)), evaluations)
+
+
+def _bracket(volume, parameter, bounds, points, Q_fan, T_fan):
+    """Return initial values of the flow or test period, canonical units.
+
+    Without bounds the values are a geometric grid from 2**-(points//2) to
+    2**(points//2-1) times the current value `Q_fan` or `T_fan`; zero flow
+    is added for 'Q_fan'. Test period of the fans should be positive.
+    """
+    units = SWEEP_UNITS[parameter]
+    if bounds is not None:
+        low, high = (bound.to(units).magnitude for bound in bounds)
+        return np.linspace(low, high, points)
+    scale = 2.0**np.arange(-(points//2), points - points//2)
+    if parameter == 'Q_fan':
+        # At least one air change per hour
+        base = max(Q_fan,
+                   (volume.volume/ureg.hr).to(units).magnitude)
+        return np.unique(np.concatenate(([0], base*scale)))
+    base = T_fan or (1*ureg.month).to(units).magnitude
+    return np.unique(np.minimum(base*scale, _max_test_period(volume)))
+
+
+def _max_test_period(volume):
+    """Return test period with probability of fan failure l*T of 1, hr."""
+    return ((1/volume.lambda_fan).to(SWEEP_UNITS['T_fan']).magnitude
+            if volume._lambda_fan else np.inf)
+
+
+def _search(evaluate, limit, values, increasing, rtol, points,
+            max_evaluations, expand=False, end=None):
+    """Find the boundary value where the fatality rate crosses the limit.
+
+    Parameters
+    ----------
+    increasing : bool
+        True if larger values reduce the fatality rate (fan flow); the
+        smallest value meeting the limit is found. Otherwise the largest
+        one (test period).
+    expand : bool
+        If the limit is not met, continue the geometric grid beyond the
+        values (doubling the flow or halving the test period) until the
+        limit is met or the fatality rate decreases less than `rtol`. If
+        the limit is met by all values, continue the grid in the other
+        direction up to `end`.
+    end : float
+        Smallest flow or largest test period of the search.
+
+    Returns
+    -------
+    tuple
+        Value, fatality rate for the value and number of evaluations.
+    """
+    phi = evaluate(values)
+    evaluations = 1
+    # Order values so that the limit is met at the end of the array
+    ok = phi < limit
+    if not increasing:
+        values, phi, ok = values[::-1], phi[::-1], ok[::-1]
+    factor = 2.0 if increasing else 0.5
+    while expand and not ok[-1] and evaluations < max_evaluations:
+        lowest = phi.min()
+        outer = values[-1] * factor**np.arange(1, points+1)
+        values = np.concatenate((values, outer))
+        phi = np.concatenate((phi, evaluate(outer)))
+        evaluations += 1
+        ok = phi < limit
+        if phi.min() >= lowest*(1-rtol):
+            break
+    if not ok[-1]:
+        raise ODHError(f'Target fatality rate {limit:.0e} 1/hr is not '
+                       f'reached within {values.min():.4g} - '
+                       f'{values.max():.4g}; lowest is {phi.min():.3g} 1/hr.')
+    while (expand and ok[0] and values[0] != end and
+           evaluations < max_evaluations):
+        outer = values[0] / factor**np.arange(points, 0, -1)
+        outer = np.unique(np.maximum(outer, end) if increasing else
+                          np.minimum(outer, end))
+        if not increasing:
+            outer = outer[::-1]
+        values = np.concatenate((outer, values))
+        phi = np.concatenate((evaluate(outer), phi))
+        evaluations += 1
+        ok = phi < limit
+    i = np.argmax(ok)
+    while i > 0 and evaluations < max_evaluations:
+        # Boundary is between values[i-1] (not met) and values[i] (met)
+        low, high = values[i-1], values[i]
+        if abs(high-low) <= rtol*max(abs(low), abs(high)):
+            break
+        inner = np.linspace(low, high, points+2)[1:-1]
+        inner_phi = evaluate(inner)
+        evaluations += 1
+        values = np.concatenate(([low], inner, [high]))
+        phi = np.concatenate(([phi[i-1]], inner_phi, [phi[i]]))
+        ok = phi < limit
+        i = np.argmax(ok)
+    return values[i], phi[i], evaluations
+
+
+def _search_fans(evaluate, limit, volume, bounds, rtol, max_evaluations):
+    """Find the smallest number of fans meeting the limit.
+
+    All counts of a range are evaluated at once; without bounds the range
+    is doubled until the limit is met or the fatality rate stops
+    decreasing.
+    """
+    low, high = bounds if bounds is not None else \
+        (0, max(2*volume.N_fans, 8))
+    lowest = np.inf
+    evaluations = 0
+    while evaluations < max_evaluations:
+        N_fans = np.arange(low, high+1)
+        phi = evaluate(N_fans)
+        evaluations += 1
+        ok = phi < limit
+        if ok.any():
+            i = np.argmax(ok)
+            return int(N_fans[i]), phi[i], evaluations
+        if bounds is not None or phi.min() >= lowest*(1-rtol):
+            break
+        lowest = phi.min()
+        low, high = high + 1, 2*high
+    raise ODHError(f'Target fatality rate {limit:.0e} 1/hr is not reached '
+                   f'with up to {high} fans; lowest is {phi.min():.3g} '
+                   f'1/hr.')